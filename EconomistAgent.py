@@ -16,6 +16,7 @@ from datetime import datetime
 project_root = os.path.abspath(os.path.dirname(__file__))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
+from sok import wire  # msgpack/JSON rút gọn + gzip khi node hỗ trợ
 
 # --- CẤU HÌNH ---
 DATA_FILE = "sok_econ_data_v3.json"
@@ -165,14 +166,14 @@ def run_cycle():
         logging.debug(f"Đang gửi yêu cầu tới {node_url}/chain/stats...")
         stats_resp = requests.get(f'{node_url}/chain/stats', timeout=10)
         logging.debug(f"Đang gửi yêu cầu tới {node_url}/chain...")
-        chain_resp = requests.get(f'{node_url}/chain', timeout=20)
+        chain_resp = wire.get(f'{node_url}/chain', timeout=20)
         
         if stats_resp.status_code != 200 or chain_resp.status_code != 200:
             logging.error("Không thể lấy dữ liệu đầy đủ từ node."); return
         
         logging.info("Đã nhận dữ liệu thành công từ node. Bắt đầu phân tích...")
         stats_data = stats_resp.json()
-        chain_data = chain_resp.json().get('chain', [])
+        chain_data = wire.response_data(chain_resp).get('chain', [])
         # ... (Toàn bộ phần logic tính toán bên dưới giữ nguyên) ...
         current_metrics = {
             "timestamp": time.time(),
@@ -18,8 +18,9 @@ getcontext().prec = 50
 project_root = os.path.abspath(os.path.dirname(__file__))
 if os.path.join(project_root, 'sok') not in sys.path: sys.path.insert(0, project_root)
 try:
-    from sok.wallet import Wallet, get_address_from_public_key_pem, verify_signature
+    from sok.wallet import Wallet, get_address_from_public_key_pem, get_address_key_type, verify_signature, load_wallet_file
     from sok.transaction import Transaction
+    from sok import wire
 except ImportError as e:
     with open("SERVER_CRITICAL_ERROR.log", "w", encoding='utf-8') as f:
         f.write(f"Timestamp: {time.ctime()}\nKhông thể import 'sok': {e}\nSys.path: {sys.path}")
@@ -112,7 +113,7 @@ class PrimeAgentLogic:
                 wallet = Wallet()
                 with open(filename, "w", encoding='utf-8') as f: f.write(wallet.get_private_key_pem())
             else:
-                with open(filename, 'r', encoding='utf-8') as f: wallet = Wallet(private_key_pem=f.read())
+                wallet = load_wallet_file(filename)
             logging.info(f"ID của {wallet_name}: {wallet.get_address()}")
             return wallet
         except Exception as e:
@@ -130,7 +131,8 @@ class PrimeAgentLogic:
                     self.last_scanned_block = state.get("last_scanned_block", -1)
                     raw_p2p = state.get("p2p_orders", {})
                     self.p2p_orders = {oid: {k: Decimal(v) if k == 'sok_amount' else v for k, v in data.items()} for oid, data in raw_p2p.items()}
-                    self.public_key_cache = state.get("public_key_cache", {})
+                    # Bỏ các mục None do bản quét cũ ghi nhầm trường 'sender_public_key'
+                    self.public_key_cache = {address: pem for address, pem in state.get("public_key_cache", {}).items() if pem}
                     raw_stake = state.get("staking_records", {})
                     self.staking_records = {addr: {k: Decimal(v) if k in ['principal', 'reward'] else v for k, v in data.items()} for addr, data in raw_stake.items()}
                     self.treasury_value_usd = Decimal(state.get('treasury_value_usd', str(ECON_INITIAL_TREASURY_USD)))
@@ -195,8 +197,9 @@ class PrimeAgentLogic:
             healthy_nodes = []
             for node_url in known_nodes:
                 try:
-                    response = requests.get(f'{node_url}/chain', timeout=NODE_HEALTH_CHECK_TIMEOUT)
-                    if response.status_code == 200: healthy_nodes.append({"url": node_url, "block_height": response.json().get('length', -1)})
+                    # Chỉ cần 'length': xin một trang 1 khối thay vì tải toàn bộ chuỗi
+                    response = wire.get(f'{node_url}/chain', params={'limit': 1}, timeout=NODE_HEALTH_CHECK_TIMEOUT)
+                    if response.status_code == 200: healthy_nodes.append({"url": node_url, "block_height": wire.response_data(response).get('length', -1)})
                 except: pass
             with self.state_lock:
                 if healthy_nodes:
@@ -252,10 +255,16 @@ class PrimeAgentLogic:
                 last_block = self.last_scanned_block
             if not node: time.sleep(30); continue
             try:
-                response = requests.get(f"{node}/chain", timeout=10)
+                # Chỉ tải các khối chưa quét, theo từng trang
+                chain, next_start = [], last_block + 1
+                while next_start is not None:
+                    response = wire.get(f"{node}/chain", params={'start': next_start}, timeout=10)
+                    if response.status_code != 200: break
+                    page = wire.response_data(response)
+                    chain.extend(page.get('chain', []))
+                    next_start = page.get('next_start')
                 if response.status_code != 200:
                     logging.warning(f"Scanner: Node {node} trả về lỗi {response.status_code}"); time.sleep(60); continue
-                chain = response.json().get('chain', [])
             except requests.RequestException as e:
                 logging.error(f"Scanner: Lỗi kết nối đến node: {e}"); time.sleep(60); continue
             with self.state_lock:
@@ -268,8 +277,11 @@ class PrimeAgentLogic:
                         txs = json.loads(block.get('transactions', '[]')) if isinstance(block.get('transactions'), str) else block.get('transactions', [])
                         for tx in txs:
                             sender, recipient = tx.get('sender_address'), tx.get('recipient_address')
-                            if sender and sender != "0" and sender not in self.public_key_cache:
-                                self.public_key_cache[sender] = tx.get('sender_public_key')
+                            public_key_pem = tx.get('sender_public_key_pem')
+                            # Chỉ cache khóa thật sự sinh ra địa chỉ người gửi
+                            if sender and sender != "0" and sender not in self.public_key_cache and isinstance(public_key_pem, str) \
+                                    and get_address_from_public_key_pem(public_key_pem) == sender:
+                                self.public_key_cache[sender] = public_key_pem
                             amount = Decimal(str(tx.get('amount', '0')))
                             if recipient == staking_pool_address and sender != "0": self._process_stake_deposit(sender, amount)
                             elif recipient == p2p_escrow_address and sender != "0":
@@ -294,20 +306,31 @@ class PrimeAgentLogic:
 
     # --- Các hàm logic nghiệp vụ (P2P, Staking, Econ) giữ nguyên ---
     def _get_public_key_for_address(self, address: str) -> Optional[str]:
+        if get_address_key_type(address) is None: return None  # Địa chỉ sai định dạng: không cần hỏi node hay quét chuỗi
         with self.state_lock:
             if address in self.public_key_cache: return self.public_key_cache[address]
             node = self.current_best_node
         if not node: return None
-        logging.warning(f"Không tìm thấy public key trong cache cho {address}. Đang quét blockchain...")
         try:
-            chain_len_resp = requests.get(f"{node}/chain", timeout=5).json()
-            start_block = max(0, chain_len_resp.get('length', 0) - 500)
-            response = requests.get(f"{node}/chain?start={start_block}", timeout=10)
-            for block in reversed(response.json().get('chain', [])):
+            # Node mới tra thẳng bảng public_keys; 404 dạng JSON nghĩa là địa chỉ chưa từng gửi tiền
+            response = requests.get(f"{node}/address/{address}/pubkey", timeout=5)
+            if response.status_code == 200:
+                pub_key = response.json().get('public_key_pem')
+                if pub_key:
+                    with self.state_lock: self.public_key_cache[address] = pub_key
+                return pub_key
+            if response.status_code == 404 and response.headers.get('Content-Type', '').startswith('application/json'): return None
+        except Exception as e: logging.error(f"Lỗi khi tra public key cho {address}: {e}")
+        logging.warning(f"Node không hỗ trợ tra khóa công khai cho {address}. Đang quét blockchain...")
+        try:
+            block_height = requests.get(f"{node}/chain/stats", timeout=5).json().get('block_height', 0)
+            start_block = max(0, block_height + 1 - 500)
+            response = wire.get(f"{node}/chain", params={'start': start_block}, timeout=10)
+            for block in reversed(wire.response_data(response).get('chain', [])):
                 txs = json.loads(block.get('transactions', '[]')) if isinstance(block.get('transactions'), str) else block.get('transactions', [])
                 for tx in txs:
                     if tx.get('sender_address') == address:
-                        pub_key = tx.get('sender_public_key')
+                        pub_key = tx.get('sender_public_key_pem')
                         with self.state_lock: self.public_key_cache[address] = pub_key
                         logging.info(f"Đã tìm thấy và cache public key cho {address}.")
                         return pub_key
@@ -472,8 +495,8 @@ class PrimeAgentLogic:
             try:
                 res = requests.get(f"{node}/balance/{staking_pool_addr}", timeout=5)
                 if res.ok: staked_balance = Decimal(res.json().get("balance", "0"))
-                res = requests.get(f"{node}/chain", timeout=5)
-                if res.ok: blockchain_height = res.json().get("length", 0)
+                res = wire.get(f"{node}/chain", params={'limit': 1}, timeout=5)
+                if res.ok: blockchain_height = wire.response_data(res).get("length", 0)
             except: pass
         with self.state_lock:
             total_p2p_escrow = sum(o['sok_amount'] for o in self.p2p_orders.values() if o['status'] == 'OPEN')
@@ -640,8 +663,8 @@ def get_dashboard_stats():
         total_stakers = len(core_logic.staking_records)
     chain_height = -1; node_to_use = core_logic.current_best_node or BLOCKCHAIN_NODE_URL
     try:
-        response = requests.get(f"{node_to_use}/chain", timeout=3)
-        if response.status_code == 200: chain_height = response.json().get('length', 0)
+        response = wire.get(f"{node_to_use}/chain", params={'limit': 1}, timeout=3)
+        if response.status_code == 200: chain_height = wire.response_data(response).get('length', 0)
     except: pass 
     return jsonify({
         "active_workers": active_workers, "total_websites": total_websites,
@@ -24,6 +24,7 @@ from datetime import datetime
 project_root = os.path.abspath(os.path.dirname(__file__))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
+from sok import wire  # msgpack/JSON rút gọn + gzip khi node hỗ trợ
 
 # --- CẤU HÌNH ---
 LIVE_NETWORK_CONFIG_FILE = "live_network_nodes.json"
@@ -249,13 +250,13 @@ class ExplorerAgent:
         """Lấy dữ liệu chuỗi và thống kê từ một node cụ thể."""
         try:
             logging.info(f"Đang lấy dữ liệu từ node: {node_url}...")
-            chain_resp = requests.get(f'{node_url}/chain', timeout=20)
+            chain_resp = wire.get(f'{node_url}/chain', timeout=20)
             stats_resp = requests.get(f'{node_url}/chain/stats', timeout=10)
 
             if chain_resp.status_code == 200 and stats_resp.status_code == 200:
-                chain_data = chain_resp.json().get('chain', [])
+                chain_data = wire.response_data(chain_resp).get('chain', [])
                 stats_data = stats_resp.json()
-                # Tải lại các giao dịch từ chuỗi JSON
+                # Node cũ (JSON thuần) vẫn trả transactions dưới dạng chuỗi JSON
                 for block in chain_data:
                     if isinstance(block.get('transactions'), str):
                         block['transactions'] = json.loads(block['transactions'])
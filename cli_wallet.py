@@ -25,7 +25,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 try:
-    from sok.wallet import Wallet
+    from sok.wallet import Wallet, load_wallet_file
     from sok.transaction import Transaction
 except ImportError as e:
     print(f"[LỖI] Không thể import thư viện cần thiết: {e}")
@@ -84,8 +84,7 @@ class WalletCLI:
         """Tải ví từ tệp hoặc tạo một ví mới nếu tệp không tồn tại."""
         if os.path.exists(wallet_file):
             logging.info(f"Đang tải ví từ: {wallet_file}")
-            with open(wallet_file, 'r', encoding='utf-8') as f:
-                return Wallet(private_key_pem=f.read())
+            return load_wallet_file(wallet_file)
         else:
             logging.warning(f"Không tìm thấy tệp ví '{wallet_file}'. Đang tạo một ví mới...")
             wallet = Wallet()
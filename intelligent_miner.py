@@ -32,7 +32,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 try:
-    from sok.wallet import Wallet
+    from sok.wallet import Wallet, load_wallet_file
 except ImportError as e:
     print(f"[LỖI] Không thể import thư viện 'sok.wallet'. Hãy đảm bảo bạn đang ở đúng thư mục dự án. Lỗi: {e}")
     sys.exit(1)
@@ -49,6 +49,8 @@ MINING_INTERVAL_SECONDS = 60            # Thời gian chờ giữa các lần kh
 RETRY_SEARCH_INTERVAL_SECONDS = 30      # Thời gian chờ nếu không tìm thấy node nào
 POST_FAILURE_DELAY_SECONDS = 5          # Thời gian chờ ngắn sau khi một lần khai thác thất bại
 CRITICAL_ERROR_DELAY_SECONDS = 60       # Thời gian chờ sau khi gặp lỗi nghiêm trọng
+JOB_POLL_INTERVAL_SECONDS = 2           # Chu kỳ hỏi trạng thái job khai thác trên node
+JOB_MAX_WAIT_SECONDS = 300              # Thời gian tối đa chờ một job khai thác
 
 # [CẢI TIẾN] Chênh lệch chiều cao khối chấp nhận được để một node được coi là trong "nhóm dẫn đầu"
 TOP_TIER_BLOCK_HEIGHT_TOLERANCE = 1
@@ -112,8 +114,7 @@ class IntelligentMinerClient:
             logging.critical(f"LỖI: Không tìm thấy ví thợ mỏ '{MINER_WALLET_FILE}'.")
             logging.critical("Vui lòng chạy 'create_miner_wallet.py' hoặc đảm bảo tệp ví ở đúng vị trí.")
             sys.exit(1)
-        with open(MINER_WALLET_FILE, 'r', encoding='utf-8') as f:
-            return Wallet(private_key_pem=f.read())
+        return load_wallet_file(MINER_WALLET_FILE)
 
     def find_best_node(self) -> Optional[str]:
         """
@@ -164,18 +165,26 @@ class IntelligentMinerClient:
             return False
 
         try:
-            logging.info(f"Gửi yêu cầu khai thác tới {self.current_node}...")
-            response = requests.get(f'{self.current_node}/mine', params={'miner_address': self.wallet.get_address()}, timeout=MINING_INTERVAL_SECONDS + 5)
+            logging.info(f"Gửi job khai thác tới {self.current_node}...")
+            response = requests.post(f'{self.current_node}/mining/jobs', json={'miner_address': self.wallet.get_address()}, timeout=NODE_HEALTH_CHECK_TIMEOUT)
+            if response.status_code == 404:
+                # Node cũ chưa có API job: quay về endpoint /mine đồng bộ
+                response = requests.get(f'{self.current_node}/mine', params={'miner_address': self.wallet.get_address()}, timeout=MINING_INTERVAL_SECONDS + 5)
+            elif response.status_code == 202:
+                response = self._wait_for_mining_job(response.json()['job']['job_id'])
             
-            if response.status_code == 200:
+            if response is not None and response.status_code == 200:
                 data = response.json()
-                block = data.get('block', {})
+                block = data.get('block') or data.get('job', {}).get('block') or {}
                 block_index = block.get('index', '#?')
                 reward_tx = (block.get('transactions') or [{}])[0]
                 reward_amount = reward_tx.get('amount', 'N/A')
                 
                 logging.info(f"⛏️ THÀNH CÔNG! Đã khai thác Khối #{block_index}. Phần thưởng: {reward_amount} SOK.")
                 return True
+            elif response is None:
+                logging.error(f"Job khai thác trên {self.current_node} không hoàn tất sau {JOB_MAX_WAIT_SECONDS} giây.")
+                return False
             else:
                 logging.error(f"Lỗi từ node {self.current_node}: {response.status_code} - {response.text}")
                 return False
@@ -186,6 +195,23 @@ class IntelligentMinerClient:
             logging.error(f"Mất kết nối đến node đang khai thác ({self.current_node}). Lỗi: {e}")
             return False
 
+    def _wait_for_mining_job(self, job_id: str) -> Optional[requests.Response]:
+        """Hỏi trạng thái job cho tới khi kết thúc. Trả về phản hồi cuối, hoặc None nếu quá thời gian (job sẽ bị hủy)."""
+        deadline = time.time() + JOB_MAX_WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(JOB_POLL_INTERVAL_SECONDS)
+            response = requests.get(f'{self.current_node}/mining/jobs/{job_id}', timeout=NODE_HEALTH_CHECK_TIMEOUT)
+            if response.status_code != 200: return response
+            status = response.json().get('job', {}).get('status')
+            if status == 'done': return response
+            if status not in ('queued', 'running'):
+                logging.warning(f"Job khai thác {job_id[:8]} kết thúc với trạng thái '{status}'.")
+                return None
+        try:
+            requests.delete(f'{self.current_node}/mining/jobs/{job_id}', timeout=NODE_HEALTH_CHECK_TIMEOUT)
+        except requests.exceptions.RequestException: pass
+        return None
+
     def run(self):
         """Vòng lặp chính quản lý trạng thái của thợ mỏ."""
         logging.info("--- Khởi động Thợ mỏ Thông minh (Intelligent Miner) ---")
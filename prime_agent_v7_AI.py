@@ -21,7 +21,7 @@ if os.path.join(project_root, 'sok') not in sys.path:
     sys.path.insert(0, project_root)
 
 try:
-    from sok.wallet import Wallet, sign_data
+    from sok.wallet import Wallet, sign_data, load_wallet_file
     from sok.transaction import Transaction
 except ImportError as e:
     print(f"LỖI: Không thể import 'sok': {e}\nKiểm tra lại cấu trúc thư mục.")
@@ -102,7 +102,7 @@ class PrimeAgent:
                 with open(PRIME_WALLET_FILE, "w", encoding='utf-8') as f: f.write(wallet.get_private_key_pem())
                 return wallet
             else:
-                with open(PRIME_WALLET_FILE, 'r', encoding='utf-8') as f: return Wallet(private_key_pem=f.read())
+                return load_wallet_file(PRIME_WALLET_FILE)
         except Exception as e:
             logging.critical(f"Không thể tải/tạo ví Prime Agent: {e}", exc_info=True)
             sys.exit(1)
@@ -187,9 +187,16 @@ class PrimeAgent:
                 if self.opportunity_nodes: target_node_url = self.opportunity_nodes[0]['url']
             if not target_node_url: time.sleep(15); continue
             try:
-                response = requests.get(f'{target_node_url}/mine', params={'miner_address': self.wallet.get_address()}, timeout=60)
-                if response.status_code == 200 and 'block' in response.json():
-                    logging.info(f"💰 [Miner #{thread_id}] THÀNH CÔNG! Đã khai thác trên {target_node_url}.")
+                # Node gộp các job cùng thợ mỏ trên cùng đỉnh chuỗi, nên nhiều luồng không còn xếp hàng chờ mining_lock
+                response = requests.post(f'{target_node_url}/mining/jobs', json={'miner_address': self.wallet.get_address()}, timeout=10)
+                if response.status_code == 202:
+                    job_id = response.json()['job']['job_id']
+                    for _ in range(30):
+                        time.sleep(2)
+                        job = requests.get(f'{target_node_url}/mining/jobs/{job_id}', timeout=10).json().get('job', {})
+                        if job.get('status') not in ('queued', 'running'): break
+                    if job.get('status') == 'done':
+                        logging.info(f"💰 [Miner #{thread_id}] THÀNH CÔNG! Đã khai thác trên {target_node_url}.")
             except Exception: pass
             time.sleep(MINING_INTERVAL_SECONDS)
 
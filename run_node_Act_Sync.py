@@ -30,8 +30,9 @@ init(autoreset=True) # Khởi tạo colorama
 try:
     from sok.node_api import create_app
     from sok.utils import Config
-    from sok.wallet import Wallet
+    from sok.wallet import Wallet, load_wallet_file
     from sok.blockchain import Blockchain, Block
+    from sok.gossip import GossipBroadcaster
 except ImportError as e:
     print(f"\n[LỖI IMPORT] Không thể tải các thành phần cần thiết: {e}")
     sys.exit(1)
@@ -57,6 +58,7 @@ class HybridP2PManager:
         self.host_ip = host_ip
         self.logger = logging.getLogger("HybridP2PManager")
         self.is_running = True
+        self.gossip = GossipBroadcaster(self._get_peer_addresses, self_address=f"http://{host_ip}:{node_port}")
         
         # === [NÂNG CẤP] Thêm luồng mới "Active-Sync" ===
         self.threads = [
@@ -72,26 +74,24 @@ class HybridP2PManager:
         self.logger.info("Đang khởi động dịch vụ P2P với mô hình lai (Seeder + LAN + Map + PEX + ActiveSync)...")
         for thread in self.threads:
             thread.start()
+        self.gossip.start()
     
     def stop(self):
         self.logger.info("Đang dừng dịch vụ P2P...")
         self.is_running = False
+        self.gossip.stop()
 
-    def broadcast_transaction(self, transaction: dict):
-        self._broadcast_message('/transactions/add_from_peer', transaction)
+    # Chỉ xếp hàng rồi trả về ngay; các luồng của GossipBroadcaster công bố mã băm tới từng peer ở nền,
+    # nội dung chỉ được gửi cho peer yêu cầu. source là peer vừa gửi đối tượng này tới, không công bố ngược lại.
+    def broadcast_transaction(self, transaction: dict, source: str = None):
+        self.gossip.announce_transaction(transaction, exclude=source)
 
-    def broadcast_block(self, block: Block):
-        self._broadcast_message('/blocks/add_from_peer', block.to_dict())
+    def broadcast_block(self, block: Block, source: str = None):
+        self.gossip.announce_block(block.to_dict(), exclude=source)
 
-    def _broadcast_message(self, endpoint: str, data: dict):
+    def _get_peer_addresses(self) -> list:
         with self.blockchain.peer_lock:
-            peers_to_broadcast = list(self.blockchain.peers.values())
-        
-        for peer in peers_to_broadcast:
-            try:
-                requests.post(f"{peer['address']}{endpoint}", json=data, timeout=2)
-            except requests.exceptions.RequestException:
-                continue
+            return [peer['address'] for peer in self.blockchain.peers.values()]
 
     def _run_seeder_bootstrap(self):
         self.logger.info(f"[Lớp 0 - Seeder] Đang cố gắng kết nối đến Seeder Node tại {SEEDER_NODE_URL}...")
@@ -235,14 +235,13 @@ if __name__ == '__main__':
         with open(NODE_WALLET_PATH, 'w', encoding='utf-8') as f: f.write(node_wallet.get_private_key_pem())
         logging.info(f"Đã tạo ví mới. ID Node: {node_wallet.get_address()}")
     else:
-        with open(NODE_WALLET_PATH, 'r', encoding='utf-8') as f: node_wallet = Wallet(private_key_pem=f.read())
+        node_wallet = load_wallet_file(NODE_WALLET_PATH)
     
     genesis_wallet = None
     is_genesis_node = False
     if os.path.exists(GENESIS_WALLET_PATH):
         try:
-            with open(GENESIS_WALLET_PATH, 'r', encoding='utf-8') as f:
-                genesis_wallet = Wallet(private_key_pem=f.read())
+            genesis_wallet = load_wallet_file(GENESIS_WALLET_PATH)
             
             if genesis_wallet.get_address() == Config.FOUNDER_ADDRESS:
                 is_genesis_node = True
@@ -31,7 +31,7 @@ if os.path.join(project_root, 'sok') not in sys.path:
     sys.path.insert(0, project_root)
 
 try:
-    from sok.wallet import Wallet, sign_data
+    from sok.wallet import Wallet, sign_data, load_wallet_file
     from sok.transaction import Transaction
 except ImportError:
     print(f"{Fore.RED}LỖI: Không thể import thư viện 'sok'. Vui lòng kiểm tra cấu trúc thư mục.")
@@ -51,8 +51,7 @@ class InteractiveWallet:
 
     def load_wallet(self):
         try:
-            with open(self.wallet_file, 'r', encoding='utf-8') as f:
-                self.wallet = Wallet(private_key_pem=f.read())
+            self.wallet = load_wallet_file(self.wallet_file)
         except FileNotFoundError:
             print(f"{Fore.YELLOW}Không tìm thấy tệp ví '{self.wallet_file}'.")
             self.wallet = None
@@ -0,0 +1,7 @@
+# sok/__init__.py
+# -*- coding: utf-8 -*-
+
+from .blockchain import Blockchain
+from .transaction import Transaction
+from .wallet import Wallet, sign_data, verify_signature
+from .utils import hash_data, Config
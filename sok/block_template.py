@@ -0,0 +1,64 @@
+# sok/block_template.py
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+from .mempool import MempoolEntry
+from .utils import Config, canonical_json
+
+if TYPE_CHECKING:
+    from .validation import StagedLedger
+
+class BlockTemplateBuilder:
+    """
+    Chọn giao dịch từ mempool cho khối sắp khai thác, trong giới hạn số byte và số giao dịch.
+    Chính sách chọn là tất định:
+    - 'oldest_first': theo thứ tự nhận vào, giao dịch không vừa chỗ còn lại được bỏ qua để thử giao dịch kế tiếp.
+    - 'sender_fair': xoay vòng giữa các người gửi (theo tuổi giao dịch cũ nhất của họ), mỗi lượt một giao dịch.
+    Giao dịch không được chọn vẫn nằm trong mempool cho khối sau.
+    Khi có sổ cái tạm (validation.StagedLedger), giao dịch làm âm số dư sau các giao dịch đã chọn bị loại khỏi khối
+    và được trả về trong danh sách rejected để gỡ khỏi mempool.
+    """
+    POLICIES = ('oldest_first', 'sender_fair')
+
+    def __init__(self, max_bytes: Optional[int] = None, max_transactions: Optional[int] = None, policy: Optional[str] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.MAX_BLOCK_BYTES
+        self.max_transactions = max_transactions if max_transactions is not None else Config.MAX_BLOCK_TRANSACTIONS
+        self.policy = policy or Config.BLOCK_TX_SELECTION_POLICY
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"Chính sách chọn giao dịch không hợp lệ: '{self.policy}'. Hợp lệ: {', '.join(self.POLICIES)}")
+
+    def select(self, entries: List[MempoolEntry], reserved_bytes: int = 0, reserved_transactions: int = 0,
+               ledger: Optional['StagedLedger'] = None, rejected: Optional[List[MempoolEntry]] = None) -> List[MempoolEntry]:
+        """Chọn các mục từ danh sách theo thứ tự tuổi; phần dành sẵn dùng cho giao dịch thưởng."""
+        ordered = entries if self.policy == 'oldest_first' else self._interleave_by_sender(entries)
+        budget_bytes = self.max_bytes - reserved_bytes
+        budget_count = self.max_transactions - reserved_transactions
+        selected: List[MempoolEntry] = []
+        for entry in ordered:
+            if len(selected) >= budget_count: break
+            if entry.size > budget_bytes: continue
+            if ledger is not None and ledger.apply(entry.transaction) is not None:
+                if rejected is not None: rejected.append(entry)
+                continue
+            selected.append(entry)
+            budget_bytes -= entry.size
+        return selected
+
+    @staticmethod
+    def _interleave_by_sender(entries: List[MempoolEntry]) -> List[MempoolEntry]:
+        queues: 'OrderedDict[str, List[MempoolEntry]]' = OrderedDict()
+        for entry in entries:
+            queues.setdefault(entry.sender_address, []).append(entry)
+        interleaved: List[MempoolEntry] = []
+        for round_index in range(max((len(q) for q in queues.values()), default=0)):
+            interleaved.extend(q[round_index] for q in queues.values() if round_index < len(q))
+        return interleaved
+
+    def build(self, entries: List[MempoolEntry], reward_tx: Dict[str, Any], ledger: Optional['StagedLedger'] = None,
+              rejected: Optional[List[MempoolEntry]] = None) -> List[MempoolEntry]:
+        """Chọn giao dịch cho một khối có giao dịch thưởng reward_tx đứng đầu."""
+        reward_size = len(canonical_json(reward_tx))
+        # Thứ tự áp dụng giống validate_block_transactions: giao dịch thưởng trước, rồi các giao dịch được chọn
+        if ledger is not None: ledger.apply(reward_tx)
+        return self.select(entries, reserved_bytes=reward_size, reserved_transactions=1, ledger=ledger, rejected=rejected)
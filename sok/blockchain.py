@@ -0,0 +1,721 @@
+# sok/blockchain.py
+# -*- coding: utf-8 -*-
+
+import time
+import json
+import base64
+import os
+import sqlite3
+import threading
+import logging  # <-- SỬA LỖI: THÊM DÒNG NÀY
+from collections import OrderedDict
+from typing import Callable, List, Optional, Any, Dict, Tuple
+from urllib.parse import urlparse
+from .utils import Config, hash_data, calculate_transaction_hash, canonical_json, canonical_json_list
+from .pow import ProofOfWorkEngine, parallel_search
+from .storage import SQLiteStorage
+from .wallet import get_address_from_public_key_pem
+from .validation import (ChainValidator, StagedLedger, validate_full_chain, validate_block_transactions, validate_fork_blocks, apply_to_ledger,
+                         normalize_chain, verify_block_hashes, check_fork_point, block_version_at, mining_reward_at)
+from .mempool import Mempool, MempoolEntry
+from .block_template import BlockTemplateBuilder
+from .merkle import build_merkle_proof, leaf_from_encoded, merkle_root_from_leaves
+from .snapshot import build_snapshot, decode_snapshot, snapshot_from_api
+
+class Block:
+    """
+    Khối phiên bản 1 (cũ): hash phủ toàn bộ danh sách giao dịch.
+    Khối phiên bản 2: giao dịch được cam kết qua merkle_root, hash (và PoW) chỉ phủ phần đầu khối có kích thước cố định.
+    """
+    def __init__(self, index: int, previous_hash: str, timestamp: float, transactions: List[Dict], nonce: int = 0, block_hash: Optional[str] = None,
+                 version: Optional[int] = None, merkle_root: Optional[str] = None, encoded_transactions: Optional[List[str]] = None):
+        self.index: int = index
+        self.previous_hash: str = previous_hash
+        self.timestamp: float = timestamp
+        self.transactions: List[Dict] = transactions
+        self.nonce: int = nonce
+        self.version: int = version if version is not None else block_version_at(index)
+        # JSON chuẩn tắc của từng giao dịch (ví dụ lấy từ mempool), tính một lần rồi dùng lại cho mọi lần băm khối
+        self._encoded_transactions: Optional[List[str]] = encoded_transactions
+        # merkle_root chỉ được truyền vào cùng block_hash cho khối đã xác thực; còn lại luôn tính lại từ giao dịch
+        self.merkle_root: Optional[str] = None
+        if self.version >= 2:
+            self.merkle_root = merkle_root if merkle_root is not None and block_hash is not None else self._compute_merkle_root()
+        # block_hash chỉ được truyền vào khi khối đến từ CSDL cục bộ (đã được xác thực lúc ghi)
+        self.hash: str = block_hash if block_hash is not None else self.calculate_hash()
+    def get_encoded_transactions(self) -> List[str]:
+        if self._encoded_transactions is None:
+            self._encoded_transactions = [canonical_json(tx) for tx in self.transactions]
+        return self._encoded_transactions
+    def _compute_merkle_root(self) -> str:
+        return merkle_root_from_leaves([leaf_from_encoded(encoded) for encoded in self.get_encoded_transactions()])
+    def get_hash_data(self) -> Dict[str, Any]:
+        if self.version == 1:
+            return { 'index': self.index, 'previous_hash': self.previous_hash, 'timestamp': self.timestamp, 'transactions': self.transactions, 'nonce': self.nonce }
+        return { 'version': self.version, 'index': self.index, 'previous_hash': self.previous_hash, 'timestamp': self.timestamp, 'merkle_root': self.merkle_root, 'nonce': self.nonce }
+    def calculate_hash(self) -> str:
+        if self.version == 1:
+            # Ghép từ các giao dịch đã mã hóa sẵn, cho ra đúng chuỗi canonical_json(get_hash_data())
+            return hash_data('{"index": ' + canonical_json(self.index) + ', "nonce": ' + canonical_json(self.nonce) +
+                             ', "previous_hash": ' + canonical_json(self.previous_hash) + ', "timestamp": ' + canonical_json(self.timestamp) +
+                             ', "transactions": ' + canonical_json_list(self.get_encoded_transactions()) + '}')
+        return hash_data(self.get_hash_data())
+    def to_dict(self) -> Dict[str, Any]:
+        return { 'index': self.index, 'previous_hash': self.previous_hash, 'timestamp': self.timestamp, 'transactions': self.transactions,
+                 'nonce': self.nonce, 'hash': self.hash, 'version': self.version, 'merkle_root': self.merkle_root }
+    @staticmethod
+    def from_dict(block_data: Dict[str, Any], trust_hash: bool = False) -> 'Block':
+        # trust_hash=True: dùng hash có sẵn trong block_data, chỉ dành cho khối đã qua sok.validation
+        block_hash = block_data.get('hash') if trust_hash else None
+        # Khối không ghi phiên bản là khối cũ (phiên bản 1)
+        return Block(index=block_data['index'], previous_hash=block_data['previous_hash'], timestamp=block_data['timestamp'], transactions=block_data['transactions'], nonce=block_data['nonce'],
+                     block_hash=block_hash, version=block_data.get('version') or 1, merkle_root=block_data.get('merkle_root'))
+    @staticmethod
+    def from_db_row(row: Dict[str, Any]) -> 'Block':
+        """Dựng Block từ một dòng của bảng blocks, tin tưởng hash đã lưu thay vì băm lại."""
+        transactions = json.loads(row['transactions']) if isinstance(row['transactions'], str) else row['transactions']
+        return Block(index=row['index'], previous_hash=row['previous_hash'], timestamp=row['timestamp'], transactions=transactions, nonce=row['nonce'], block_hash=row['hash'],
+                     version=row.get('version') or 1, merkle_root=row.get('merkle_root'))
+
+class Blockchain:
+    def __init__(self, db_path: str, difficulty: Optional[int] = None, mining_workers: Optional[int] = None):
+        self.mempool = Mempool()
+        self.template_builder = BlockTemplateBuilder()
+        self.difficulty: int = difficulty if difficulty is not None else Config.DIFFICULTY
+        mining_workers = mining_workers if mining_workers is not None else Config.MINING_WORKERS
+        self.mining_workers: int = mining_workers if mining_workers > 0 else (os.cpu_count() or 1)
+        self.last_pow_stats: Dict[str, Any] = {}
+        self.peers: Dict[str, Dict[str, Any]] = {}
+        self.peer_lock = threading.Lock()
+        self.mining_lock = threading.Lock()
+        # Bộ nhớ đệm đỉnh chuỗi và LRU các khối đã giải mã, cập nhật trong _add_block_to_db.
+        # Mọi thay đổi bộ nhớ đệm sau khi ghi diễn ra khi còn giữ storage.write_lock; _cache_generation tăng mỗi lần
+        # hủy bộ nhớ đệm để kết quả đọc từ trước một lần tổ chức lại chuỗi không được đưa ngược vào bộ nhớ đệm.
+        self._tip: Optional[Block] = None
+        self._block_cache: 'OrderedDict[int, Block]' = OrderedDict()
+        self._cache_generation = 0
+        self._cache_lock = threading.Lock()
+        self.synchronizer = None  # ChainSynchronizer, được tạo khi đồng bộ lần đầu
+        # WAL + kết nối đọc riêng cho từng luồng + một kết nối ghi duy nhất
+        self.storage = SQLiteStorage(db_path)
+        self._create_tables()
+        self._backfill_transaction_index()
+        self._backfill_public_keys()
+        # Chỉ số khối của ảnh chụp mà chuỗi cục bộ bắt đầu từ đó (0 = có đầy đủ từ genesis); không thể rẽ nhánh thấp hơn
+        self.base_index: int = self._load_base_index()
+        cursor = self.storage.reader().cursor()
+        cursor.execute('SELECT MAX("index") FROM blocks')
+        result = cursor.fetchone()
+        if result is None or result[0] is None:
+            logging.info("Phát hiện cơ sở dữ liệu trống. Đang tạo khối Sáng thế (Genesis)...")
+            self.create_genesis_block()
+    
+    def register_node(self, node_id: str, node_address: str) -> bool:
+        with self.peer_lock:
+            parsed_url = urlparse(node_address)
+            netloc = parsed_url.netloc or parsed_url.path
+            if not netloc: return False
+            address = f"http://{netloc.replace('http://', '').replace('https://', '')}"
+            if address and node_id:
+                # Chỉ log nếu là peer mới hoặc địa chỉ thay đổi
+                if node_id not in self.peers or self.peers[node_id]['address'] != address:
+                    logging.info(f"[Blockchain] Đã đăng ký/cập nhật peer: {node_id[:15]}... tại {address}")
+                self.peers[node_id] = {"address": address, "last_seen": time.time()}
+                return True
+        return False
+        
+    def merge_peers(self, peers_from_other_node: Dict[str, Dict[str, Any]], self_node_id: str):
+        with self.peer_lock:
+            new_peers_found = 0
+            for node_id, peer_data in peers_from_other_node.items():
+                if node_id != self_node_id and node_id not in self.peers:
+                    self.peers[node_id] = peer_data
+                    new_peers_found += 1
+            if new_peers_found > 0:
+                logging.info(f"[Blockchain] Đã học được về {new_peers_found} peer mới thông qua PEX.")
+    
+    def _create_tables(self):
+        with self.storage.write() as cursor:
+            cursor.execute(""" CREATE TABLE IF NOT EXISTS blocks ("index" INTEGER PRIMARY KEY, hash TEXT NOT NULL UNIQUE, previous_hash TEXT NOT NULL, timestamp REAL NOT NULL, nonce INTEGER NOT NULL, transactions TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 1, merkle_root TEXT) """)
+            # CSDL cũ chưa có cột phiên bản: mọi khối hiện có là phiên bản 1
+            block_columns = {row['name'] for row in cursor.execute("PRAGMA table_info(blocks)").fetchall()}
+            if 'version' not in block_columns: cursor.execute("ALTER TABLE blocks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            if 'merkle_root' not in block_columns: cursor.execute("ALTER TABLE blocks ADD COLUMN merkle_root TEXT")
+            cursor.execute(""" CREATE TABLE IF NOT EXISTS balances (address TEXT PRIMARY KEY, balance REAL NOT NULL) """)
+            # Bảng giao dịch đã chuẩn hóa: tra cứu theo hash/địa chỉ bằng index thay vì quét toàn bộ chuỗi
+            cursor.execute(""" CREATE TABLE IF NOT EXISTS transactions (tx_hash TEXT NOT NULL, block_index INTEGER NOT NULL, position INTEGER NOT NULL, sender_address TEXT, recipient_address TEXT, amount REAL NOT NULL, timestamp REAL, data TEXT NOT NULL, PRIMARY KEY (block_index, position)) """)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_hash ON transactions (tx_hash)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_sender ON transactions (sender_address, block_index, position)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_recipient ON transactions (recipient_address, block_index, position)')
+            # Dữ liệu hoàn tác số dư theo từng khối: số dư của mỗi địa chỉ trước khi khối được áp dụng (NULL = chưa tồn tại)
+            cursor.execute(""" CREATE TABLE IF NOT EXISTS balance_undo (block_index INTEGER NOT NULL, address TEXT NOT NULL, previous_balance REAL, PRIMARY KEY (block_index, address)) """)
+            # Khóa công khai của mỗi địa chỉ đã từng gửi tiền, kèm khối đầu tiên nó xuất hiện (để gỡ khi tái tổ chức)
+            cursor.execute(""" CREATE TABLE IF NOT EXISTS public_keys (address TEXT PRIMARY KEY, public_key_pem TEXT NOT NULL, first_seen_block INTEGER NOT NULL) """)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_public_keys_block ON public_keys (first_seen_block)')
+            # Ảnh chụp số dư nén theo chu kỳ (xem sok/snapshot.py) và các giá trị trạng thái của chuỗi cục bộ
+            cursor.execute(""" CREATE TABLE IF NOT EXISTS snapshots (block_index INTEGER PRIMARY KEY, block_hash TEXT NOT NULL, state_hash TEXT NOT NULL, balance_count INTEGER NOT NULL, data BLOB NOT NULL, created_at REAL NOT NULL) """)
+            cursor.execute(""" CREATE TABLE IF NOT EXISTS chain_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) """)
+
+    def _load_base_index(self) -> int:
+        cursor = self.storage.reader().cursor()
+        cursor.execute("SELECT value FROM chain_meta WHERE key = 'snapshot_base'")
+        row = cursor.fetchone()
+        return int(row['value']) if row else 0
+
+    def _backfill_transaction_index(self):
+        """Lập chỉ mục giao dịch cho các cơ sở dữ liệu cũ được tạo trước khi có bảng transactions."""
+        try:
+            with self.storage.write() as cursor:
+                cursor.execute("SELECT 1 FROM transactions LIMIT 1")
+                if cursor.fetchone(): return
+                cursor.execute('SELECT "index", transactions FROM blocks ORDER BY "index" ASC')
+                rows = cursor.fetchall()
+                if not rows: return
+                logging.info(f"Đang lập chỉ mục giao dịch cho {len(rows)} khối hiện có...")
+                for row in rows:
+                    self._index_block_transactions(cursor, row['index'], json.loads(row['transactions']))
+        except Exception as e:
+            logging.error(f"LỖI DB khi lập chỉ mục giao dịch: {e}")
+            raise
+
+    def _backfill_public_keys(self):
+        """Dựng bảng public_keys cho các cơ sở dữ liệu cũ từ bảng transactions đã có."""
+        try:
+            with self.storage.write() as cursor:
+                cursor.execute("SELECT 1 FROM public_keys LIMIT 1")
+                if cursor.fetchone(): return
+                cursor.execute("SELECT block_index, data FROM transactions WHERE sender_address != '0' ORDER BY block_index ASC, position ASC")
+                rows = cursor.fetchall()
+                if not rows: return
+                logging.info(f"Đang dựng bảng khóa công khai từ {len(rows)} giao dịch hiện có...")
+                for row in rows:
+                    self._register_public_keys(cursor, row['block_index'], [json.loads(row['data'])])
+        except Exception as e:
+            logging.error(f"LỖI DB khi dựng bảng khóa công khai: {e}")
+            raise
+
+    @staticmethod
+    def _index_block_transactions(cursor: sqlite3.Cursor, block_index: int, transactions: List[Dict]):
+        rows = [(calculate_transaction_hash(tx), block_index, position, tx.get('sender_address'), tx.get('recipient_address'),
+                 float(tx.get('amount', 0)), tx.get('timestamp'), json.dumps(tx))
+                for position, tx in enumerate(transactions)]
+        if rows:
+            cursor.executemany('INSERT INTO transactions (tx_hash, block_index, position, sender_address, recipient_address, amount, timestamp, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        Blockchain._register_public_keys(cursor, block_index, transactions)
+
+    @staticmethod
+    def _register_public_keys(cursor: sqlite3.Cursor, block_index: int, transactions: List[Dict]):
+        # Chỉ ghi khi địa chỉ đúng là băm của PEM; địa chỉ đã có giữ nguyên khối xuất hiện đầu tiên
+        rows = [(tx['sender_address'], tx['sender_public_key_pem'], block_index) for tx in transactions
+                if tx.get('sender_address') not in (None, "0") and isinstance(tx.get('sender_public_key_pem'), str)
+                and get_address_from_public_key_pem(tx['sender_public_key_pem']) == tx['sender_address']]
+        if rows:
+            cursor.executemany("INSERT OR IGNORE INTO public_keys (address, public_key_pem, first_seen_block) VALUES (?, ?, ?)", rows)
+
+    @property
+    def last_block(self) -> Block:
+        tip = self._tip
+        if tip is not None: return tip
+        generation = self._cache_generation
+        cursor = self.storage.reader().cursor()
+        cursor.execute('SELECT * FROM blocks ORDER BY "index" DESC LIMIT 1')
+        row = cursor.fetchone()
+        if not row: raise Exception("Không tìm thấy khối nào trong cơ sở dữ liệu!")
+        tip = Block.from_db_row(dict(row))
+        with self._cache_lock:
+            if self._tip is None and self._cache_generation == generation: self._tip = tip
+        return tip
+
+    def get_block_object(self, index: int) -> Optional[Block]:
+        """Lấy một khối đã giải mã theo chỉ số, ưu tiên LRU trong bộ nhớ."""
+        with self._cache_lock:
+            block = self._block_cache.get(index)
+            if block is not None:
+                self._block_cache.move_to_end(index)
+                return block
+            generation = self._cache_generation
+        block_data = self.get_block(index)
+        if not block_data: return None
+        block = Block.from_db_row(block_data)
+        self._cache_block(block, generation)
+        return block
+
+    def _cache_block(self, block: Block, generation: Optional[int] = None):
+        """generation: thế hệ bộ nhớ đệm lúc bắt đầu đọc khối; bỏ qua nếu bộ nhớ đệm đã bị hủy kể từ đó."""
+        with self._cache_lock:
+            if generation is not None and generation != self._cache_generation: return
+            self._block_cache[block.index] = block
+            self._block_cache.move_to_end(block.index)
+            while len(self._block_cache) > Config.BLOCK_CACHE_SIZE:
+                self._block_cache.popitem(last=False)
+
+    def _invalidate_block_cache(self):
+        with self._cache_lock:
+            self._tip = None
+            self._block_cache.clear()
+            self._cache_generation += 1
+        
+    def _add_block_to_db(self, block: Block):
+        # Giữ khóa ghi đến khi cập nhật xong bộ nhớ đệm: một lần tổ chức lại chuỗi không thể chen vào giữa commit và
+        # việc đặt _tip, rồi bị khối cũ này ghi đè lên bộ nhớ đệm vừa hủy
+        with self.storage.write_lock:
+            try:
+                with self.storage.write() as cursor:
+                    # Kiểm tra lại trong khóa ghi: khối phải nối tiếp đúng đỉnh chuỗi đang lưu
+                    if block.index > 0:
+                        cursor.execute('SELECT hash FROM blocks WHERE "index" = ?', (block.index - 1,))
+                        parent = cursor.fetchone()
+                        if not parent or parent['hash'] != block.previous_hash:
+                            raise ValueError(f"Khối #{block.index} không nối tiếp đỉnh chuỗi hiện tại.")
+                    self._apply_block(cursor, block)
+            except Exception as e:
+                logging.error(f"LỖI DB: Giao dịch cơ sở dữ liệu đã được hoàn tác. Lỗi: {e}")
+                raise
+            # Chỉ cập nhật bộ nhớ đệm sau khi đã commit thành công
+            self._cache_block(block)
+            with self._cache_lock:
+                if self._tip is None or block.index >= self._tip.index: self._tip = block
+
+    def _apply_block(self, cursor: sqlite3.Cursor, block: Block, store_block: bool = True):
+        """Áp dụng một khối trong giao dịch ghi hiện tại (không commit). store_block=False chỉ tính lại số dư."""
+        if store_block: self._store_block(cursor, block)
+
+        senders_to_update, recipients_to_update, new_recipients_data = [], [], []
+        all_recipients = {tx.get('recipient_address') for tx in block.transactions if tx.get('recipient_address')}
+        all_senders = {tx.get('sender_address') for tx in block.transactions if tx.get('sender_address') and tx.get('sender_address') != "0"}
+
+        # Ghi lại số dư trước khi áp dụng khối để có thể hoàn tác khi tái tổ chức chuỗi
+        undo_rows = []
+        for address in all_recipients | all_senders:
+            cursor.execute("SELECT balance FROM balances WHERE address = ?", (address,))
+            row = cursor.fetchone()
+            undo_rows.append((block.index, address, row['balance'] if row else None))
+        cursor.executemany("INSERT OR REPLACE INTO balance_undo (block_index, address, previous_balance) VALUES (?, ?, ?)", undo_rows)
+        cursor.execute("DELETE FROM balance_undo WHERE block_index <= ?", (block.index - Config.REORG_UNDO_DEPTH,))
+
+        for recipient in all_recipients: 
+            new_recipients_data.append((recipient, 0.0))
+        if new_recipients_data: 
+            cursor.executemany("INSERT OR IGNORE INTO balances (address, balance) VALUES (?, ?)", new_recipients_data)
+
+        for tx in block.transactions:
+            sender_addr = tx.get('sender_address')
+            recipient_addr = tx.get('recipient_address')
+            amount = float(tx.get('amount', 0))
+            
+            # Không trừ tiền từ địa chỉ "0" (giao dịch thưởng/genesis)
+            if sender_addr and sender_addr != "0": 
+                senders_to_update.append((amount, sender_addr))
+            if recipient_addr: 
+                recipients_to_update.append((amount, recipient_addr))
+
+        if senders_to_update: 
+            cursor.executemany("UPDATE balances SET balance = balance - ? WHERE address = ?", senders_to_update)
+        if recipients_to_update: 
+            cursor.executemany("UPDATE balances SET balance = balance + ? WHERE address = ?", recipients_to_update)
+
+        if store_block and Config.SNAPSHOT_INTERVAL > 0 and block.index > 0 and block.index % Config.SNAPSHOT_INTERVAL == 0:
+            self._take_snapshot(cursor, block)
+
+    def _store_block(self, cursor: sqlite3.Cursor, block: Block):
+        # Chuyển transactions sang chuỗi JSON để lưu
+        transactions_json = json.dumps([tx for tx in block.transactions])
+
+        cursor.execute('INSERT INTO blocks ("index", hash, previous_hash, timestamp, nonce, transactions, version, merkle_root) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', 
+                       (block.index, block.hash, block.previous_hash, block.timestamp, block.nonce, transactions_json, block.version, block.merkle_root))
+        self._index_block_transactions(cursor, block.index, block.transactions)
+
+    def _take_snapshot(self, cursor: sqlite3.Cursor, block: Block):
+        """Chụp bảng balances ngay sau khi áp dụng khối, trong cùng giao dịch ghi; chỉ giữ SNAPSHOTS_TO_KEEP ảnh mới nhất (và ảnh gốc)."""
+        cursor.execute("SELECT address, balance FROM balances")
+        snapshot = build_snapshot(block.index, block.hash, [(row['address'], row['balance']) for row in cursor.fetchall()])
+        cursor.execute("INSERT OR REPLACE INTO snapshots (block_index, block_hash, state_hash, balance_count, data, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                       (snapshot['block_index'], snapshot['block_hash'], snapshot['state_hash'], snapshot['balance_count'], snapshot['data'], time.time()))
+        oldest_kept = block.index - Config.SNAPSHOT_INTERVAL * (Config.SNAPSHOTS_TO_KEEP - 1)
+        cursor.execute("DELETE FROM snapshots WHERE block_index < ? AND block_index != ?", (oldest_kept, self.base_index))
+        logging.info(f"[Snapshot] Đã chụp số dư tại khối #{block.index} ({snapshot['balance_count']} địa chỉ, {len(snapshot['data'])} byte).")
+
+    def _rollback_block(self, cursor: sqlite3.Cursor, index: int):
+        """Gỡ khối ở đỉnh chuỗi và khôi phục số dư từ bảng balance_undo (không commit)."""
+        cursor.execute("SELECT address, previous_balance FROM balance_undo WHERE block_index = ?", (index,))
+        for row in cursor.fetchall():
+            if row['previous_balance'] is None:
+                cursor.execute("DELETE FROM balances WHERE address = ?", (row['address'],))
+            else:
+                cursor.execute("INSERT OR REPLACE INTO balances (address, balance) VALUES (?, ?)", (row['address'], row['previous_balance']))
+        cursor.execute("DELETE FROM balance_undo WHERE block_index = ?", (index,))
+        cursor.execute("DELETE FROM transactions WHERE block_index = ?", (index,))
+        cursor.execute("DELETE FROM public_keys WHERE first_seen_block = ?", (index,))
+        cursor.execute("DELETE FROM snapshots WHERE block_index = ?", (index,))
+        cursor.execute('DELETE FROM blocks WHERE "index" = ?', (index,))
+
+    def _find_fork_point(self, candidate_chain: List[Dict]) -> int:
+        """Tìm chỉ số khối chung cuối cùng giữa chuỗi cục bộ và chuỗi ứng viên (-1 nếu khác ngay từ genesis)."""
+        if not candidate_chain: return -1
+        first_index = candidate_chain[0]['index']
+        candidate_hashes = {block['index']: block['hash'] for block in candidate_chain}
+        cursor = self.storage.reader().cursor()
+        cursor.execute('SELECT "index", hash FROM blocks WHERE "index" <= ? ORDER BY "index" DESC', (candidate_chain[-1]['index'],))
+        for row in cursor:
+            if row['index'] < first_index: break
+            if candidate_hashes.get(row['index']) == row['hash']: return row['index']
+        return -1
+
+    def _reorganize(self, fork_index: int, new_blocks: List[Block]) -> List[Dict]:
+        """
+        Thay phần chuỗi sau fork_index bằng new_blocks trong một giao dịch duy nhất.
+        Chi phí tỉ lệ với độ sâu của nhánh rẽ; chỉ dựng lại toàn bộ số dư khi thiếu dữ liệu hoàn tác.
+        Trả về các giao dịch nằm trong những khối bị loại bỏ.
+        Giao dịch của new_blocks được xác thực đầy đủ: cấu trúc và chữ ký trước khi giữ khóa ghi,
+        số dư trên sổ cái tạm bắt đầu từ trạng thái tại fork_index và nối tiếp qua từng khối.
+        """
+        if self.base_index > 0 and fork_index < self.base_index:
+            raise ValueError(f"Không thể rẽ nhánh tại khối #{fork_index}, thấp hơn ảnh chụp gốc #{self.base_index} của chuỗi cục bộ.")
+        if not check_fork_point(fork_index, self.last_block.index):
+            raise ValueError(f"Không thể rẽ nhánh tại khối #{fork_index}, thấp hơn checkpoint của chuỗi cục bộ.")
+        reason = validate_fork_blocks(new_blocks)
+        if reason: raise ValueError(reason)
+        with self.storage.write_lock:
+            try:
+                with self.storage.write() as cursor:
+                    cursor.execute('SELECT MAX("index") FROM blocks')
+                    local_tip = cursor.fetchone()[0]
+                    local_tip = -1 if local_tip is None else local_tip
+                    cursor.execute('SELECT transactions FROM blocks WHERE "index" > ? ORDER BY "index" DESC', (fork_index,))
+                    orphaned_transactions = [tx for row in cursor.fetchall() for tx in json.loads(row['transactions'])]
+                    cursor.execute("SELECT COUNT(DISTINCT block_index) FROM balance_undo WHERE block_index > ?", (fork_index,))
+                    if fork_index >= 0 and cursor.fetchone()[0] == local_tip - fork_index:
+                        for index in range(local_tip, fork_index, -1):
+                            self._rollback_block(cursor, index)
+                    else:
+                        logging.warning(f"Thiếu dữ liệu hoàn tác cho nhánh sau khối #{fork_index}, đang dựng lại số dư từ đầu...")
+                        self._rebuild_balances(cursor, fork_index)
+                    balance_cursor = cursor.connection.cursor()
+                    ledger = StagedLedger(self, lambda address: self._balance_in(balance_cursor, address))
+                    for block in new_blocks:
+                        reason = apply_to_ledger(ledger, block.transactions)
+                        if reason: raise ValueError(f"Khối #{block.index}: {reason}")
+                        self._apply_block(cursor, block)
+            finally:
+                # Hủy bộ nhớ đệm khi còn giữ khóa ghi, xem _add_block_to_db
+                self._invalidate_block_cache()
+        return orphaned_transactions
+
+    def _rebuild_balances(self, cursor: sqlite3.Cursor, fork_index: int):
+        """Phương án dự phòng: xóa nhánh sau fork_index và tính lại số dư bằng cách phát lại các khối chung."""
+        cursor.execute('DELETE FROM blocks WHERE "index" > ?', (fork_index,))
+        cursor.execute("DELETE FROM transactions WHERE block_index > ?", (fork_index,))
+        cursor.execute("DELETE FROM public_keys WHERE first_seen_block > ?", (fork_index,))
+        cursor.execute("DELETE FROM snapshots WHERE block_index > ?", (fork_index,))
+        cursor.execute("DELETE FROM balances"); cursor.execute("DELETE FROM balance_undo")
+        if self.base_index > 0:
+            # Chuỗi bắt đầu từ ảnh chụp: khởi tạo số dư từ ảnh gốc rồi phát lại các khối sau nó
+            cursor.execute("SELECT data, state_hash FROM snapshots WHERE block_index = ?", (self.base_index,))
+            base = cursor.fetchone()
+            content = decode_snapshot(base['data'], base['state_hash']) if base else None
+            if content is None: raise ValueError(f"Ảnh chụp gốc #{self.base_index} bị thiếu hoặc hỏng.")
+            cursor.executemany("INSERT INTO balances (address, balance) VALUES (?, ?)", [tuple(item) for item in content['balances']])
+        cursor.execute('SELECT * FROM blocks WHERE "index" > ? ORDER BY "index" ASC', (self.base_index if self.base_index > 0 else -1,))
+        for row in cursor.fetchall():
+            self._apply_block(cursor, Block.from_db_row(dict(row)), store_block=False)
+
+    @property
+    def pending_transactions(self) -> List[Dict]:
+        """Ảnh chụp hàng chờ theo thứ tự nhận (giữ cho mã cũ); thao tác thêm/gỡ đi qua self.mempool."""
+        return self.mempool.transactions()
+
+    def add_transaction(self, transaction: Dict) -> bool:
+        return self.mempool.add(transaction)
+
+    def mine_pending_transactions(self, miner_address: str, should_stop: Optional[Callable[[], bool]] = None) -> Optional[Block]:
+        """Khai thác một khối mới. Trả về None nếu bị hủy qua should_stop hoặc đỉnh chuỗi thay đổi giữa chừng."""
+        with self.mining_lock:
+            reward_tx = { 'sender_public_key_pem': "0", 'sender_address': "0", 'recipient_address': miner_address, 'amount': self.get_current_mining_reward(), 'timestamp': time.time(), 'signature': "mining_reward" }
+            # Chỉ lấy phần giao dịch vừa giới hạn khối; phần còn lại chờ khối sau
+            rejected_entries: List[MempoolEntry] = []
+            included_entries = self.template_builder.build(self.mempool.entries(), reward_tx, ledger=StagedLedger(self), rejected=rejected_entries)
+            if rejected_entries:
+                # Giao dịch xung đột với số dư đã xác nhận sẽ không bao giờ vào được khối: gỡ khỏi hàng chờ
+                self.mempool.remove_many(entry.tx_hash for entry in rejected_entries)
+                logging.info(f"Đã gỡ {len(rejected_entries)} giao dịch vượt quá số dư khỏi hàng chờ.")
+            included_transactions = [entry.transaction for entry in included_entries]
+            transactions_for_block = [reward_tx] + included_transactions
+            last_b = self.last_block
+            encoded_transactions = [canonical_json(reward_tx)] + [entry.encoded for entry in included_entries]
+            new_block = Block(index=last_b.index + 1, previous_hash=last_b.hash, timestamp=time.time(), transactions=transactions_for_block, encoded_transactions=encoded_transactions)
+            stop_check = lambda: (should_stop is not None and should_stop()) or self.last_block.hash != last_b.hash
+            if self.proof_of_work(new_block, should_stop=stop_check) is None: return None
+            self._add_block_to_db(new_block)
+            # Chỉ gỡ các giao dịch đã vào khối; giao dịch đến trong lúc đào vẫn được giữ lại
+            self.mempool.remove_many(entry.tx_hash for entry in included_entries)
+            return new_block
+
+    def add_block_from_peer(self, block_data: Dict) -> bool:
+        with self.mining_lock:
+            last_b = self.last_block
+            if block_data.get('index') != last_b.index + 1 or block_data.get('previous_hash') != last_b.hash: return False
+            block = Block.from_dict(block_data)
+            if block.version != block_version_at(block.index): return False
+            if 'hash' in block_data and block_data['hash'] != block.hash: return False
+            is_valid, reason = validate_block_transactions(self, block.transactions)
+            if not is_valid:
+                logging.warning(f"Từ chối khối #{block.index} từ peer: {reason}")
+                return False
+            self._add_block_to_db(block)
+            self.mempool.remove_confirmed(block.transactions)
+            self._evict_conflicting(block.transactions)
+        return True
+
+    def _evict_conflicting(self, transactions: List[Dict]):
+        """Gỡ các giao dịch chờ của những người gửi trong khối mà số dư mới không còn đủ chi."""
+        for sender in {tx.get('sender_address') for tx in transactions if tx.get('sender_address') not in (None, "0")}:
+            self.mempool.evict_overspending(sender, self.get_balance(sender))
+
+    def create_genesis_block(self):
+        genesis_tx = { 'sender_public_key_pem': "0", 'sender_address': "0", 'recipient_address': Config.FOUNDER_ADDRESS, 'amount': Config.INITIAL_SUPPLY_TOKENS, 'timestamp': time.time(), 'signature': "genesis_transaction" }
+        genesis_block = Block(index=0, previous_hash=Config.GENESIS_PREVIOUS_HASH, timestamp=time.time(), transactions=[genesis_tx], nonce=Config.GENESIS_NONCE)
+        self._add_block_to_db(genesis_block)
+        logging.info("✅ Khối Sáng thế đã được tạo và lưu vào SQLite.")
+
+    def get_current_mining_reward(self) -> float:
+        return mining_reward_at(self.last_block.index + 1)
+
+    def proof_of_work(self, block: Block, should_stop: Optional[Callable[[], bool]] = None) -> Optional[Dict[str, Any]]:
+        # Tuần tự hóa khối một lần, mỗi nonce chỉ băm tiếp từ midstate thay vì json.dumps lại toàn bộ khối
+        engine = ProofOfWorkEngine(block.get_hash_data(), self.difficulty)
+        started_at = time.time()
+        if self.mining_workers > 1:
+            nonce = parallel_search(engine, self.mining_workers, start=block.nonce, chunk_size=Config.POW_CHUNK_SIZE, should_stop=should_stop)
+        else:
+            nonce = engine.search(start=block.nonce, should_stop=should_stop)
+        if nonce is None: return None
+        block.nonce = nonce
+        block.hash = block.calculate_hash()
+        elapsed = time.time() - started_at
+        self.last_pow_stats = {
+            'workers': self.mining_workers, 'nonce': block.nonce, 'hashes': engine.hashes_tried,
+            'elapsed_seconds': round(elapsed, 4), 'hash_rate': round(engine.hashes_tried / elapsed, 2) if elapsed > 0 else None
+        }
+        return self.last_pow_stats
+
+    def get_balance(self, address: str) -> float:
+        return self._balance_in(self.storage.reader().cursor(), address)
+
+    @staticmethod
+    def _balance_in(cursor: sqlite3.Cursor, address: str) -> float:
+        cursor.execute("SELECT balance FROM balances WHERE address = ?", (address,))
+        row = cursor.fetchone()
+        return row['balance'] if row else 0.0
+
+    def get_full_chain_for_api(self) -> List[Dict]:
+        cursor = self.storage.reader().cursor()
+        cursor.execute('SELECT * FROM blocks ORDER BY "index" ASC')
+        rows = cursor.fetchall()
+        chain = [dict(row) for row in rows]
+        return chain
+
+    def get_blocks_range(self, start: int, end: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy các khối có chỉ số trong đoạn [start, end] (định dạng giống get_full_chain_for_api)."""
+        cursor = self.storage.reader().cursor()
+        # LIMIT -1 trong SQLite nghĩa là không giới hạn
+        if end is None:
+            cursor.execute('SELECT * FROM blocks WHERE "index" >= ? ORDER BY "index" ASC LIMIT ?', (start, limit if limit is not None else -1))
+        else:
+            cursor.execute('SELECT * FROM blocks WHERE "index" >= ? AND "index" <= ? ORDER BY "index" ASC LIMIT ?', (start, end, limit if limit is not None else -1))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_block(self, index: int) -> Optional[Dict]:
+        cursor = self.storage.reader().cursor()
+        cursor.execute('SELECT * FROM blocks WHERE "index" = ?', (index,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def has_block(self, block_hash: str) -> bool:
+        cursor = self.storage.reader().cursor()
+        cursor.execute("SELECT 1 FROM blocks WHERE hash = ?", (block_hash,))
+        return cursor.fetchone() is not None
+
+    def get_latest_blocks(self, count: int) -> List[Dict]:
+        """Lấy `count` khối mới nhất, sắp xếp tăng dần theo chỉ số."""
+        cursor = self.storage.reader().cursor()
+        cursor.execute('SELECT * FROM (SELECT * FROM blocks ORDER BY "index" DESC LIMIT ?) ORDER BY "index" ASC', (count,))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_headers_range(self, start: int, end: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy phần đầu khối (không kèm giao dịch) trong đoạn [start, end], dùng cho đồng bộ header-trước."""
+        cursor = self.storage.reader().cursor()
+        end = end if end is not None else self.last_block.index
+        cursor.execute('SELECT "index", hash, previous_hash, timestamp, nonce, version, merkle_root FROM blocks WHERE "index" >= ? AND "index" <= ? ORDER BY "index" ASC LIMIT ?',
+                       (start, end, limit if limit is not None else -1))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Tra cứu một giao dịch đã được xác nhận theo mã băm (index seek trên bảng transactions)."""
+        cursor = self.storage.reader().cursor()
+        cursor.execute('SELECT t.tx_hash, t.block_index, t.position, t.data, b.hash AS block_hash FROM transactions t JOIN blocks b ON b."index" = t.block_index WHERE t.tx_hash = ? ORDER BY t.block_index ASC LIMIT 1', (tx_hash,))
+        row = cursor.fetchone()
+        return self._transaction_row_to_dict(row) if row else None
+
+    def get_transaction_proof(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Bằng chứng Merkle cho một giao dịch đã xác nhận: lá, đường dẫn anh em và merkle_root của khối chứa nó.
+        Khối phiên bản 1 không có Merkle root nên trả về merkle_root=None và không có proof.
+        """
+        tx_record = self.get_transaction(tx_hash)
+        if not tx_record: return None
+        block = self.get_block_object(tx_record['block_index'])
+        result = {'tx_hash': tx_hash, 'block_index': block.index, 'block_hash': block.hash, 'block_version': block.version,
+                  'position': tx_record['position'], 'merkle_root': block.merkle_root, 'leaf': None, 'proof': None}
+        if block.version < 2: return result
+        leaves = [leaf_from_encoded(encoded) for encoded in block.get_encoded_transactions()]
+        result['leaf'] = leaves[tx_record['position']]
+        result['proof'] = build_merkle_proof(leaves, tx_record['position'])
+        result['header'] = block.get_hash_data()
+        return result
+
+    def get_transactions_for_address(self, address: str, limit: int = 50, before: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Lấy các giao dịch gửi đi và nhận về của một địa chỉ, mới nhất trước.
+        before=(block_index, position) chỉ lấy các giao dịch đứng trước vị trí đó (con trỏ phân trang, không bao gồm chính nó).
+        Mỗi nhánh là một index seek trên (địa chỉ, block_index, position) nên chi phí mỗi trang không phụ thuộc độ sâu của trang.
+        """
+        before_index, before_position = before if before is not None else (2 ** 62, 0)
+        cursor = self.storage.reader().cursor()
+        cursor.execute("""
+            SELECT t.tx_hash, t.block_index, t.position, t.data, b.hash AS block_hash FROM (
+                SELECT * FROM (SELECT tx_hash, block_index, position, data FROM transactions WHERE sender_address = ? AND (block_index, position) < (?, ?) ORDER BY block_index DESC, position DESC LIMIT ?)
+                UNION
+                SELECT * FROM (SELECT tx_hash, block_index, position, data FROM transactions WHERE recipient_address = ? AND (block_index, position) < (?, ?) ORDER BY block_index DESC, position DESC LIMIT ?)
+            ) t JOIN blocks b ON b."index" = t.block_index
+            ORDER BY t.block_index DESC, t.position DESC LIMIT ?
+        """, (address, before_index, before_position, limit, address, before_index, before_position, limit, limit))
+        return [self._transaction_row_to_dict(row) for row in cursor.fetchall()]
+
+    def get_public_key(self, address: str) -> Optional[Dict[str, Any]]:
+        """Khóa công khai đã được công bố trên chuỗi của một địa chỉ (tra theo khóa chính)."""
+        cursor = self.storage.reader().cursor()
+        cursor.execute("SELECT address, public_key_pem, first_seen_block FROM public_keys WHERE address = ?", (address,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def get_public_keys(self, addresses: List[str]) -> Dict[str, str]:
+        """Tra nhiều địa chỉ cùng lúc; địa chỉ chưa từng gửi tiền sẽ không có trong kết quả."""
+        cursor = self.storage.reader().cursor()
+        unique_addresses, result = list(dict.fromkeys(addresses)), {}
+        for i in range(0, len(unique_addresses), 500):
+            chunk = unique_addresses[i:i + 500]
+            cursor.execute(f"SELECT address, public_key_pem FROM public_keys WHERE address IN ({', '.join('?' * len(chunk))})", chunk)
+            result.update({row['address']: row['public_key_pem'] for row in cursor.fetchall()})
+        return result
+
+    # --- ẢNH CHỤP SỐ DƯ ---
+    def get_snapshot(self, block_index: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Lấy ảnh chụp tại block_index (mặc định: ảnh mới nhất), dữ liệu vẫn ở dạng nén."""
+        cursor = self.storage.reader().cursor()
+        if block_index is None:
+            cursor.execute("SELECT * FROM snapshots ORDER BY block_index DESC LIMIT 1")
+        else:
+            cursor.execute("SELECT * FROM snapshots WHERE block_index = ?", (block_index,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def restore_from_snapshot(self, snapshot: Dict[str, Any]) -> bool:
+        """
+        Khởi động chuỗi cục bộ từ một ảnh chụp (định dạng của /snapshot/latest) thay vì phát lại từ genesis.
+        Chuỗi cục bộ phải thấp hơn độ cao ảnh chụp; các khối sau đó được đồng bộ như bình thường.
+        Lịch sử giao dịch và khóa công khai trước ảnh chụp sẽ không có trên nút này.
+        """
+        parsed = snapshot_from_api(snapshot)
+        if parsed is None:
+            logging.warning("Ảnh chụp không hợp lệ (dữ liệu hỏng hoặc không khớp state_hash), bỏ qua.")
+            return False
+        block_data, balances = parsed
+        try:
+            normalize_chain([block_data])
+            checkpoint_hash = Config.CHECKPOINTS.get(block_data['index'])
+            if (checkpoint_hash is not None and checkpoint_hash != block_data['hash']) or not verify_block_hashes([block_data]):
+                logging.warning(f"Khối #{block_data['index']} của ảnh chụp không hợp lệ, bỏ qua.")
+                return False
+            block = Block.from_dict(block_data, trust_hash=True)
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Khối của ảnh chụp không đọc được: {e}")
+            return False
+        if block.index <= self.last_block.index: return False
+        with self.storage.write_lock:
+            try:
+                with self.storage.write() as cursor:
+                    for table in ('blocks', 'transactions', 'public_keys', 'balances', 'balance_undo', 'snapshots'):
+                        cursor.execute(f"DELETE FROM {table}")
+                    # Chỉ lưu khối tại độ cao ảnh chụp, số dư đã gồm tác động của chính khối này
+                    self._store_block(cursor, block)
+                    cursor.executemany("INSERT INTO balances (address, balance) VALUES (?, ?)", [tuple(item) for item in balances])
+                    cursor.execute("INSERT INTO snapshots (block_index, block_hash, state_hash, balance_count, data, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                   (block.index, block.hash, snapshot['state_hash'], len(balances), base64.b64decode(snapshot['data']), time.time()))
+                    cursor.execute("INSERT OR REPLACE INTO chain_meta (key, value) VALUES ('snapshot_base', ?)", (str(block.index),))
+                self.base_index = block.index
+            finally:
+                self._invalidate_block_cache()
+        self.mempool.remove_confirmed(block.transactions)
+        logging.info(f"✅ Đã khởi động chuỗi từ ảnh chụp tại khối #{block.index} ({len(balances)} địa chỉ).")
+        return True
+
+    @staticmethod
+    def _transaction_row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {'tx_hash': row['tx_hash'], 'block_index': row['block_index'], 'block_hash': row['block_hash'], 'position': row['position'], 'transaction': json.loads(row['data'])}
+    
+    @staticmethod
+    def is_chain_valid(chain_to_validate: List[Dict]) -> bool:
+        """Xác thực một chuỗi đầy đủ từ genesis (không cần chuỗi cục bộ). Xem sok/validation.py."""
+        return validate_full_chain(chain_to_validate)
+
+    def validate_candidate_chain(self, candidate_chain: List[Dict]) -> Optional[int]:
+        """Xác thực chuỗi ứng viên từ điểm rẽ nhánh; trả về fork_index nếu hợp lệ, None nếu không."""
+        return ChainValidator(self).validate(candidate_chain)
+
+    def resolve_conflicts(self) -> bool:
+        """Đồng bộ với mạng lưới: hỏi chiều cao các peer song song, tải header trước rồi tải thân khối theo đoạn (xem sok/sync.py)."""
+        if self.synchronizer is None:
+            from .sync import ChainSynchronizer  # import muộn để tránh vòng lặp import
+            self.synchronizer = ChainSynchronizer(self)
+        return self.synchronizer.sync()
+
+    def replace_chain(self, new_chain_data: List[Dict]) -> bool:
+        """Xác thực rồi thay chuỗi cục bộ bằng chuỗi ứng viên; chỉ các khối sau điểm rẽ nhánh bị băm lại và ghi."""
+        fork_index = self.validate_candidate_chain(new_chain_data)
+        if fork_index is None:
+            logging.warning("Chuỗi ứng viên không hợp lệ, bỏ qua.")
+            return False
+        new_blocks = [Block.from_dict(block_data, trust_hash=True) for block_data in new_chain_data if block_data['index'] > fork_index]
+        return self.apply_fork(fork_index, new_blocks)
+
+    def apply_fork(self, fork_index: int, new_blocks: List[Block]) -> bool:
+        """Áp dụng các khối new_blocks nối tiếp khối #fork_index của chuỗi cục bộ, trong một giao dịch."""
+        try:
+            # Không giữ mining_lock: job đang đào sẽ tự dừng khi thấy đỉnh chuỗi thay đổi
+            orphaned_transactions = self._reorganize(fork_index, new_blocks)
+            self._requeue_after_reorg(orphaned_transactions, new_blocks)
+            logging.info(f"✅ Đã thay thế chuỗi thành công! (rẽ nhánh tại khối #{fork_index}, áp dụng {len(new_blocks)} khối mới)")
+            return True
+        except Exception as e:
+            logging.error(f"Lỗi khi thay thế chuỗi, đã hoàn tác: {e}")
+            return False
+
+    def _requeue_after_reorg(self, orphaned_transactions: List[Dict], new_blocks: List[Block]):
+        """Đưa giao dịch của nhánh bị loại về hàng chờ và gỡ những giao dịch đã có trong chuỗi mới."""
+        confirmed_hashes = {calculate_transaction_hash(tx) for block in new_blocks for tx in block.transactions}
+        self.mempool.remove_many(confirmed_hashes)
+        for tx in orphaned_transactions:
+            if tx.get('sender_address') == "0": continue
+            tx_hash = calculate_transaction_hash(tx)
+            if tx_hash not in confirmed_hashes: self.mempool.add(tx, tx_hash)
+        self._evict_conflicting([tx for block in new_blocks for tx in block.transactions])
+
+    def calculate_actual_total_supply(self) -> float:
+        try:
+            cursor = self.storage.reader().cursor()
+            cursor.execute("SELECT SUM(balance) FROM balances")
+            result = cursor.fetchone()
+            return float(result[0]) if result and result[0] is not None else 0.0
+        except Exception as e:
+            logging.error(f"LỖI DB khi tính tổng cung: {e}")
+            return 0.0
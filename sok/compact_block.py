@@ -0,0 +1,65 @@
+# sok/compact_block.py
+# -*- coding: utf-8 -*-
+
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+from .utils import Config, calculate_transaction_hash
+
+if TYPE_CHECKING:
+    from .mempool import MempoolEntry
+
+# Khối rút gọn: phần đầu khối + mã ngắn của từng giao dịch thay cho toàn bộ nội dung.
+# Giao dịch thưởng (vị trí 0) không thể có trong mempool của peer nên luôn được gửi kèm đầy đủ.
+# Mã ngắn được "muối" bằng hash của khối: mỗi khối một bảng mã khác nhau, không thể chuẩn bị trước giao dịch trùng mã.
+
+def short_transaction_id(block_hash: str, tx_hash: str) -> str:
+    return hashlib.sha256(f"{block_hash}:{tx_hash}".encode('utf-8')).hexdigest()[:Config.COMPACT_SHORT_ID_HEX]
+
+def build_compact_block(block_data: Dict[str, Any]) -> Dict[str, Any]:
+    transactions = block_data['transactions']
+    compact = {key: value for key, value in block_data.items() if key != 'transactions'}
+    compact['tx_count'] = len(transactions)
+    compact['prefilled'] = [{'index': 0, 'tx': transactions[0]}] if transactions else []
+    compact['short_ids'] = [short_transaction_id(block_data['hash'], calculate_transaction_hash(tx)) for tx in transactions[1:]]
+    return compact
+
+def reconstruct_transactions(compact: Dict[str, Any], mempool_entries: List['MempoolEntry']) -> Tuple[List[Optional[Dict[str, Any]]], List[int]]:
+    """
+    Dựng lại danh sách giao dịch từ mempool. Trả về (danh sách giao dịch, vị trí còn thiếu); vị trí thiếu mang giá trị None.
+    Mã ngắn trùng nhau trong mempool được coi là thiếu. Raise ValueError nếu thông điệp không nhất quán.
+    """
+    tx_count, prefilled, short_ids = compact['tx_count'], compact['prefilled'], compact['short_ids']
+    if not isinstance(tx_count, int) or len(prefilled) + len(short_ids) != tx_count:
+        raise ValueError("Số giao dịch của khối rút gọn không khớp.")
+    transactions: List[Optional[Dict[str, Any]]] = [None] * tx_count
+    prefilled_positions = set()
+    for item in prefilled:
+        position = item['index']
+        if not isinstance(position, int) or not 0 <= position < tx_count or position in prefilled_positions:
+            raise ValueError("Vị trí giao dịch gửi kèm không hợp lệ.")
+        transactions[position] = item['tx']
+        prefilled_positions.add(position)
+
+    by_short_id: Dict[str, Optional[Dict[str, Any]]] = {}
+    for entry in mempool_entries:
+        short_id = short_transaction_id(compact['hash'], entry.tx_hash)
+        by_short_id[short_id] = None if short_id in by_short_id else entry.transaction
+    missing = []
+    remaining_positions = (position for position in range(tx_count) if position not in prefilled_positions)
+    for position, short_id in zip(remaining_positions, short_ids):
+        transactions[position] = by_short_id.get(short_id)
+        if transactions[position] is None: missing.append(position)
+    return transactions, missing
+
+def fill_transactions(transactions: List[Optional[Dict[str, Any]]], filled_items: List[Dict[str, Any]]) -> List[int]:
+    """Điền các giao dịch peer gửi bổ sung; trả về các vị trí vẫn còn thiếu."""
+    for item in filled_items:
+        position = item.get('index')
+        if isinstance(position, int) and 0 <= position < len(transactions) and transactions[position] is None and isinstance(item.get('tx'), dict):
+            transactions[position] = item['tx']
+    return [position for position, tx in enumerate(transactions) if tx is None]
+
+def assemble_block(compact: Dict[str, Any], transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    block_data = {key: value for key, value in compact.items() if key not in ('tx_count', 'prefilled', 'short_ids')}
+    block_data['transactions'] = transactions
+    return block_data
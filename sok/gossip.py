@@ -0,0 +1,203 @@
+# sok/gossip.py
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import queue
+import logging
+import threading
+import zlib
+import requests
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .relay import INV_BLOCK, INV_TX, INV_ENDPOINTS
+from .compact_block import build_compact_block
+from .utils import Config, LRUCache, calculate_transaction_hash
+
+# Header cho biết địa chỉ của nút gửi, để nút nhận không công bố ngược lại đối tượng vừa nhận
+PEER_ADDRESS_HEADER = 'X-Sok-Peer'
+
+logger = logging.getLogger(__name__)
+
+class GossipBroadcaster:
+    """
+    Lan truyền khối/giao dịch tới các peer ở nền, để /transactions/new và /mine trả lời ngay.
+    - Mỗi peer luôn được gán cho cùng một luồng gửi: thứ tự khối tới từng peer được giữ nguyên,
+      và requests.Session (keep-alive) của peer chỉ được dùng bởi một luồng.
+    - Hàng đợi có giới hạn; khi đầy, thông điệp bị bỏ và được đếm lại thay vì chặn luồng gọi.
+    - Peer gửi lỗi bị tạm ngưng với thời gian chờ tăng gấp đôi sau mỗi lần lỗi liên tiếp.
+    Khối và giao dịch được công bố theo inventory: gửi mã băm tới /inv, chỉ gửi nội dung khi peer yêu cầu;
+    peer đã biết một mã băm (đã công bố cho ta hoặc đã nhận từ ta) không được công bố lại mã đó.
+    Khối được gửi ở dạng rút gọn (sok/compact_block.py); peer chỉ yêu cầu thêm các giao dịch nó chưa có.
+    """
+    def __init__(self, get_peer_addresses: Callable[[], List[str]], workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 self_address: Optional[str] = None):
+        self.get_peer_addresses = get_peer_addresses
+        self.headers = {'Content-Type': 'application/json'}
+        if self_address: self.headers[PEER_ADDRESS_HEADER] = self_address
+        self.workers = max(1, workers if workers is not None else Config.GOSSIP_WORKERS)
+        queue_size = queue_size if queue_size is not None else Config.GOSSIP_QUEUE_SIZE
+        self.queues: List['queue.Queue[Tuple[str, str, bytes, Optional[Dict[str, str]], Optional[bytes]]]'] = [queue.Queue(maxsize=max(1, queue_size // self.workers)) for _ in range(self.workers)]
+        self.is_running = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self._sessions: Dict[str, requests.Session] = {}
+        self._backoff: Dict[str, Tuple[int, float]] = {}  # địa chỉ -> (số lần lỗi liên tiếp, thời điểm được thử lại)
+        self._known: Dict[str, LRUCache] = {}  # địa chỉ -> các mã băm peer đã có
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            'queued': 0, 'sent': 0, 'failed': 0, 'dropped_queue_full': 0, 'skipped_backoff': 0,
+            'inv_sent': 0, 'payloads_requested': 0, 'skipped_known': 0,
+            'compact_blocks_sent': 0, 'compact_missing_txs': 0, 'full_block_fallbacks': 0
+        }
+
+    def start(self):
+        if self.is_running.is_set(): return
+        self.is_running.set()
+        self.threads = [threading.Thread(target=self._run, args=(q,), daemon=True, name=f"Gossip-{i}") for i, q in enumerate(self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.is_running.clear()
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    # --- PEER ĐÃ BIẾT ĐỐI TƯỢNG NÀO ---
+    def mark_known(self, address: str, object_hash: str):
+        with self._lock:
+            known = self._known.get(address)
+            if known is None: known = self._known[address] = LRUCache(Config.RELAY_PEER_KNOWN_SIZE)
+        known.put(object_hash, True)
+
+    def _is_known(self, address: str, object_hash: str) -> bool:
+        with self._lock:
+            known = self._known.get(address)
+        return known is not None and bool(known.get(object_hash))
+
+    # --- CÔNG BỐ / GỬI ---
+    def announce_block(self, block_data: Dict[str, Any], exclude: Optional[str] = None) -> int:
+        compact = build_compact_block(block_data) if Config.COMPACT_BLOCKS_ENABLED else None
+        return self._enqueue(INV_ENDPOINTS[INV_BLOCK], block_data, {'type': INV_BLOCK, 'hash': block_data['hash']}, exclude, compact)
+
+    def announce_transaction(self, transaction: Dict[str, Any], exclude: Optional[str] = None) -> int:
+        return self._enqueue(INV_ENDPOINTS[INV_TX], transaction, {'type': INV_TX, 'hash': calculate_transaction_hash(transaction)}, exclude)
+
+    def broadcast(self, endpoint: str, data: Dict[str, Any]) -> int:
+        """Gửi thẳng nội dung (không qua inventory) tới mọi peer đang không bị tạm ngưng. Trả về số peer được xếp hàng."""
+        return self._enqueue(endpoint, data, None, None)
+
+    def _enqueue(self, endpoint: str, data: Dict[str, Any], inv_item: Optional[Dict[str, str]], exclude: Optional[str],
+                 compact: Optional[Dict[str, Any]] = None) -> int:
+        body = json.dumps(data).encode('utf-8')  # tuần tự hóa một lần cho mọi peer
+        compact_body = json.dumps(compact).encode('utf-8') if compact is not None else None
+        now, queued = time.time(), 0
+        for address in self.get_peer_addresses():
+            if address == exclude: continue
+            if inv_item is not None and self._is_known(address, inv_item['hash']):
+                self._count('skipped_known')
+                continue
+            with self._lock:
+                retry_at = self._backoff.get(address, (0, 0.0))[1]
+            if retry_at > now:
+                self._count('skipped_backoff')
+                continue
+            try:
+                self.queues[zlib.crc32(address.encode('utf-8')) % self.workers].put_nowait((address, endpoint, body, inv_item, compact_body))
+                queued += 1
+            except queue.Full:
+                self._count('dropped_queue_full')
+        self._count('queued', queued)
+        return queued
+
+    def _run(self, jobs: 'queue.Queue[Tuple[str, str, bytes, Optional[Dict[str, str]], Optional[bytes]]]'):
+        while self.is_running.is_set():
+            try:
+                address, endpoint, body, inv_item, compact_body = jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self._send(address, endpoint, body, inv_item, compact_body)
+            except Exception as e:
+                # Phản hồi bất thường của một peer không được làm chết luồng: mọi peer gắn với luồng này sẽ không bao giờ được gửi nữa
+                self._count('failed')
+                logger.warning(f"[Gossip] Lỗi không mong đợi khi gửi {endpoint} tới {address}: {e}")
+
+    def _send(self, address: str, endpoint: str, body: bytes, inv_item: Optional[Dict[str, str]] = None, compact_body: Optional[bytes] = None):
+        with self._lock:
+            if self._backoff.get(address, (0, 0.0))[1] > time.time():
+                self.stats['skipped_backoff'] += 1
+                return
+            session = self._sessions.get(address)
+            if session is None:
+                session = self._sessions[address] = requests.Session()
+        try:
+            if inv_item is not None and self._is_known(address, inv_item['hash']): return
+            if inv_item is None:
+                session.post(f"{address}{endpoint}", data=body, headers=self.headers, timeout=Config.GOSSIP_REQUEST_TIMEOUT)
+            elif self._peer_wants(session, address, inv_item):
+                if compact_body is not None:
+                    self._send_compact_block(session, address, endpoint, body, compact_body)
+                else:
+                    session.post(f"{address}{endpoint}", data=body, headers=self.headers, timeout=Config.GOSSIP_REQUEST_TIMEOUT)
+            if inv_item is not None: self.mark_known(address, inv_item['hash'])
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                failures = self._backoff.get(address, (0, 0.0))[0] + 1
+                delay = min(Config.GOSSIP_BACKOFF_BASE_SECONDS * 2 ** (failures - 1), Config.GOSSIP_BACKOFF_MAX_SECONDS)
+                self._backoff[address] = (failures, time.time() + delay)
+                self.stats['failed'] += 1
+            logger.debug(f"[Gossip] Gửi {endpoint} tới {address} thất bại ({failures} lần liên tiếp), tạm ngưng {delay}s: {e}")
+            return
+        with self._lock:
+            self._backoff.pop(address, None)
+            self.stats['sent'] += 1
+
+    def _peer_wants(self, session: requests.Session, address: str, inv_item: Dict[str, str]) -> bool:
+        """Công bố một mã băm; True nếu peer yêu cầu nội dung. Peer phiên bản cũ chưa có /inv luôn nhận nội dung."""
+        response = session.post(f"{address}/inv", data=json.dumps({'inventory': [inv_item]}).encode('utf-8'), headers=self.headers, timeout=Config.GOSSIP_REQUEST_TIMEOUT)
+        self._count('inv_sent')
+        if response.status_code == 404: return True
+        wanted_items = self._reply_json(response).get('wanted') if response.status_code == 200 else None
+        wanted = isinstance(wanted_items, list) and any(isinstance(item, dict) and item.get('hash') == inv_item['hash'] for item in wanted_items)
+        if wanted: self._count('payloads_requested')
+        return wanted
+
+    def _send_compact_block(self, session: requests.Session, address: str, endpoint: str, body: bytes, compact_body: bytes):
+        """Gửi khối rút gọn, gửi bổ sung các giao dịch peer còn thiếu; gửi khối đầy đủ nếu peer không dựng lại được."""
+        self._count('compact_blocks_sent')
+        response = session.post(f"{address}/blocks/compact", data=compact_body, headers=self.headers, timeout=Config.GOSSIP_REQUEST_TIMEOUT)
+        status = 'need_full' if response.status_code == 404 else self._reply_status(response)
+        if status == 'missing':
+            block_data = json.loads(body)
+            transactions = block_data['transactions']
+            missing = self._reply_json(response).get('missing')
+            missing = [position for position in missing if isinstance(position, int) and 0 <= position < len(transactions)] if isinstance(missing, list) else []
+            self._count('compact_missing_txs', len(missing))
+            fill = {'hash': block_data['hash'], 'transactions': [{'index': position, 'tx': transactions[position]} for position in missing]}
+            response = session.post(f"{address}/blocks/compact/fill", data=json.dumps(fill).encode('utf-8'), headers=self.headers, timeout=Config.GOSSIP_REQUEST_TIMEOUT)
+            status = self._reply_status(response)
+        if status == 'need_full':
+            self._count('full_block_fallbacks')
+            session.post(f"{address}{endpoint}", data=body, headers=self.headers, timeout=Config.GOSSIP_REQUEST_TIMEOUT)
+
+    @staticmethod
+    def _reply_json(response: requests.Response) -> Dict[str, Any]:
+        """Nội dung JSON của phản hồi nếu là một object; peer trả về dữ liệu khác (hoặc không phải JSON) được coi như object rỗng."""
+        try:
+            data = response.json()
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @classmethod
+    def _reply_status(cls, response: requests.Response) -> Optional[str]:
+        return cls._reply_json(response).get('status')
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                **self.stats, 'workers': self.workers, 'pending': sum(q.qsize() for q in self.queues),
+                'peers_in_backoff': sum(1 for _, retry_at in self._backoff.values() if retry_at > now)
+            }
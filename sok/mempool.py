@@ -0,0 +1,167 @@
+# sok/mempool.py
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+from .utils import Config, calculate_transaction_hash, canonical_json
+
+logger = logging.getLogger(__name__)
+
+class MempoolEntry:
+    """
+    Một giao dịch đang chờ cùng các thông tin tính sẵn một lần khi nhận vào.
+    encoded là chuỗi JSON chuẩn tắc của giao dịch, được dùng lại khi băm khối thay vì tuần tự hóa lại.
+    """
+    def __init__(self, transaction: Dict[str, Any], tx_hash: str, encoded: str):
+        self.transaction = transaction
+        self.tx_hash = tx_hash
+        self.encoded = encoded
+        self.sender_address: str = transaction.get('sender_address', '')
+        self.amount: float = float(transaction.get('amount', 0) or 0)
+        self.size = len(encoded)
+        self.added_at = time.time()
+
+class Mempool:
+    """
+    Hàng chờ giao dịch có chỉ mục, an toàn đa luồng.
+    - Khóa theo mã băm giao dịch: thêm/gỡ O(1), thứ tự chèn chính là thứ tự tuổi.
+    - Chỉ mục theo người gửi và tổng số tiền đang chờ chi của từng địa chỉ.
+    - Giới hạn theo số lượng và số byte; khi vượt, giao dịch cũ nhất bị loại trước. Giao dịch quá hạn cũng bị loại.
+    """
+    def __init__(self, max_transactions: Optional[int] = None, max_bytes: Optional[int] = None, expiry_seconds: Optional[float] = None):
+        self.max_transactions = max_transactions if max_transactions is not None else Config.MEMPOOL_MAX_TRANSACTIONS
+        self.max_bytes = max_bytes if max_bytes is not None else Config.MEMPOOL_MAX_BYTES
+        self.expiry_seconds = expiry_seconds if expiry_seconds is not None else Config.MEMPOOL_EXPIRY_SECONDS
+        self._entries: 'OrderedDict[str, MempoolEntry]' = OrderedDict()
+        self._by_sender: Dict[str, 'OrderedDict[str, None]'] = {}
+        self._pending_spend: Dict[str, float] = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self.evicted_count = 0
+        self.expired_count = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, tx_hash: str) -> bool:
+        return tx_hash in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    # --- THÊM / GỠ ---
+    def add(self, transaction: Dict[str, Any], tx_hash: Optional[str] = None) -> bool:
+        """Thêm giao dịch. Trả về False nếu đã có trong hàng chờ hoặc quá lớn so với giới hạn byte."""
+        tx_hash = tx_hash or calculate_transaction_hash(transaction)
+        with self._lock:
+            if tx_hash in self._entries: return False
+            encoded = canonical_json(transaction)
+            size = len(encoded)
+            if size > self.max_bytes: return False
+            self._expire_locked(time.time())
+            while self._entries and (len(self._entries) >= self.max_transactions or self._total_bytes + size > self.max_bytes):
+                oldest_hash = next(iter(self._entries))
+                self._remove_locked(oldest_hash)
+                self.evicted_count += 1
+                logger.info(f"[Mempool] Hàng chờ đầy, loại giao dịch cũ nhất {oldest_hash[:10]}...")
+            entry = MempoolEntry(transaction, tx_hash, encoded)
+            self._entries[tx_hash] = entry
+            self._by_sender.setdefault(entry.sender_address, OrderedDict())[tx_hash] = None
+            self._pending_spend[entry.sender_address] = self._pending_spend.get(entry.sender_address, 0.0) + entry.amount
+            self._total_bytes += size
+            return True
+
+    def remove(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._remove_locked(tx_hash)
+            return entry.transaction if entry else None
+
+    def remove_many(self, tx_hashes: Iterable[str]) -> int:
+        with self._lock:
+            return sum(1 for tx_hash in tx_hashes if self._remove_locked(tx_hash) is not None)
+
+    def remove_confirmed(self, transactions: Iterable[Dict[str, Any]]) -> int:
+        """Gỡ các giao dịch vừa được xác nhận trong một khối. Chi phí tỉ lệ với số giao dịch của khối, không phải của hàng chờ."""
+        return self.remove_many([calculate_transaction_hash(tx) for tx in transactions])
+
+    def evict_overspending(self, sender_address: str, balance: float) -> int:
+        """
+        Gỡ các giao dịch chờ của một người gửi mà số dư đã xác nhận không còn đủ chi, giữ giao dịch cũ trước.
+        Dùng sau khi một khối từ peer đã chi số dư này bằng giao dịch khác (xung đột với hàng chờ).
+        """
+        with self._lock:
+            spend, overspending = 0.0, []
+            for tx_hash in self._by_sender.get(sender_address, ()):
+                amount = self._entries[tx_hash].amount
+                if spend + amount > balance: overspending.append(tx_hash)
+                else: spend += amount
+            for tx_hash in overspending:
+                self._remove_locked(tx_hash)
+            if overspending:
+                logger.info(f"[Mempool] Gỡ {len(overspending)} giao dịch vượt số dư của {sender_address[:10]}...")
+            return len(overspending)
+
+    def _remove_locked(self, tx_hash: str) -> Optional[MempoolEntry]:
+        entry = self._entries.pop(tx_hash, None)
+        if entry is None: return None
+        sender_hashes = self._by_sender.get(entry.sender_address)
+        if sender_hashes is not None:
+            sender_hashes.pop(tx_hash, None)
+            if not sender_hashes:
+                del self._by_sender[entry.sender_address]
+                self._pending_spend.pop(entry.sender_address, None)
+            else:
+                self._pending_spend[entry.sender_address] -= entry.amount
+        self._total_bytes -= entry.size
+        return entry
+
+    def expire(self) -> int:
+        with self._lock:
+            return self._expire_locked(time.time())
+
+    def _expire_locked(self, now: float) -> int:
+        if self.expiry_seconds <= 0: return 0
+        expired = 0
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if now - oldest.added_at < self.expiry_seconds: break
+            self._remove_locked(oldest.tx_hash)
+            expired += 1
+        self.expired_count += expired
+        return expired
+
+    # --- TRUY VẤN ---
+    def get(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(tx_hash)
+            return entry.transaction if entry else None
+
+    def entries(self) -> List[MempoolEntry]:
+        """Ảnh chụp các mục theo thứ tự tuổi (cũ nhất trước)."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def transactions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [entry.transaction for entry in self._entries.values()]
+
+    def get_by_sender(self, sender_address: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._entries[tx_hash].transaction for tx_hash in self._by_sender.get(sender_address, ())]
+
+    def get_pending_spend(self, sender_address: str) -> float:
+        """Tổng số tiền địa chỉ này đang chờ chi trong các giao dịch chưa được xác nhận."""
+        with self._lock:
+            return self._pending_spend.get(sender_address, 0.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'count': len(self._entries), 'bytes': self._total_bytes, 'senders': len(self._by_sender),
+                'max_transactions': self.max_transactions, 'max_bytes': self.max_bytes,
+                'evicted': self.evicted_count, 'expired': self.expired_count
+            }
@@ -0,0 +1,49 @@
+# sok/merkle.py
+# -*- coding: utf-8 -*-
+
+import hashlib
+from typing import Dict, List
+from .utils import hash_data
+
+def transaction_leaf(transaction: Dict) -> str:
+    """Lá của cây Merkle: băm toàn bộ giao dịch (kể cả chữ ký) để khối cam kết đúng dữ liệu đã lưu."""
+    return hash_data(transaction)
+
+def leaf_from_encoded(encoded_transaction: str) -> str:
+    """Như transaction_leaf nhưng từ chuỗi JSON chuẩn tắc đã có sẵn."""
+    return hash_data(encoded_transaction)
+
+def _hash_pair(left: str, right: str) -> str:
+    return hashlib.sha256(bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+def _next_level(level: List[str]) -> List[str]:
+    # Số nút lẻ thì nhân đôi nút cuối, giống cách của Bitcoin
+    if len(level) % 2 == 1: level = level + [level[-1]]
+    return [_hash_pair(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+
+def merkle_root_from_leaves(leaves: List[str]) -> str:
+    if not leaves: return hash_data(b'')
+    level = list(leaves)
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+def compute_merkle_root(transactions: List[Dict]) -> str:
+    return merkle_root_from_leaves([transaction_leaf(tx) for tx in transactions])
+
+def build_merkle_proof(leaves: List[str], position: int) -> List[Dict[str, str]]:
+    """Đường dẫn chứng minh cho lá thứ position: danh sách {'hash', 'side'} từ dưới lên, side là vị trí của nút anh em."""
+    if not 0 <= position < len(leaves): raise IndexError(f"Vị trí lá {position} nằm ngoài cây {len(leaves)} lá.")
+    proof, level = [], list(leaves)
+    while len(level) > 1:
+        if len(level) % 2 == 1: level = level + [level[-1]]
+        sibling = position ^ 1
+        proof.append({'hash': level[sibling], 'side': 'left' if sibling < position else 'right'})
+        level, position = _next_level(level), position // 2
+    return proof
+
+def verify_merkle_proof(leaf: str, proof: List[Dict[str, str]], merkle_root: str) -> bool:
+    current = leaf
+    for step in proof:
+        current = _hash_pair(step['hash'], current) if step['side'] == 'left' else _hash_pair(current, step['hash'])
+    return current == merkle_root
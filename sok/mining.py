@@ -0,0 +1,139 @@
+# sok/mining.py
+# -*- coding: utf-8 -*-
+
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from .blockchain import Blockchain, Block
+
+logger = logging.getLogger(__name__)
+
+class MiningJob:
+    """Một yêu cầu khai thác chạy nền. Trạng thái: queued -> running -> done | cancelled | failed."""
+    ACTIVE_STATES = ('queued', 'running')
+
+    def __init__(self, miner_address: str, base_hash: str, base_index: int):
+        self.job_id: str = uuid.uuid4().hex
+        self.miner_address = miner_address
+        self.base_hash = base_hash
+        self.base_index = base_index
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.block: Optional[Dict[str, Any]] = None
+        self.pow_stats: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in self.ACTIVE_STATES
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status, self.error, self.finished_at = status, error, time.time()
+        self.done_event.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id, 'status': self.status, 'miner_address': self.miner_address,
+            'base_index': self.base_index, 'base_hash': self.base_hash,
+            'created_at': self.created_at, 'started_at': self.started_at, 'finished_at': self.finished_at,
+            'block': self.block, 'pow_stats': self.pow_stats, 'error': self.error
+        }
+
+class MiningWorker:
+    """
+    Luồng khai thác nền của node: nhận job qua hàng đợi và chạy PoW ngoài luồng xử lý HTTP.
+    Các yêu cầu cùng thợ mỏ trên cùng đỉnh chuỗi được gộp vào một job đang chờ/đang chạy.
+    """
+    def __init__(self, blockchain: Blockchain, on_block_mined: Optional[Callable[[Block], None]] = None, max_finished_jobs: int = 200):
+        self.blockchain = blockchain
+        self.on_block_mined = on_block_mined
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: 'OrderedDict[str, MiningJob]' = OrderedDict()
+        self.jobs_lock = threading.Lock()
+        self.job_queue: 'queue.Queue[MiningJob]' = queue.Queue()
+        self.is_running = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive(): return
+        self.is_running.set()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="Mining-Worker")
+        self.thread.start()
+
+    def stop(self):
+        self.is_running.clear()
+        with self.jobs_lock:
+            for job in self.jobs.values():
+                if job.is_active: job.cancel_event.set()
+
+    def submit(self, miner_address: str) -> Tuple[MiningJob, bool]:
+        """Tạo job mới hoặc trả về job đang hoạt động tương ứng. Trả về (job, đã_gộp)."""
+        tip = self.blockchain.last_block
+        with self.jobs_lock:
+            for job in self.jobs.values():
+                if job.is_active and job.miner_address == miner_address and job.base_hash == tip.hash:
+                    return job, True
+            job = MiningJob(miner_address, tip.hash, tip.index)
+            self.jobs[job.job_id] = job
+            self._prune_finished_jobs()
+        self.job_queue.put(job)
+        return job, False
+
+    def get(self, job_id: str) -> Optional[MiningJob]:
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[MiningJob]:
+        with self.jobs_lock:
+            job = self.jobs.get(job_id)
+            if job is None: return None
+            if job.is_active: job.cancel_event.set()
+            if job.status == 'queued': job.finish('cancelled')
+            return job
+
+    def _prune_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.is_active]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def _run(self):
+        logger.info("[Mining] Luồng khai thác nền đã sẵn sàng.")
+        while self.is_running.is_set():
+            try:
+                job = self.job_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self.jobs_lock:
+                if job.status != 'queued': continue
+                job.status, job.started_at = 'running', time.time()
+            self._execute(job)
+
+    def _execute(self, job: MiningJob):
+        should_stop = lambda: job.cancel_event.is_set() or not self.is_running.is_set()
+        try:
+            new_block = self.blockchain.mine_pending_transactions(job.miner_address, should_stop=should_stop)
+        except Exception as e:
+            logger.error(f"[Mining] Job {job.job_id[:8]} thất bại: {e}", exc_info=True)
+            with self.jobs_lock: job.finish('failed', str(e))
+            return
+        if new_block is None:
+            reason = None if job.cancel_event.is_set() else "Đỉnh chuỗi đã thay đổi trong khi khai thác."
+            with self.jobs_lock: job.finish('cancelled', reason)
+            return
+        with self.jobs_lock:
+            job.block, job.pow_stats = new_block.to_dict(), dict(self.blockchain.last_pow_stats)
+            job.finish('done')
+        logger.info(f"[Mining] Job {job.job_id[:8]} đã khai thác khối #{new_block.index}.")
+        if self.on_block_mined:
+            try:
+                self.on_block_mined(new_block)
+            except Exception as e:
+                logger.error(f"[Mining] Lỗi khi lan truyền khối #{new_block.index}: {e}")
@@ -0,0 +1,457 @@
+# sok/node_api.py
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+from urllib.parse import urlparse
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+import logging
+from .transaction import Transaction
+from .wallet import Wallet, get_crypto_cache_stats, get_address_key_type
+from .blockchain import Block
+from .mining import MiningWorker
+from .snapshot import snapshot_to_api
+from .relay import InventoryRelay, INV_BLOCK, INV_TX
+from .compact_block import reconstruct_transactions, fill_transactions, assemble_block
+from .validation import compute_block_hash, normalize_chain
+from . import wire
+from .gossip import PEER_ADDRESS_HEADER
+from .utils import Config, calculate_transaction_hash
+
+logger = logging.getLogger(__name__)
+
+# --- CÁC HÀM TRỢ GIÚP ĐỂ CẬP NHẬT FILE CỤC BỘ ---
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LIVE_NETWORK_CONFIG_FILE = os.path.join(project_root, 'live_network_nodes.json')
+
+def update_local_map_file(nodes_list: list):
+    try:
+        sorted_nodes = sorted(list(set(nodes_list))) 
+        temp_file = LIVE_NETWORK_CONFIG_FILE + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"active_nodes": sorted_nodes}, f, indent=2)
+        os.replace(temp_file, LIVE_NETWORK_CONFIG_FILE)
+        logger.info(f"[API] Đã cập nhật thành công tệp bản đồ mạng cục bộ '{os.path.basename(LIVE_NETWORK_CONFIG_FILE)}'")
+    except Exception as e:
+        logger.error(f"[API] Lỗi khi ghi tệp bản đồ mạng cục bộ: {e}")
+
+def create_app(blockchain, p2p_manager, node_wallet: Wallet, genesis_wallet: Wallet = None):
+    app = Flask(__name__)
+    CORS(app)
+    # PoW và lan truyền khối chạy trên luồng nền, không chiếm luồng của waitress
+    mining_worker = MiningWorker(blockchain, on_block_mined=p2p_manager.broadcast_block if p2p_manager else None)
+    mining_worker.start()
+    app.config['MINING_WORKER'] = mining_worker
+    # Công bố-rồi-tải giữa các peer: bộ lọc mã băm đã thấy (xem sok/relay.py)
+    relay = InventoryRelay(blockchain)
+    app.config['RELAY'] = relay
+    gossip = getattr(p2p_manager, 'gossip', None)
+
+    # === THƯƠNG LƯỢNG ĐỊNH DẠNG VÀ NÉN (xem sok/wire.py) ===
+    def respond(payload, status=200, blocks=None):
+        """Trả payload theo định dạng client chấp nhận. blocks: các khối (dòng CSDL) trong payload, được giải mã transactions khi không phải JSON cũ."""
+        mimetype = request.accept_mimetypes.best_match(wire.server_mimetypes(), default=wire.JSON_MIMETYPE)
+        if mimetype == wire.JSON_MIMETYPE: return jsonify(payload), status
+        if blocks: normalize_chain(blocks)
+        return Response(wire.encode_body(payload, mimetype), status=status, mimetype=mimetype)
+
+    @app.after_request
+    def compress_response(response):
+        response.headers.add('Vary', 'Accept, Accept-Encoding')
+        if response.direct_passthrough or 'Content-Encoding' in response.headers or 'gzip' not in request.accept_encodings: return response
+        compressed = wire.gzip_body(response.get_data())
+        if compressed is not None:
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    def source_peer():
+        """
+        Địa chỉ nút gửi theo header X-Sok-Peer, chỉ khi đó là một peer đã đăng ký và yêu cầu đến từ đúng host của peer đó.
+        Header do bên gửi tự khai: nếu tin ngay, bất kỳ ai cũng có thể mạo danh một peer để chặn lan truyền tới peer đó.
+        """
+        source = request.headers.get(PEER_ADDRESS_HEADER)
+        if not source or not gossip or source not in gossip.get_peer_addresses(): return None
+        host, remote_addr = urlparse(source).hostname, request.remote_addr
+        if host == remote_addr or (host == 'localhost' and remote_addr in ('127.0.0.1', '::1')): return source
+        return None
+
+    def note_source_peer(object_hashes):
+        """Trả về địa chỉ nút gửi (nếu xác minh được) và ghi nhận nút đó đã có các mã băm này, để không công bố ngược lại."""
+        source = source_peer()
+        if source:
+            for object_hash in object_hashes: gossip.mark_known(source, object_hash)
+        return source
+    
+    # === API ĐỂ LAN TRUYỀN BẢN ĐỒ MẠNG ===
+    @app.route('/nodes/update_map', methods=['POST'])
+    def update_network_map():
+        data = request.get_json()
+        if not data or 'active_nodes' not in data:
+            return jsonify({'error': 'Dữ liệu không hợp lệ.'}), 400
+        nodes_list = data['active_nodes']
+        update_thread = threading.Thread(target=update_local_map_file, args=(nodes_list,))
+        update_thread.start()
+        return jsonify({'message': 'Đã nhận bản đồ.'}), 202
+
+    # --- ENDPOINTS CHÍNH ---
+    
+    @app.route('/genesis/info', methods=['GET'])
+    def get_genesis_info():
+        # ... (giữ nguyên)
+        if not genesis_wallet: return jsonify({'error': 'Forbidden.'}), 403
+        return jsonify({ 'genesis_address': genesis_wallet.get_address(), 'current_balance': blockchain.get_balance(genesis_wallet.get_address()) }), 200
+        
+    @app.route('/handshake', methods=['GET'])
+    def handshake():
+        return jsonify({"node_id": node_wallet.get_address()}), 200
+
+    @app.route('/nodes/peers', methods=['GET'])
+    def get_peers():
+        with blockchain.peer_lock:
+            return jsonify(blockchain.peers), 200
+
+    @app.route('/mine', methods=['GET'])
+    def mine():
+        # Giữ cho client cũ: gửi job rồi chờ kết quả. Client mới nên dùng /mining/jobs.
+        miner_address = request.args.get('miner_address')
+        if not miner_address: return jsonify({'error': 'Yêu cầu địa chỉ của thợ mỏ.'}), 400
+        job, _ = mining_worker.submit(miner_address)
+        if not job.done_event.wait(Config.MINING_JOB_WAIT_SECONDS):
+            return jsonify({'message': 'Khối vẫn đang được khai thác.', 'job': job.to_dict()}), 202
+        if job.status != 'done':
+            return jsonify({'error': job.error or 'Job khai thác đã bị hủy.', 'job': job.to_dict()}), 409
+        return jsonify({'message': 'Đã khai thác khối mới!', 'block': job.block, 'pow_stats': job.pow_stats, 'job_id': job.job_id}), 200
+
+    # === JOB KHAI THÁC KHÔNG ĐỒNG BỘ ===
+    @app.route('/mining/jobs', methods=['POST'])
+    def submit_mining_job():
+        values = request.get_json(silent=True) or {}
+        miner_address = values.get('miner_address') or request.args.get('miner_address')
+        if not miner_address: return jsonify({'error': 'Yêu cầu địa chỉ của thợ mỏ.'}), 400
+        job, coalesced = mining_worker.submit(miner_address)
+        return jsonify({'job': job.to_dict(), 'coalesced': coalesced}), 202
+
+    @app.route('/mining/jobs/<job_id>', methods=['GET'])
+    def get_mining_job(job_id):
+        job = mining_worker.get(job_id)
+        if not job: return jsonify({'error': 'Không tìm thấy job.'}), 404
+        return jsonify({'job': job.to_dict()}), 200
+
+    @app.route('/mining/jobs/<job_id>', methods=['DELETE'])
+    def cancel_mining_job(job_id):
+        job = mining_worker.cancel(job_id)
+        if not job: return jsonify({'error': 'Không tìm thấy job.'}), 404
+        return jsonify({'job': job.to_dict()}), 200
+
+    @app.route('/transactions/new', methods=['POST'])
+    def new_transaction():
+        # ... (giữ nguyên)
+        values = request.get_json()
+        if not all(k in values for k in ['sender_public_key_pem', 'recipient_address', 'amount', 'signature']): return jsonify({'error': 'Thiếu trường dữ liệu.'}), 400
+        tx = Transaction.from_dict(values)
+        is_valid, message = tx.is_valid(blockchain)
+        if not is_valid: return jsonify({'error': f'Giao dịch không hợp lệ: {message}'}), 400
+        if blockchain.add_transaction(values):
+            relay.mark_seen(INV_TX, calculate_transaction_hash(values))
+            p2p_manager.broadcast_transaction(values)
+            return jsonify({'message': 'Giao dịch sẽ được thêm vào khối tiếp theo.'}), 201
+        return jsonify({'message': 'Giao dịch đã tồn tại.'}), 400
+
+    # === LAN TRUYỀN GIỮA CÁC PEER: CÔNG BỐ MÃ BĂM RỒI MỚI GỬI NỘI DUNG ===
+    @app.route('/inv', methods=['POST'])
+    def receive_inventory():
+        values = request.get_json(silent=True) or {}
+        inventory = values.get('inventory')
+        if not isinstance(inventory, list) or not all(isinstance(item, dict) for item in inventory):
+            return jsonify({'error': "Yêu cầu danh sách 'inventory' gồm các mục {type, hash}."}), 400
+        if len(inventory) > Config.MAX_INV_ITEMS:
+            return jsonify({'error': f'Tối đa {Config.MAX_INV_ITEMS} mục mỗi thông điệp.'}), 400
+        note_source_peer([item['hash'] for item in inventory if isinstance(item.get('hash'), str)])
+        return jsonify({'wanted': relay.select_wanted(inventory)}), 200
+
+    @app.route('/blocks/add_from_peer', methods=['POST'])
+    def add_block_from_peer():
+        block_data = request.get_json(silent=True)
+        if not isinstance(block_data, dict) or not isinstance(block_data.get('hash'), str) or not isinstance(block_data.get('index'), int):
+            return jsonify({'error': 'Dữ liệu khối không hợp lệ.'}), 400
+        if relay.is_seen(INV_BLOCK, block_data['hash']) or blockchain.has_block(block_data['hash']):
+            note_source_peer([block_data['hash']])
+            return jsonify({'status': 'have', 'message': 'Khối đã được nhận trước đó.'}), 200
+        # Băm lại trước khi làm gì khác: hash khai báo sai không được đụng tới bộ lọc đã thấy hay kích hoạt đồng bộ
+        try:
+            normalize_chain([block_data])
+            rebuilt_hash = compute_block_hash(block_data)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'status': 'rejected', 'error': f'Dữ liệu khối không hợp lệ: {e}'}), 400
+        if rebuilt_hash != block_data['hash']:
+            return jsonify({'status': 'rejected', 'error': 'Hash khối không khớp với nội dung.'}), 400
+        return accept_block_from_peer(block_data, note_source_peer([block_data['hash']]))
+
+    def accept_block_from_peer(block_data, source):
+        """Nối khối (đã kiểm tra hash) vào đỉnh chuỗi; chỉ khối được chấp nhận mới được ghi vào bộ lọc đã thấy và lan truyền tiếp."""
+        try:
+            accepted = blockchain.add_block_from_peer(block_data)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'status': 'rejected', 'error': f'Dữ liệu khối không hợp lệ: {e}'}), 400
+        if accepted:
+            relay.mark_seen(INV_BLOCK, block_data['hash'])
+            tip = blockchain.last_block
+            if p2p_manager and tip.hash == block_data['hash']: p2p_manager.broadcast_block(tip, source)
+            return jsonify({'status': 'accepted', 'message': f'Đã nhận khối #{tip.index}.'}), 201
+        if blockchain.has_block(block_data['hash']):  # cùng khối vừa được nhận qua một yêu cầu song song
+            return jsonify({'status': 'have', 'message': 'Khối đã được nhận trước đó.'}), 200
+        if block_data['index'] > blockchain.last_block.index + 1:
+            return start_background_sync()
+        return jsonify({'status': 'rejected', 'error': 'Khối bị từ chối.'}), 400
+
+    def start_background_sync():
+        # Khối nằm phía trước đỉnh chuỗi cục bộ: đồng bộ ở nền thay vì bắt peer chờ
+        threading.Thread(target=blockchain.resolve_conflicts, daemon=True, name="Relay-Sync").start()
+        return jsonify({'status': 'syncing', 'message': 'Chuỗi cục bộ đang đi sau, đang đồng bộ.'}), 202
+
+    # Khối rút gọn: dựng lại từ mempool, chỉ yêu cầu các giao dịch còn thiếu (xem sok/compact_block.py)
+    def partial_block_key(block_hash):
+        """Khối dở dang gắn với nút đã gửi nó, để client khác không ghi đè được trước khi nút đó gửi bổ sung."""
+        return source_peer() or request.remote_addr, block_hash
+
+    @app.route('/blocks/compact', methods=['POST'])
+    def receive_compact_block():
+        compact = request.get_json(silent=True)
+        if not isinstance(compact, dict) or not isinstance(compact.get('hash'), str) or not isinstance(compact.get('index'), int):
+            return jsonify({'error': 'Dữ liệu khối rút gọn không hợp lệ.'}), 400
+        relay.count('compact_received')
+        note_source_peer([compact['hash']])
+        if relay.is_seen(INV_BLOCK, compact['hash']) or blockchain.has_block(compact['hash']):
+            return jsonify({'status': 'have'}), 200
+        tip_index = blockchain.last_block.index
+        if compact['index'] > tip_index + 1: return start_background_sync()
+        if compact['index'] <= tip_index: return jsonify({'status': 'rejected', 'error': 'Khối không nối tiếp đỉnh chuỗi hiện tại.'}), 200
+        try:
+            transactions, missing = reconstruct_transactions(compact, blockchain.mempool.entries())
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Dữ liệu khối rút gọn không hợp lệ: {e}'}), 400
+        if missing:
+            key = partial_block_key(compact['hash'])
+            pending = relay.partial_blocks.get(key)
+            if pending is not None and pending[0] != compact:
+                # Hai nội dung khác nhau cho cùng một hash: không tin bản nào, peer sẽ gửi khối đầy đủ
+                relay.partial_blocks.pop(key)
+                relay.count('compact_need_full')
+                return jsonify({'status': 'need_full'}), 200
+            relay.partial_blocks.put(key, (compact, transactions))
+            return jsonify({'status': 'missing', 'missing': missing}), 200
+        relay.count('compact_from_mempool')
+        return complete_compact_block(compact, transactions)
+
+    @app.route('/blocks/compact/fill', methods=['POST'])
+    def fill_compact_block():
+        values = request.get_json(silent=True) or {}
+        block_hash, filled_items = values.get('hash'), values.get('transactions')
+        partial = relay.partial_blocks.pop(partial_block_key(block_hash)) if isinstance(block_hash, str) else None
+        if partial is None or not isinstance(filled_items, list):
+            relay.count('compact_need_full')
+            return jsonify({'status': 'need_full'}), 200
+        compact, transactions = partial
+        if fill_transactions(transactions, [item for item in filled_items if isinstance(item, dict)]):
+            relay.count('compact_need_full')
+            return jsonify({'status': 'need_full'}), 200
+        relay.count('compact_filled')
+        return complete_compact_block(compact, transactions)
+
+    def complete_compact_block(compact, transactions):
+        block_data = assemble_block(compact, transactions)
+        # Mã ngắn có thể trùng nhau: chỉ nhận khi khối dựng lại băm ra đúng hash đã công bố, nếu không thì xin khối đầy đủ
+        try:
+            rebuilt_hash = compute_block_hash(block_data)
+        except (KeyError, TypeError) as e:
+            return jsonify({'error': f'Dữ liệu khối rút gọn không hợp lệ: {e}'}), 400
+        if rebuilt_hash != compact['hash']:
+            relay.count('compact_need_full')
+            return jsonify({'status': 'need_full'}), 200
+        if relay.is_seen(INV_BLOCK, compact['hash']): return jsonify({'status': 'have'}), 200
+        return accept_block_from_peer(block_data, source_peer())
+
+    @app.route('/transactions/add_from_peer', methods=['POST'])
+    def add_transaction_from_peer():
+        values = request.get_json(silent=True)
+        if not isinstance(values, dict) or not all(k in values for k in ['sender_public_key_pem', 'recipient_address', 'amount', 'signature']):
+            return jsonify({'error': 'Thiếu trường dữ liệu.'}), 400
+        tx_hash = calculate_transaction_hash(values)
+        if relay.is_seen(INV_TX, tx_hash):
+            note_source_peer([tx_hash])
+            return jsonify({'message': 'Giao dịch đã được nhận trước đó.'}), 200
+        # Mã băm giao dịch bỏ qua chữ ký: chỉ đánh dấu đã thấy sau khi giao dịch hợp lệ và đã vào mempool,
+        # để bản chữ ký sai (hoặc tạm thời thiếu số dư) không chặn bản hợp lệ đến sau
+        try:
+            is_valid, message = Transaction.from_dict(values).is_valid(blockchain)
+        except (TypeError, ValueError) as e:
+            is_valid, message = False, str(e)
+        if not is_valid: return jsonify({'error': f'Giao dịch không hợp lệ: {message}'}), 400
+        if not blockchain.add_transaction(values): return jsonify({'message': 'Giao dịch đã tồn tại.'}), 200
+        relay.mark_seen(INV_TX, tx_hash)
+        source = note_source_peer([tx_hash])
+        if p2p_manager: p2p_manager.broadcast_transaction(values, source)
+        return jsonify({'message': 'Giao dịch sẽ được thêm vào khối tiếp theo.'}), 201
+
+    @app.route('/chain', methods=['GET'])
+    def get_chain():
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', type=int)
+        limit = request.args.get('limit', type=int)
+        if start is None and end is None and limit is None:
+            chain_data = blockchain.get_full_chain_for_api()
+            return respond({'chain': chain_data, 'length': len(chain_data)}, blocks=chain_data)
+
+        # Truy vấn có phân đoạn: 'length' vẫn là chiều dài toàn chuỗi để tương thích với client cũ
+        start = start if start is not None else 0
+        page_size = min(limit, Config.MAX_BLOCKS_PER_PAGE) if limit is not None else Config.MAX_BLOCKS_PER_PAGE
+        if start < 0 or page_size <= 0 or (end is not None and end < start):
+            return jsonify({'error': 'Tham số start/end/limit không hợp lệ.'}), 400
+        chain_data = blockchain.get_blocks_range(start, end, page_size)
+        chain_length = blockchain.last_block.index + 1
+        last_index = chain_data[-1]['index'] if chain_data else None
+        range_end = min(end, chain_length - 1) if end is not None else chain_length - 1
+        next_start = last_index + 1 if last_index is not None and last_index < range_end else None
+        return respond({'chain': chain_data, 'length': chain_length, 'start': start, 'count': len(chain_data), 'next_start': next_start}, blocks=chain_data)
+
+    @app.route('/headers', methods=['GET'])
+    def get_headers():
+        start = request.args.get('start', 0, type=int)
+        end = request.args.get('end', type=int)
+        if start < 0 or (end is not None and end < start):
+            return jsonify({'error': 'Tham số start/end không hợp lệ.'}), 400
+        headers = blockchain.get_headers_range(start, end, Config.MAX_HEADERS_PER_PAGE)
+        return respond({'headers': headers, 'count': len(headers), 'length': blockchain.last_block.index + 1})
+
+    @app.route('/sync/status', methods=['GET'])
+    def get_sync_status():
+        synchronizer = blockchain.synchronizer
+        return jsonify(synchronizer.get_progress() if synchronizer else {'state': 'idle'}), 200
+
+    @app.route('/blocks/<int:index>', methods=['GET'])
+    def get_block(index):
+        block_data = blockchain.get_block(index)
+        if not block_data: return jsonify({'error': 'Không tìm thấy khối.'}), 404
+        return respond(block_data, blocks=[block_data])
+
+    @app.route('/blocks/latest', methods=['GET'])
+    def get_latest_blocks():
+        count = request.args.get('count', 10, type=int)
+        if count <= 0: return jsonify({'error': 'Tham số count không hợp lệ.'}), 400
+        blocks = blockchain.get_latest_blocks(min(count, Config.MAX_BLOCKS_PER_PAGE))
+        return respond({'blocks': blocks, 'count': len(blocks), 'length': blockchain.last_block.index + 1}, blocks=blocks)
+
+    @app.route('/balance/<address>', methods=['GET'])
+    def get_balance(address):
+        if not address: return jsonify({'error': 'Địa chỉ không được để trống.'}), 400
+        return jsonify({'address': address, 'balance': blockchain.get_balance(address)}), 200
+
+    # === TRA CỨU GIAO DỊCH QUA BẢNG CHỈ MỤC ===
+    @app.route('/transactions/<tx_hash>', methods=['GET'])
+    def get_transaction(tx_hash):
+        tx_record = blockchain.get_transaction(tx_hash)
+        if not tx_record: return jsonify({'error': 'Không tìm thấy giao dịch.'}), 404
+        return jsonify(tx_record), 200
+
+    @app.route('/transactions/<tx_hash>/proof', methods=['GET'])
+    def get_transaction_proof(tx_hash):
+        proof = blockchain.get_transaction_proof(tx_hash)
+        if not proof: return jsonify({'error': 'Không tìm thấy giao dịch.'}), 404
+        if proof['merkle_root'] is None:
+            return jsonify({'error': 'Giao dịch nằm trong khối phiên bản 1, không có Merkle root.', **proof}), 422
+        return jsonify(proof), 200
+
+    @app.route('/address/<address>/transactions', methods=['GET'])
+    def get_address_transactions(address):
+        # Phân trang bằng con trỏ "block_index-position" của giao dịch cuối trang trước; ổn định khi có khối mới
+        limit = request.args.get('limit', 50, type=int)
+        if limit <= 0: return jsonify({'error': 'Tham số limit không hợp lệ.'}), 400
+        limit = min(limit, Config.MAX_TRANSACTIONS_PER_PAGE)
+        before = None
+        cursor_param = request.args.get('cursor')
+        if cursor_param:
+            try:
+                block_index, position = (int(part) for part in cursor_param.split('-'))
+                before = (block_index, position)
+            except ValueError:
+                return jsonify({'error': 'Tham số cursor không hợp lệ (định dạng: block_index-position).'}), 400
+        transactions = blockchain.get_transactions_for_address(address, limit + 1, before)
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
+        next_cursor = f"{transactions[-1]['block_index']}-{transactions[-1]['position']}" if has_more else None
+        return respond({'address': address, 'transactions': transactions, 'count': len(transactions), 'next_cursor': next_cursor})
+
+    # === TRA CỨU KHÓA CÔNG KHAI THEO ĐỊA CHỈ ===
+    @app.route('/address/<address>/pubkey', methods=['GET'])
+    def get_address_public_key(address):
+        key_type = get_address_key_type(address)
+        if key_type is None: return jsonify({'error': 'Địa chỉ không đúng định dạng.', 'address': address}), 400
+        record = blockchain.get_public_key(address)
+        if not record: return jsonify({'error': 'Địa chỉ chưa công bố khóa công khai trên chuỗi.', 'address': address}), 404
+        return jsonify({**record, 'key_type': key_type}), 200
+
+    @app.route('/address/pubkeys', methods=['POST'])
+    def get_address_public_keys():
+        values = request.get_json(silent=True) or {}
+        addresses = values.get('addresses')
+        if not isinstance(addresses, list) or not all(isinstance(a, str) for a in addresses):
+            return jsonify({'error': "Yêu cầu danh sách 'addresses'."}), 400
+        if len(addresses) > Config.MAX_PUBKEY_BATCH:
+            return jsonify({'error': f'Tối đa {Config.MAX_PUBKEY_BATCH} địa chỉ mỗi yêu cầu.'}), 400
+        # Địa chỉ sai định dạng không thể có khóa công khai: trả riêng trong 'invalid' thay vì tra CSDL
+        unique_addresses = list(dict.fromkeys(addresses))
+        invalid = {a for a in unique_addresses if get_address_key_type(a) is None}
+        public_keys = blockchain.get_public_keys([a for a in unique_addresses if a not in invalid])
+        return jsonify({'public_keys': public_keys, 'missing': [a for a in unique_addresses if a not in public_keys and a not in invalid],
+                        'invalid': [a for a in unique_addresses if a in invalid]}), 200
+
+    # === ẢNH CHỤP SỐ DƯ CHO NÚT MỚI ===
+    @app.route('/snapshot/latest', methods=['GET'])
+    def get_latest_snapshot():
+        return _snapshot_response(None)
+
+    @app.route('/snapshot/<int:block_index>', methods=['GET'])
+    def get_snapshot(block_index):
+        return _snapshot_response(block_index)
+
+    def _snapshot_response(block_index):
+        # include_data=0 chỉ trả về thông tin mô tả, đủ để so sánh ảnh chụp giữa các peer
+        include_data = request.args.get('include_data', '1') != '0'
+        row = blockchain.get_snapshot(block_index)
+        if not row: return jsonify({'error': 'Không có ảnh chụp.'}), 404
+        block = blockchain.get_block(row['block_index']) if include_data else None
+        return respond(snapshot_to_api(row, block, include_data), blocks=[block] if block else None)
+
+    # === ENDPOINT QUAN TRỌNG MÀ THỢ MỎ ĐANG TÌM ===
+    @app.route('/chain/stats', methods=['GET'])
+    def get_chain_stats():
+        """
+        Cung cấp các số liệu thống kê chính của chuỗi.
+        Đây là endpoint mà các client thông minh dùng để kiểm tra sức khỏe.
+        """
+        try:
+            stats = {
+                "total_supply": blockchain.calculate_actual_total_supply(), 
+                "block_height": blockchain.last_block.index, 
+                "snapshot_base": blockchain.base_index,
+                "tip_hash": blockchain.last_block.hash,
+                "pending_tx_count": len(blockchain.mempool), 
+                "mempool": blockchain.mempool.get_stats(),
+                "crypto_cache": get_crypto_cache_stats(),
+                "gossip": gossip.get_stats() if gossip else None,
+                "relay": relay.get_stats(),
+                "difficulty": blockchain.difficulty,
+                "mining_workers": blockchain.mining_workers,
+                "peer_count": len(blockchain.peers)
+            }
+            return respond(stats)
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy thống kê chuỗi: {e}")
+            return jsonify({"error": "Không thể xử lý yêu cầu thống kê."}), 500
+
+    # ... các endpoint P2P khác giữ nguyên
+            
+    return app
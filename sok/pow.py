@@ -0,0 +1,162 @@
+# sok/pow.py
+# -*- coding: utf-8 -*-
+
+import atexit
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .utils import get_process_context
+
+# Số nonce được thử giữa hai lần kiểm tra tín hiệu dừng
+STOP_CHECK_INTERVAL = 10000
+# Giá trị "chưa tìm thấy" cho nonce tốt nhất dùng chung giữa các tiến trình
+NO_NONCE = 2 ** 63 - 1
+
+def difficulty_to_target(difficulty: int) -> Optional[bytes]:
+    """
+    Chuyển độ khó (số ký tự '0' đứng đầu hash hex) thành ngưỡng dạng bytes.
+    digest < target tương đương hexdigest().startswith('0' * difficulty).
+    """
+    if difficulty <= 0: return None
+    if difficulty >= 64: return (1).to_bytes(32, 'big')
+    return (16 ** (64 - difficulty)).to_bytes(32, 'big')
+
+def split_around_nonce(block_data: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """
+    Tuần tự hóa block_data một lần, tách thành phần trước và sau giá trị nonce.
+    Ghép prefix + str(nonce) + suffix cho ra đúng chuỗi mà json.dumps(block_data, sort_keys=True) tạo ra.
+    """
+    parts_before, parts_after, nonce_seen = [], [], False
+    for key in sorted(block_data):
+        if key == 'nonce':
+            nonce_seen = True
+            continue
+        encoded = f"{json.dumps(key)}: {json.dumps(block_data[key], sort_keys=True)}"
+        (parts_after if nonce_seen else parts_before).append(encoded)
+    if not nonce_seen: raise ValueError("Dữ liệu khối không có trường 'nonce'.")
+    prefix = '{' + ''.join(part + ', ' for part in parts_before) + '"nonce": '
+    suffix = ''.join(', ' + part for part in parts_after) + '}'
+    return prefix.encode(), suffix.encode()
+
+class ProofOfWorkEngine:
+    """
+    Bộ máy PoW dựa trên midstate của hashlib.sha256.
+    Phần dữ liệu trước nonce được băm sẵn một lần; mỗi lần thử chỉ nối thêm nonce và phần đuôi cố định.
+    Kết quả trùng khớp từng byte với hash_data(block_data).
+    """
+    def __init__(self, block_data: Optional[Dict[str, Any]], difficulty: int, parts: Optional[Tuple[bytes, bytes]] = None):
+        self.prefix, self.suffix = parts if parts is not None else split_around_nonce(block_data)
+        self.difficulty = difficulty
+        self._midstate = hashlib.sha256(self.prefix)
+        self.target = difficulty_to_target(difficulty)
+        self.hashes_tried = 0
+
+    @classmethod
+    def from_parts(cls, prefix: bytes, suffix: bytes, difficulty: int) -> 'ProofOfWorkEngine':
+        return cls(None, difficulty, parts=(prefix, suffix))
+
+    def digest(self, nonce: int) -> bytes:
+        h = self._midstate.copy()
+        h.update(str(nonce).encode())
+        h.update(self.suffix)
+        return h.digest()
+
+    def hash_nonce(self, nonce: int) -> str:
+        return self.digest(nonce).hex()
+
+    def is_valid_nonce(self, nonce: int) -> bool:
+        return self.target is None or self.digest(nonce) < self.target
+
+    def search(self, start: int = 0, stop: Optional[int] = None, should_stop: Optional[Callable[[], bool]] = None) -> Optional[int]:
+        """
+        Tìm nonce hợp lệ nhỏ nhất trong [start, stop). stop=None nghĩa là không giới hạn.
+        Trả về None nếu hết đoạn hoặc should_stop() báo dừng.
+        """
+        if self.target is None: return start
+        midstate, suffix, target = self._midstate, self.suffix, self.target
+        nonce = start
+        while stop is None or nonce < stop:
+            batch_end = nonce + STOP_CHECK_INTERVAL
+            if stop is not None: batch_end = min(batch_end, stop)
+            for candidate in range(nonce, batch_end):
+                h = midstate.copy()
+                h.update(str(candidate).encode())
+                h.update(suffix)
+                if h.digest() < target:
+                    self.hashes_tried += candidate - nonce + 1
+                    return candidate
+            self.hashes_tried += batch_end - nonce
+            nonce = batch_end
+            if should_stop is not None and should_stop(): return None
+        return None
+
+# --- TÌM NONCE SONG SONG TRÊN NHIỀU TIẾN TRÌNH ---
+
+_shared_best_nonce = None  # multiprocessing.Value, được gán trong từng tiến trình con
+
+def _init_search_worker(best_nonce):
+    global _shared_best_nonce
+    _shared_best_nonce = best_nonce
+
+def search_nonce_range(prefix: bytes, suffix: bytes, difficulty: int, start: int, stop: int) -> Tuple[Optional[int], int]:
+    """
+    API theo đoạn nonce: tìm nonce hợp lệ nhỏ nhất trong [start, stop).
+    Trả về (nonce hoặc None, số hash đã thử). Kết quả chỉ phụ thuộc vào đầu vào nên có thể kiểm thử trực tiếp.
+    Khi chạy trong pool, đoạn sẽ bỏ dở nếu một tiến trình khác đã tìm được nonce nhỏ hơn start.
+    """
+    engine = ProofOfWorkEngine.from_parts(prefix, suffix, difficulty)
+    best = _shared_best_nonce
+    should_stop = (lambda: best.value < start) if best is not None else None
+    nonce = engine.search(start, stop, should_stop)
+    if nonce is not None and best is not None:
+        with best.get_lock():
+            if nonce < best.value: best.value = nonce
+    return nonce, engine.hashes_tried
+
+_search_pool = None
+_search_pool_workers = 0
+_search_best_nonce = None
+_search_pool_lock = threading.Lock()
+
+def _get_search_pool(workers: int):
+    """
+    Pool tìm nonce dùng lại giữa các khối (khởi tạo pool cho mỗi khối tốn thêm thời gian ở mọi lần đào),
+    tạo lại chỉ khi số tiến trình thay đổi. Gọi khi đang giữ _search_pool_lock.
+    """
+    global _search_pool, _search_pool_workers, _search_best_nonce
+    if _search_pool is None or _search_pool_workers != workers:
+        if _search_pool is not None: _search_pool.terminate()
+        ctx = get_process_context()
+        _search_best_nonce = ctx.Value('q', NO_NONCE)
+        _search_pool = ctx.Pool(processes=workers, initializer=_init_search_worker, initargs=(_search_best_nonce,))
+        _search_pool_workers = workers
+    return _search_pool, _search_best_nonce
+
+def _shutdown_search_pool():
+    with _search_pool_lock:
+        if _search_pool is not None: _search_pool.terminate()
+
+atexit.register(_shutdown_search_pool)
+
+def parallel_search(engine: ProofOfWorkEngine, workers: int, start: int = 0, chunk_size: int = 50000,
+                    should_stop: Optional[Callable[[], bool]] = None) -> Optional[int]:
+    """
+    Chia không gian nonce thành các đoạn cho một pool tiến trình, theo từng vòng gồm workers * 2 đoạn.
+    Tiến trình tìm thấy trước sẽ báo cho các đoạn phía sau dừng lại. Các đoạn thấp hơn vẫn chạy hết,
+    nên kết quả luôn là nonce hợp lệ nhỏ nhất, giống hệt engine.search() chạy tuần tự.
+    Các lần tìm dùng chung một pool nên được thực hiện lần lượt.
+    """
+    if engine.target is None: return start
+    with _search_pool_lock:
+        pool, best_nonce = _get_search_pool(workers)
+        best_nonce.value = NO_NONCE
+        base = start
+        while True:
+            ranges: List[Tuple[int, int]] = [(base + i * chunk_size, base + (i + 1) * chunk_size) for i in range(workers * 2)]
+            results = pool.starmap(search_nonce_range, [(engine.prefix, engine.suffix, engine.difficulty, a, b) for a, b in ranges])
+            engine.hashes_tried += sum(hashes for _, hashes in results)
+            found = [nonce for nonce, _ in results if nonce is not None]
+            if found: return min(found)
+            base = ranges[-1][1]
+            if should_stop is not None and should_stop(): return None
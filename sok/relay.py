@@ -0,0 +1,64 @@
+# sok/relay.py
+# -*- coding: utf-8 -*-
+
+import threading
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+from .utils import Config, LRUCache
+
+if TYPE_CHECKING:
+    from .blockchain import Blockchain
+
+# Loại đối tượng trong thông điệp inventory và endpoint nhận nội dung tương ứng
+INV_BLOCK = 'block'
+INV_TX = 'tx'
+INV_ENDPOINTS = {INV_BLOCK: '/blocks/add_from_peer', INV_TX: '/transactions/add_from_peer'}
+
+class InventoryRelay:
+    """
+    Phía nhận của giao thức công bố-rồi-tải: peer gửi danh sách {type, hash} tới /inv,
+    nút chỉ yêu cầu những đối tượng chưa thấy và chưa có, rồi peer mới gửi nội dung.
+    Bộ nhớ đệm các mã băm đã thấy (có giới hạn) chặn việc một đối tượng bị nhận và lan truyền lại nhiều lần.
+    Chỉ đối tượng đã được chấp nhận mới được ghi vào đó: mã băm do peer khai báo (và mã băm giao dịch, vốn bỏ qua chữ ký)
+    không chứng minh được nội dung, nên một bản giả bị từ chối không được chặn bản thật đến sau.
+    Khối rút gọn còn thiếu giao dịch được giữ trong partial_blocks, theo (peer gửi, hash), cho tới khi chính peer đó gửi bổ sung.
+    """
+    def __init__(self, blockchain: 'Blockchain', cache_size: Optional[int] = None):
+        self.blockchain = blockchain
+        self.seen = LRUCache(cache_size if cache_size is not None else Config.RELAY_SEEN_CACHE_SIZE)
+        self.partial_blocks = LRUCache(Config.COMPACT_PARTIAL_BLOCKS)
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            'duplicates': 0, 'compact_received': 0, 'compact_from_mempool': 0, 'compact_filled': 0, 'compact_need_full': 0
+        }
+
+    def count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def is_seen(self, kind: str, object_hash: str) -> bool:
+        """True nếu đối tượng đã được chấp nhận trước đó (bản trùng, không xử lý/lan truyền lại)."""
+        if not self.seen.get((kind, object_hash)): return False
+        self.count('duplicates')
+        return True
+
+    def mark_seen(self, kind: str, object_hash: str):
+        """Ghi nhận một đối tượng sau khi nó đã được xác thực và chấp nhận."""
+        self.seen.put((kind, object_hash), True)
+
+    def _already_have(self, kind: str, object_hash: str) -> bool:
+        if kind == INV_BLOCK: return self.blockchain.has_block(object_hash)
+        return object_hash in self.blockchain.mempool or self.blockchain.get_transaction(object_hash) is not None
+
+    def select_wanted(self, inventory: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Lọc inventory được công bố, giữ lại những mục cần tải. Mục sai định dạng bị bỏ qua."""
+        wanted = []
+        for item in inventory:
+            kind, object_hash = item.get('type'), item.get('hash')
+            if kind not in INV_ENDPOINTS or not isinstance(object_hash, str): continue
+            if self.seen.get((kind, object_hash)) or self._already_have(kind, object_hash): continue
+            wanted.append({'type': kind, 'hash': object_hash})
+        return wanted
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.seen.get_stats(), **self.counters, 'partial_blocks': len(self.partial_blocks)}
@@ -0,0 +1,56 @@
+# sok/snapshot.py
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from .utils import canonical_json, hash_data
+
+# Ảnh chụp trạng thái số dư tại một khối: JSON chuẩn tắc {block_index, block_hash, balances: [[địa chỉ, số dư], ...]}
+# (sắp theo địa chỉ), nén zlib. state_hash là SHA256 của JSON trước khi nén nên mọi nút cho ra cùng một giá trị.
+
+def build_snapshot(block_index: int, block_hash: str, balances: List[Tuple[str, float]]) -> Dict[str, Any]:
+    """Tạo bản ghi ảnh chụp (dạng dòng của bảng snapshots) từ danh sách số dư."""
+    payload = canonical_json({
+        'block_index': block_index, 'block_hash': block_hash,
+        'balances': [[address, balance] for address, balance in sorted(balances)]
+    }).encode('utf-8')
+    return {
+        'block_index': block_index, 'block_hash': block_hash, 'state_hash': hash_data(payload),
+        'balance_count': len(balances), 'data': zlib.compress(payload, 9)
+    }
+
+def decode_snapshot(data: bytes, state_hash: str) -> Optional[Dict[str, Any]]:
+    """Giải nén và kiểm tra ảnh chụp; trả về nội dung nếu khớp state_hash, ngược lại None."""
+    try:
+        payload = zlib.decompress(data)
+        if hash_data(payload) != state_hash: return None
+        content = json.loads(payload)
+        balances = content['balances']
+        if not all(isinstance(item, list) and len(item) == 2 and isinstance(item[0], str) and isinstance(item[1], (int, float)) for item in balances):
+            return None
+        return content
+    except (zlib.error, ValueError, KeyError, TypeError):
+        return None
+
+def snapshot_to_api(row: Dict[str, Any], block: Optional[Dict[str, Any]] = None, include_data: bool = True) -> Dict[str, Any]:
+    """Định dạng trả về của /snapshot: dữ liệu nén được mã hóa base64, kèm khối tại độ cao ảnh chụp."""
+    result = {key: row[key] for key in ('block_index', 'block_hash', 'state_hash', 'balance_count', 'created_at')}
+    result['compressed_size'] = len(row['data'])
+    if include_data:
+        result['data'] = base64.b64encode(row['data']).decode('ascii')
+        result['block'] = block
+    return result
+
+def snapshot_from_api(snapshot: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], List[List[Any]]]]:
+    """Kiểm tra ảnh chụp nhận từ peer. Trả về (khối tại độ cao ảnh chụp, danh sách số dư) hoặc None nếu không hợp lệ."""
+    try:
+        block = snapshot['block']
+        content = decode_snapshot(base64.b64decode(snapshot['data'], validate=True), snapshot['state_hash'])
+        if content is None: return None
+        if content['block_index'] != snapshot['block_index'] or content['block_hash'] != snapshot['block_hash']: return None
+        if block['index'] != snapshot['block_index'] or block['hash'] != snapshot['block_hash']: return None
+        return block, content['balances']
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,72 @@
+# sok/storage.py
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.request import pathname2url
+from .utils import Config
+
+class SQLiteStorage:
+    """
+    Lớp lưu trữ SQLite cho Blockchain.
+    - Chế độ WAL: người đọc không bị chặn bởi người ghi và ngược lại.
+    - Mỗi luồng có một kết nối chỉ-đọc riêng, nên /balance, /chain... chạy song song theo số lõi.
+    - Một kết nối ghi duy nhất được bảo vệ bởi khóa, tránh xen kẽ cursor giữa các luồng.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.in_memory = db_path == ':memory:'
+        self.write_lock = threading.RLock()
+        self._local = threading.local()
+        self.writer = sqlite3.connect(db_path, check_same_thread=False)
+        self.writer.row_factory = sqlite3.Row
+        if not self.in_memory:
+            journal_mode = self.writer.execute(f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}").fetchone()[0]
+            if journal_mode.lower() != Config.SQLITE_JOURNAL_MODE.lower():
+                logging.warning(f"[Storage] Không bật được journal_mode={Config.SQLITE_JOURNAL_MODE}, đang dùng '{journal_mode}'.")
+        self._apply_pragmas(self.writer)
+
+    @staticmethod
+    def _apply_pragmas(conn: sqlite3.Connection):
+        conn.execute(f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size={-int(Config.SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+
+    def reader(self) -> sqlite3.Connection:
+        """Kết nối chỉ-đọc của luồng hiện tại (tạo khi dùng lần đầu)."""
+        if self.in_memory: return self.writer  # CSDL trong bộ nhớ không chia sẻ được giữa các kết nối
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True)
+            conn.row_factory = sqlite3.Row
+            self._apply_pragmas(conn)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Cursor]:
+        """Mở một giao dịch ghi trên kết nối ghi duy nhất; commit khi thành công, rollback khi có lỗi."""
+        with self.write_lock:
+            cursor = self.writer.cursor()
+            try:
+                yield cursor
+                self.writer.commit()
+            except Exception:
+                self.writer.rollback()
+                raise
+
+    def close(self):
+        # Đóng kết nối đọc trước: kết nối ghi đóng sau cùng mới checkpoint được WAL vào tệp chính
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        with self.write_lock:
+            self.writer.close()
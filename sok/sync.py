@@ -0,0 +1,258 @@
+# sok/sync.py
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+from .blockchain import Block
+from .utils import Config
+from . import wire
+from .validation import normalize_chain, verify_block_hashes, check_checkpoints, check_fork_point
+
+if TYPE_CHECKING:
+    from .blockchain import Blockchain
+
+logger = logging.getLogger(__name__)
+
+class ChainSynchronizer:
+    """
+    Đồng bộ chuỗi theo thứ tự: hỏi chiều cao các peer song song -> chọn peer tốt nhất ->
+    tải header để tìm điểm rẽ nhánh -> tải thân các khối còn thiếu theo đoạn song song từ nhiều peer.
+    Khi đã bắt kịp, mỗi chu kỳ chỉ tốn một truy vấn /chain/stats cho mỗi peer.
+    """
+    def __init__(self, blockchain: 'Blockchain'):
+        self.blockchain = blockchain
+        self.sync_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats: Dict[str, Any] = {
+            'state': 'idle', 'best_peer': None, 'target_height': None, 'local_height': None,
+            'blocks_to_download': 0, 'blocks_downloaded': 0, 'headers_downloaded': 0, 'bytes_downloaded': 0,
+            'syncs_completed': 0, 'syncs_failed': 0, 'last_sync_at': None, 'last_sync_seconds': None, 'last_blocks_per_second': None,
+            'bootstrap_snapshot': None
+        }
+
+    # --- TIẾN ĐỘ & BỘ ĐẾM ---
+    def get_progress(self) -> Dict[str, Any]:
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def _update_stats(self, **changes):
+        with self.stats_lock:
+            self.stats.update(changes)
+
+    def _count(self, key: str, amount: int):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def _get_json(self, url: str, params: Optional[Dict] = None) -> Optional[Any]:
+        # Chọn msgpack/JSON rút gọn kèm gzip khi peer hỗ trợ; peer cũ vẫn trả JSON như trước
+        response = wire.get(url, params=params, timeout=Config.SYNC_REQUEST_TIMEOUT)
+        self._count('bytes_downloaded', wire.wire_size(response))
+        if response.status_code != 200: return None
+        return wire.response_data(response)
+
+    # --- BƯỚC 1: HỎI CHIỀU CAO CÁC PEER SONG SONG ---
+    def query_peer_heights(self, peer_addresses: List[str]) -> List[Tuple[str, int]]:
+        def query(address: str) -> Optional[Tuple[str, int]]:
+            try:
+                data = self._get_json(f"{address}/chain/stats")
+                return (address, int(data['block_height'])) if data else None
+            except (requests.exceptions.RequestException, KeyError, TypeError, ValueError):
+                return None
+        if not peer_addresses: return []
+        with ThreadPoolExecutor(max_workers=min(Config.SYNC_MAX_WORKERS, len(peer_addresses))) as executor:
+            return [result for result in executor.map(query, peer_addresses) if result]
+
+    # --- BƯỚC 1b: NÚT MỚI KHỞI ĐỘNG TỪ ẢNH CHỤP SỐ DƯ ---
+    def _bootstrap_from_snapshot(self, peer_addresses: List[str]) -> bool:
+        """
+        Chọn ảnh chụp cao nhất được đủ SNAPSHOT_MIN_PEER_AGREEMENT peer cùng công bố (hoặc khớp một checkpoint),
+        tải nó từ một trong các peer đó và khởi động chuỗi cục bộ từ đó.
+        """
+        def query(address: str) -> Optional[Tuple[str, Tuple[int, str, str]]]:
+            try:
+                data = self._get_json(f"{address}/snapshot/latest", {'include_data': 0})
+                return (address, (int(data['block_index']), data['block_hash'], data['state_hash'])) if data else None
+            except (requests.exceptions.RequestException, KeyError, TypeError, ValueError):
+                return None
+        with ThreadPoolExecutor(max_workers=min(Config.SYNC_MAX_WORKERS, len(peer_addresses))) as executor:
+            announced = [result for result in executor.map(query, peer_addresses) if result]
+        publishers: Dict[Tuple[int, str, str], List[str]] = {}
+        for address, key in announced:
+            publishers.setdefault(key, []).append(address)
+
+        for key in sorted(publishers, reverse=True):
+            block_index, block_hash, state_hash = key
+            if block_index <= self.blockchain.last_block.index: break
+            if Config.CHECKPOINTS.get(block_index) != block_hash and len(publishers[key]) < Config.SNAPSHOT_MIN_PEER_AGREEMENT: continue
+            self._update_stats(state='downloading_snapshot')
+            for address in publishers[key]:
+                try:
+                    snapshot = self._get_json(f"{address}/snapshot/{block_index}")
+                except (requests.exceptions.RequestException, ValueError):
+                    continue
+                if not snapshot or snapshot.get('block_hash') != block_hash or snapshot.get('state_hash') != state_hash: continue
+                if self.blockchain.restore_from_snapshot(snapshot):
+                    self._update_stats(bootstrap_snapshot={'block_index': block_index, 'block_hash': block_hash, 'peers': len(publishers[key])})
+                    return True
+        return False
+
+    # --- BƯỚC 2 & 3: CHỌN PEER, TẢI HEADER, TÌM ĐIỂM RẼ NHÁNH ---
+    def _fetch_headers(self, address: str, start: int, end: int) -> Optional[List[Dict]]:
+        headers: List[Dict] = []
+        next_start = start
+        while next_start <= end:
+            data = self._get_json(f"{address}/headers", {'start': next_start, 'end': end})
+            if data is None: return None
+            page = data.get('headers', [])
+            if not page: break
+            headers.extend(page)
+            next_start = page[-1]['index'] + 1
+        self._count('headers_downloaded', len(headers))
+        return headers
+
+    @staticmethod
+    def _headers_are_linked(headers: List[Dict]) -> bool:
+        for previous, current in zip(headers, headers[1:]):
+            if current['index'] != previous['index'] + 1 or current['previous_hash'] != previous['hash']: return False
+        return True
+
+    def _locate_fork(self, address: str, peer_height: int) -> Optional[Tuple[int, List[Dict]]]:
+        """Trả về (fork_index, header của các khối cần tải) hoặc None nếu peer trả về dữ liệu không hợp lệ."""
+        local_height = self.blockchain.last_block.index
+        # Chuỗi khởi động từ ảnh chụp không có khối nào thấp hơn ảnh gốc
+        floor = self.blockchain.base_index
+        start = max(floor, local_height - Config.SYNC_HEADER_LOOKBACK)
+        while True:
+            headers = self._fetch_headers(address, start, peer_height)
+            if not headers or headers[0]['index'] != start or not self._headers_are_linked(headers): return None
+            local_hashes = {h['index']: h['hash'] for h in self.blockchain.get_headers_range(start, local_height)}
+            fork_index = start - 1
+            for header in headers:
+                if local_hashes.get(header['index']) != header['hash']: break
+                fork_index = header['index']
+            if fork_index >= start or start == floor:
+                # Khác từ genesis chỉ hợp lệ khi peer có cùng genesis; không thể rẽ nhánh thấp hơn ảnh chụp gốc
+                if fork_index < floor and (floor > 0 or headers[0]['previous_hash'] != Config.GENESIS_PREVIOUS_HASH): return None
+                return fork_index, [h for h in headers if h['index'] > fork_index]
+            # Nhánh rẽ sâu hơn cửa sổ nhìn lại: tải header từ genesis (hoặc từ ảnh chụp gốc)
+            start = floor
+
+    # --- BƯỚC 4: TẢI THÂN KHỐI SONG SONG THEO ĐOẠN ---
+    def _download_range(self, addresses: List[str], start: int, end: int) -> Optional[List[Dict]]:
+        for address in addresses:
+            try:
+                blocks: List[Dict] = []
+                next_start = start
+                while next_start is not None and next_start <= end:
+                    data = self._get_json(f"{address}/chain", {'start': next_start, 'end': end})
+                    if data is None: break
+                    blocks.extend(data.get('chain', []))
+                    next_start = data.get('next_start')
+                if len(blocks) == end - start + 1:
+                    self._count('blocks_downloaded', len(blocks))
+                    return blocks
+            except (requests.exceptions.RequestException, ValueError):
+                continue
+        return None
+
+    def _download_blocks(self, peers: List[Tuple[str, int]], headers: List[Dict]) -> Optional[List[Dict]]:
+        first, last = headers[0]['index'], headers[-1]['index']
+        ranges = [(a, min(a + Config.SYNC_CHUNK_SIZE - 1, last)) for a in range(first, last + 1, Config.SYNC_CHUNK_SIZE)]
+        # Xoay vòng peer cho từng đoạn; nếu một peer lỗi, đoạn đó được thử lại ở các peer còn lại
+        jobs = []
+        for i, (a, b) in enumerate(ranges):
+            capable = [address for address, height in peers if height >= b]
+            jobs.append((capable[i % len(capable):] + capable[:i % len(capable)], a, b))
+        with ThreadPoolExecutor(max_workers=min(Config.SYNC_MAX_WORKERS, len(jobs))) as executor:
+            chunks = list(executor.map(lambda job: self._download_range(*job), jobs))
+        if any(chunk is None for chunk in chunks): return None
+        blocks = [block for chunk in chunks for block in chunk]
+        # Thân khối phải khớp đúng header đã tải
+        for block_data, header in zip(blocks, headers):
+            if block_data['index'] != header['index'] or block_data['hash'] != header['hash']: return None
+        return blocks
+
+    def _verify_blocks(self, fork_index: int, blocks: List[Dict]) -> Optional[List[Block]]:
+        # Liên kết đã được kiểm tra qua header; chỉ cần băm lại các khối mới (song song khi đủ nhiều)
+        normalize_chain(blocks)
+        if not check_fork_point(fork_index, self.blockchain.last_block.index) or check_checkpoints(blocks) is None:
+            logger.warning(f"[Sync] Nhánh rẽ tại khối #{fork_index} mâu thuẫn với checkpoint, bỏ qua peer.")
+            return None
+        if not verify_block_hashes(blocks): return None
+        return [Block.from_dict(block_data, trust_hash=True) for block_data in blocks]
+
+    # --- QUY TRÌNH CHÍNH ---
+    def sync(self) -> bool:
+        """Chạy một chu kỳ đồng bộ. Trả về True nếu chuỗi cục bộ đã được cập nhật."""
+        if not self.sync_lock.acquire(blocking=False): return False
+        started_at = time.time()
+        try:
+            with self.blockchain.peer_lock:
+                peer_addresses = [peer_data['address'] for peer_data in self.blockchain.peers.values()]
+            local_height = self.blockchain.last_block.index
+            self._update_stats(state='querying_peers', local_height=local_height)
+            peers = sorted(self.query_peer_heights(peer_addresses), key=lambda p: p[1], reverse=True)
+            if not peers or peers[0][1] <= local_height:
+                self._update_stats(state='idle', target_height=peers[0][1] if peers else None)
+                return False
+
+            bootstrapped = False
+            if Config.SNAPSHOT_BOOTSTRAP and local_height == 0 and self.blockchain.base_index == 0:
+                bootstrapped = self._bootstrap_from_snapshot([address for address, _ in peers])
+                local_height = self.blockchain.last_block.index
+                self._update_stats(state='querying_peers', local_height=local_height)
+
+            for best_address, best_height in peers:
+                if best_height <= local_height: break
+                self._update_stats(state='fetching_headers', best_peer=best_address, target_height=best_height)
+                try:
+                    updated = self._sync_from(best_address, best_height, peers)
+                except requests.exceptions.RequestException as e:
+                    logger.warning(f"[Sync] Lỗi kết nối tới {best_address}: {e}")
+                    continue
+                if updated is None: continue  # Peer không hợp lệ, thử peer kế tiếp
+                elapsed = time.time() - started_at
+                downloaded = self.stats['blocks_to_download']
+                self._update_stats(state='idle', last_sync_at=time.time(), last_sync_seconds=round(elapsed, 3),
+                                   last_blocks_per_second=round(downloaded / elapsed, 2) if elapsed > 0 else None)
+                self._count('syncs_completed' if updated else 'syncs_failed', 1)
+                return updated or bootstrapped
+            self._update_stats(state='idle')
+            self._count('syncs_completed' if bootstrapped else 'syncs_failed', 1)
+            return bootstrapped
+        finally:
+            self.sync_lock.release()
+
+    def _sync_from(self, address: str, height: int, peers: List[Tuple[str, int]]) -> Optional[bool]:
+        try:
+            located = self._locate_fork(address, height)
+        except requests.exceptions.RequestException:
+            located = None
+        if located is None:
+            # Chuỗi bắt đầu từ ảnh chụp không thể nhận lại toàn bộ chuỗi từ genesis
+            return self._sync_full_chain(address) if self.blockchain.base_index == 0 else None
+        fork_index, headers = located
+        if not headers: return None
+        self._update_stats(state='downloading_blocks', blocks_to_download=len(headers))
+        logger.info(f"[Sync] Rẽ nhánh tại khối #{fork_index}, cần tải {len(headers)} khối từ {len(peers)} peer.")
+        blocks = self._download_blocks(peers, headers)
+        if blocks is None: return None
+        self._update_stats(state='validating')
+        new_blocks = self._verify_blocks(fork_index, blocks)
+        if new_blocks is None: return None
+        self._update_stats(state='applying')
+        return self.blockchain.apply_fork(fork_index, new_blocks)
+
+    def _sync_full_chain(self, address: str) -> Optional[bool]:
+        """Dự phòng cho peer phiên bản cũ chưa có /headers: tải và xác thực toàn bộ chuỗi."""
+        data = self._get_json(f"{address}/chain")
+        if not data: return None
+        chain = data.get('chain', [])
+        if len(chain) <= self.blockchain.last_block.index + 1: return None
+        self._update_stats(state='applying', blocks_to_download=len(chain))
+        self._count('blocks_downloaded', len(chain))
+        return self.blockchain.replace_chain(chain) or None
@@ -0,0 +1,176 @@
+# sok/utils.py
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+# Bộ mã hóa JSON chuẩn tắc dùng chung. json.dumps(..., sort_keys=True) tạo một JSONEncoder mới ở mỗi lần gọi;
+# dùng lại một encoder cho ra đúng từng byte như vậy (cùng bộ mã hóa C của thư viện chuẩn) mà không tốn chi phí khởi tạo.
+_canonical_encoder = json.JSONEncoder(sort_keys=True)
+
+def canonical_json(data: Any) -> str:
+    """Chuỗi JSON chuẩn tắc của data, giống hệt json.dumps(data, sort_keys=True)."""
+    return _canonical_encoder.encode(data)
+
+def canonical_json_list(encoded_items: List[str]) -> str:
+    """Ghép các phần tử đã mã hóa sẵn thành chuỗi JSON của danh sách, giống hệt canonical_json(list)."""
+    return '[' + ', '.join(encoded_items) + ']'
+
+def hash_data(data: Any) -> str:
+    """Tạo mã băm SHA256 cho bất kỳ dữ liệu đầu vào nào."""
+    if isinstance(data, bytes):
+        return hashlib.sha256(data).hexdigest()
+    if not isinstance(data, str):
+        data_string = canonical_json(data)
+    else:
+        data_string = data
+    return hashlib.sha256(data_string.encode()).hexdigest()
+
+def calculate_transaction_hash(transaction: Dict) -> str:
+    """
+    Tạo mã băm định danh cho một giao dịch dạng dict.
+    Bỏ qua chữ ký và địa chỉ người gửi, giống cách mempool vẫn khử trùng lặp.
+    """
+    return hash_data({k: v for k, v in transaction.items() if k not in ('signature', 'sender_address')})
+
+def get_process_context():
+    """
+    Ngữ cảnh multiprocessing cho các pool tiến trình dùng lâu dài. Nút chạy nhiều luồng (waitress, gossip, đồng bộ),
+    fork trực tiếp từ tiến trình đó có thể sao chép một khóa đang bị giữ và treo tiến trình con, nên dùng forkserver (hoặc spawn).
+    """
+    return multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+class LRUCache:
+    """Bộ nhớ đệm LRU có giới hạn, an toàn đa luồng, kèm bộ đếm trúng/trượt."""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._data), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+class Config:
+    """Lớp chứa tất cả các hằng số cấu hình cho blockchain."""
+    # Cấu hình Kinh tế & Khai thác
+    DIFFICULTY = 5
+    MINING_REWARD = 0.1
+    HALVING_BLOCK_INTERVAL = 210000
+    MINING_WORKERS = 1  # Số tiến trình tìm nonce; 1 = tuần tự, 0 = dùng toàn bộ lõi CPU
+    POW_CHUNK_SIZE = 50000  # Số nonce mỗi tiến trình thử trong một đoạn khi đào song song
+    MINING_JOB_WAIT_SECONDS = 60  # Thời gian tối đa endpoint /mine (đồng bộ, tương thích cũ) chờ job hoàn tất
+
+    # Khối từ chỉ số này trở đi phải là phiên bản 2 (phần đầu khối cố định + Merkle root), các khối trước đó là phiên bản 1.
+    # Đây là một thay đổi đồng thuận: chỉ đặt giá trị khi mọi nút trong mạng đã nâng cấp. None = chưa kích hoạt.
+    BLOCK_V2_ACTIVATION_HEIGHT: Optional[int] = None
+
+    # Các mục tiêu kinh tế vĩ mô cho AI Agent
+    TARGET_BLOCK_TIME_SECONDS = 30
+    PENDING_TX_THRESHOLD = 100
+
+    # Cấu hình Hàng chờ giao dịch (mempool)
+    MEMPOOL_MAX_TRANSACTIONS = 5000
+    MEMPOOL_MAX_BYTES = 5 * 1024 * 1024
+    MEMPOOL_EXPIRY_SECONDS = 3 * 60 * 60  # Giao dịch chờ lâu hơn sẽ bị loại; 0 = không hết hạn
+
+    # Cấu hình Mẫu khối khi khai thác
+    MAX_BLOCK_BYTES = 1024 * 1024  # Tổng kích thước JSON của các giao dịch trong một khối (kể cả giao dịch thưởng)
+    MAX_BLOCK_TRANSACTIONS = 2000  # Số giao dịch tối đa một khối (kể cả giao dịch thưởng)
+    BLOCK_TX_SELECTION_POLICY = "oldest_first"  # "oldest_first" hoặc "sender_fair"
+
+    # Cấu hình Khối Genesis
+    INITIAL_SUPPLY_TOKENS = 10000000
+    FOUNDER_ADDRESS = "SOa29d38da8236aae8ff4046d4476cd684dc8289694cecf73f1cf0db96e972f8faK"
+    GENESIS_PREVIOUS_HASH = "0" * 64
+    GENESIS_NONCE = 0
+
+    # Cấu hình Mạng lưới
+    DEFAULT_NODE_PORT = 5000
+    MAX_BLOCKS_PER_PAGE = 500  # Số khối tối đa trả về cho một truy vấn /chain có phân trang
+    MAX_HEADERS_PER_PAGE = 2000  # Số header tối đa trả về cho một truy vấn /headers
+    MAX_TRANSACTIONS_PER_PAGE = 500  # Số giao dịch tối đa một trang của /address/<addr>/transactions
+    MAX_PUBKEY_BATCH = 1000  # Số địa chỉ tối đa trong một yêu cầu POST /address/pubkeys
+
+    # Cấu hình Đồng bộ (header trước, thân khối song song)
+    SYNC_HEADER_LOOKBACK = 100  # Số khối nhìn lại phía sau đỉnh cục bộ khi tìm điểm rẽ nhánh
+    SYNC_CHUNK_SIZE = 200  # Số khối mỗi đoạn tải thân khối
+    SYNC_MAX_WORKERS = 8  # Số luồng tải song song tối đa
+    SYNC_REQUEST_TIMEOUT = 10
+
+    # Cấu hình Định dạng truyền giữa các nút (xem sok/wire.py)
+    WIRE_GZIP_MIN_BYTES = 1024  # Phản hồi nhỏ hơn ngưỡng này không được nén
+    WIRE_GZIP_LEVEL = 5
+
+    # Cấu hình Lan truyền (gossip) khối và giao dịch ở nền
+    GOSSIP_WORKERS = 8  # Số luồng gửi; mỗi peer luôn do cùng một luồng phụ trách
+    GOSSIP_QUEUE_SIZE = 10000  # Tổng số thông điệp chờ gửi tối đa, vượt quá sẽ bị bỏ
+    GOSSIP_REQUEST_TIMEOUT = 2
+    GOSSIP_BACKOFF_BASE_SECONDS = 2  # Thời gian tạm ngưng peer sau lần lỗi đầu tiên, gấp đôi sau mỗi lần lỗi tiếp theo
+    GOSSIP_BACKOFF_MAX_SECONDS = 300
+    MAX_INV_ITEMS = 1000  # Số mục tối đa trong một thông điệp /inv
+    RELAY_SEEN_CACHE_SIZE = 50000  # Số mã băm khối/giao dịch đã thấy được ghi nhớ để bỏ qua bản trùng
+    RELAY_PEER_KNOWN_SIZE = 5000  # Số mã băm ghi nhớ cho mỗi peer là peer đó đã có, để không công bố lại
+    COMPACT_BLOCKS_ENABLED = True  # Gửi khối dạng rút gọn (phần đầu + mã ngắn giao dịch) thay vì toàn bộ giao dịch
+    COMPACT_SHORT_ID_HEX = 12  # Độ dài mã ngắn (ký tự hex) của mỗi giao dịch trong khối rút gọn
+    COMPACT_PARTIAL_BLOCKS = 32  # Số khối rút gọn đang chờ giao dịch bổ sung được giữ lại
+
+    # Cấu hình Xác thực chuỗi
+    CHECKPOINTS: Dict[int, str] = {}  # {chỉ số khối: hash} được tin cậy: chuỗi mâu thuẫn hoặc rẽ nhánh thấp hơn checkpoint bị từ chối
+    VALIDATION_WORKERS = 1  # Số tiến trình băm lại khối khi xác thực; 0 = dùng toàn bộ lõi CPU
+    PARALLEL_VALIDATION_MIN_BLOCKS = 256  # Dưới ngưỡng này việc băm chạy ngay trong tiến trình hiện tại
+    SIGNATURE_VERIFY_WORKERS = 1  # Số tiến trình xác thực chữ ký cho khối từ peer; 0 = dùng toàn bộ lõi CPU
+    PARALLEL_SIGNATURE_MIN_TXS = 32  # Dưới ngưỡng này chữ ký được kiểm tra ngay trong tiến trình hiện tại
+
+    # Cấu hình Bộ nhớ đệm
+    BLOCK_CACHE_SIZE = 256  # Số khối đã giải mã được giữ trong LRU của Blockchain
+    PUBLIC_KEY_CACHE_SIZE = 1024  # Số khóa công khai đã phân tích từ PEM được giữ lại
+    SIGNATURE_CACHE_SIZE = 20000  # Số chữ ký đã xác thực thành công được ghi nhớ
+
+    # Cấu hình Ảnh chụp số dư (khởi động nhanh cho nút mới)
+    SNAPSHOT_INTERVAL = 1000  # Chụp bảng số dư mỗi khi chỉ số khối chia hết cho giá trị này; 0 = tắt
+    SNAPSHOTS_TO_KEEP = 3
+    SNAPSHOT_BOOTSTRAP = True  # Nút mới (chỉ có genesis) khởi động từ ảnh chụp của peer thay vì tải lại toàn bộ chuỗi
+    SNAPSHOT_MIN_PEER_AGREEMENT = 2  # Số peer phải cùng công bố một ảnh chụp, trừ khi khối của nó trùng một checkpoint
+
+    # Cấu hình Lưu trữ SQLite
+    SQLITE_JOURNAL_MODE = "WAL"
+    SQLITE_SYNCHRONOUS = "NORMAL"  # An toàn với WAL, nhanh hơn nhiều so với FULL
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB = 64 * 1024
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+    REORG_UNDO_DEPTH = 1000  # Số khối gần nhất giữ dữ liệu hoàn tác số dư; nhánh sâu hơn sẽ dựng lại số dư từ đầu
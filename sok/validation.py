@@ -0,0 +1,306 @@
+# sok/validation.py
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+from . import wallet
+from .merkle import compute_merkle_root
+from .transaction import Transaction
+from .utils import Config, hash_data, calculate_transaction_hash, get_process_context
+
+if TYPE_CHECKING:
+    from .blockchain import Block, Blockchain
+
+logger = logging.getLogger(__name__)
+
+def block_version_at(index: int) -> int:
+    """Phiên bản bắt buộc của khối tại một độ cao, theo Config.BLOCK_V2_ACTIVATION_HEIGHT."""
+    activation_height = Config.BLOCK_V2_ACTIVATION_HEIGHT
+    return 2 if activation_height is not None and index >= activation_height else 1
+
+def has_duplicate_transactions(transactions: List[Dict[str, Any]]) -> bool:
+    """
+    Khối chứa giao dịch trùng lặp. Cây Merkle nhân đôi nút cuối ở tầng lẻ, nên một khối phiên bản 2 bị chép thêm giao dịch cuối
+    có cùng Merkle root và cùng hash với khối gốc (kiểu CVE-2012-2459): hash khớp không đủ để nhận khối.
+    """
+    return len({calculate_transaction_hash(tx) for tx in transactions}) != len(transactions)
+
+def compute_block_hash(block_data: Dict[str, Any]) -> str:
+    """
+    Băm lại một khối dạng dict, giống hệt Block.calculate_hash() nhưng không cần dựng đối tượng Block.
+    Với khối phiên bản 2, Merkle root luôn được tính lại từ giao dịch nên merkle_root khai báo sai sẽ làm lệch hash.
+    Khối có phiên bản khác phiên bản bắt buộc tại độ cao của nó cho ra chuỗi rỗng.
+    """
+    version = block_data.get('version') or 1
+    if version != block_version_at(block_data['index']): return ''
+    if version == 1:
+        return hash_data({'index': block_data['index'], 'previous_hash': block_data['previous_hash'], 'timestamp': block_data['timestamp'],
+                          'transactions': block_data['transactions'], 'nonce': block_data['nonce']})
+    merkle_root = compute_merkle_root(block_data['transactions'])
+    if block_data.get('merkle_root') != merkle_root: return ''
+    return hash_data({'version': version, 'index': block_data['index'], 'previous_hash': block_data['previous_hash'], 'timestamp': block_data['timestamp'],
+                      'merkle_root': merkle_root, 'nonce': block_data['nonce']})
+
+_process_pools: Dict[int, Any] = {}
+_process_pools_lock = threading.Lock()
+
+def _get_process_pool(workers: int):
+    """
+    Pool tiến trình dùng lại giữa các khối và các lần đồng bộ (theo số tiến trình), cho cả việc băm khối lẫn xác thực chữ ký:
+    khởi tạo pool cho mỗi lần gọi sẽ chậm hơn chính việc xác thực.
+    """
+    with _process_pools_lock:
+        pool = _process_pools.get(workers)
+        if pool is None:
+            pool = _process_pools[workers] = get_process_context().Pool(processes=workers)
+            atexit.register(pool.terminate)
+        return pool
+
+def find_invalid_hashes(blocks: List[Dict[str, Any]]) -> List[int]:
+    """Trả về chỉ số các khối có hash khai báo không khớp với hash tính lại hoặc chứa giao dịch trùng lặp. Chạy được trong tiến trình con."""
+    return [block['index'] for block in blocks if block.get('hash') != compute_block_hash(block) or has_duplicate_transactions(block['transactions'])]
+
+def verify_block_hashes(blocks: List[Dict[str, Any]], workers: Optional[int] = None) -> bool:
+    """
+    Kiểm tra hash và giao dịch trùng lặp của từng khối (transactions phải đã được giải mã, xem normalize_chain). Khi số khối đủ lớn, việc băm được chia đều cho pool tiến trình;
+    các khối nhỏ được kiểm tra ngay trong tiến trình hiện tại vì chi phí gửi dữ liệu sang tiến trình con lớn hơn lợi ích.
+    """
+    workers = workers if workers is not None else Config.VALIDATION_WORKERS
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    if workers <= 1 or len(blocks) < Config.PARALLEL_VALIDATION_MIN_BLOCKS:
+        return not find_invalid_hashes(blocks)
+    chunk_size = -(-len(blocks) // (workers * 4))
+    chunks = [blocks[i:i + chunk_size] for i in range(0, len(blocks), chunk_size)]
+    for invalid in _get_process_pool(workers).imap_unordered(find_invalid_hashes, chunks):
+        if invalid:
+            logger.warning(f"[Validation] Hash không hợp lệ tại khối #{invalid[0]}.")
+            return False
+    return True
+
+def normalize_chain(chain: List[Dict[str, Any]]) -> None:
+    """Giải mã trường transactions còn ở dạng chuỗi JSON (dữ liệu lấy thẳng từ bảng blocks)."""
+    for block_data in chain:
+        if isinstance(block_data['transactions'], str):
+            block_data['transactions'] = json.loads(block_data['transactions'])
+
+def check_linkage(chain: List[Dict[str, Any]]) -> bool:
+    """Kiểm tra chỉ số liên tiếp và previous_hash trỏ đúng khối trước. Không băm lại khối nào."""
+    if chain[0]['index'] == 0 and chain[0]['previous_hash'] != Config.GENESIS_PREVIOUS_HASH: return False
+    for previous, current in zip(chain, chain[1:]):
+        if current['index'] != previous['index'] + 1 or current['previous_hash'] != previous['hash']: return False
+    return True
+
+def check_checkpoints(chain: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    So khớp chuỗi với Config.CHECKPOINTS ({chỉ số: hash}). Trả về chỉ số checkpoint cao nhất có trong chuỗi
+    (-1 nếu không có), hoặc None nếu chuỗi mâu thuẫn với một checkpoint.
+    """
+    if not chain: return -1
+    first_index, highest = chain[0]['index'], -1
+    for index, expected_hash in Config.CHECKPOINTS.items():
+        position = index - first_index
+        if 0 <= position < len(chain):
+            if chain[position]['hash'] != expected_hash: return None
+            highest = max(highest, index)
+    return highest
+
+def check_fork_point(fork_index: int, local_height: int) -> bool:
+    """Nhánh rẽ không được thay thế khối checkpoint mà chuỗi cục bộ đã có: điểm rẽ phải nằm từ checkpoint cao nhất đó trở lên."""
+    reached = [index for index in Config.CHECKPOINTS if index <= local_height]
+    return not reached or fork_index >= max(reached)
+
+def validate_full_chain(chain: List[Dict[str, Any]], workers: Optional[int] = None) -> bool:
+    """
+    Xác thực một chuỗi đầy đủ từ genesis. Mọi khối đều được băm lại: checkpoint chỉ so hash khai báo,
+    không ràng buộc nội dung khối, nên chỉ dùng để loại chuỗi mâu thuẫn.
+    """
+    if not chain: return False
+    try:
+        normalize_chain(chain)
+        if chain[0]['index'] != 0 or not check_linkage(chain): return False
+        if check_checkpoints(chain) is None: return False
+        return verify_block_hashes(chain, workers)
+    except (KeyError, TypeError, json.JSONDecodeError):
+        return False
+
+class ChainValidator:
+    """
+    Xác thực chuỗi ứng viên so với chuỗi cục bộ. Các khối đến điểm rẽ nhánh đã được xác thực khi ghi vào CSDL;
+    mọi khối sau đó (những khối sẽ được ghi) đều bị băm lại. Checkpoint chỉ dùng để loại chuỗi mâu thuẫn và giới hạn độ sâu nhánh rẽ.
+    Chi phí vì vậy tỉ lệ với số khối mới thay vì độ dài toàn chuỗi.
+    """
+    def __init__(self, blockchain: 'Blockchain', workers: Optional[int] = None):
+        self.blockchain = blockchain
+        self.workers = workers
+
+    def validate(self, candidate_chain: List[Dict[str, Any]]) -> Optional[int]:
+        """Trả về điểm rẽ nhánh (-1 nếu khác từ genesis) khi chuỗi ứng viên hợp lệ, ngược lại trả về None."""
+        if not candidate_chain: return None
+        try:
+            normalize_chain(candidate_chain)
+            if not check_linkage(candidate_chain): return None
+            if check_checkpoints(candidate_chain) is None: return None
+            fork_index = self.blockchain._find_fork_point(candidate_chain)
+            # Đoạn không khớp chuỗi cục bộ phải bắt đầu từ genesis hoặc nối vào khối chung cuối cùng
+            if fork_index == -1 and candidate_chain[0]['index'] != 0: return None
+            if not check_fork_point(fork_index, self.blockchain.last_block.index): return None
+            new_blocks = candidate_chain[max(0, fork_index + 1 - candidate_chain[0]['index']):]
+            if not verify_block_hashes(new_blocks, self.workers): return None
+            return fork_index
+        except (KeyError, TypeError, json.JSONDecodeError):
+            return None
+
+# --- XÁC THỰC GIAO DỊCH TRONG KHỐI TỪ PEER ---
+
+def signing_hash(transaction: Dict[str, Any]) -> str:
+    return Transaction.from_dict(transaction).calculate_hash()
+
+def sender_matches_key(tx: Dict[str, Any]) -> bool:
+    """
+    sender_address không nằm trong dữ liệu được ký nên phải được đối chiếu với khóa công khai ở mọi giao dịch,
+    kể cả khi chữ ký đã có trong bộ nhớ đệm: nếu không, đổi sender_address của một giao dịch đã xác thực sẽ trừ tiền người khác.
+    """
+    return tx.get('sender_address') == wallet.get_address_from_public_key_pem(tx['sender_public_key_pem'])
+
+def find_invalid_signatures(items: List[Tuple[int, Dict[str, Any]]]) -> List[int]:
+    """Trả về vị trí các giao dịch có địa chỉ người gửi hoặc chữ ký không hợp lệ. Chạy được trong tiến trình con."""
+    invalid = []
+    for position, tx in items:
+        try:
+            pem, signature = tx['sender_public_key_pem'], tx['signature']
+            if not sender_matches_key(tx) or not signature: raise ValueError
+            if not wallet.verify_signature(pem, signing_hash(tx), signature): raise ValueError
+        except (KeyError, TypeError, ValueError):
+            invalid.append(position)
+    return invalid
+
+def verify_transaction_signatures(transactions: List[Dict[str, Any]], workers: Optional[int] = None) -> Optional[int]:
+    """
+    Xác thực chữ ký của các giao dịch người dùng (bỏ qua giao dịch hệ thống có sender '0').
+    Địa chỉ người gửi luôn được kiểm tra; chữ ký đã có trong bộ nhớ đệm được bỏ qua, phần còn lại được chia cho pool tiến trình khi đủ nhiều.
+    Trả về vị trí giao dịch sai đầu tiên, hoặc None nếu tất cả hợp lệ.
+    """
+    pending = []
+    for position, tx in enumerate(transactions):
+        if tx.get('sender_address') == "0": continue
+        try:
+            if not sender_matches_key(tx): return position
+            if wallet.is_signature_cached(tx['sender_public_key_pem'], signing_hash(tx), tx['signature']): continue
+        except (KeyError, TypeError, ValueError):
+            return position
+        pending.append((position, tx))
+    if not pending: return None
+    workers = workers if workers is not None else Config.SIGNATURE_VERIFY_WORKERS
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    if workers <= 1 or len(pending) < Config.PARALLEL_SIGNATURE_MIN_TXS:
+        invalid = find_invalid_signatures(pending)
+    else:
+        chunk_size = -(-len(pending) // (workers * 2))
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        invalid = [position for result in _get_process_pool(workers).map(find_invalid_signatures, chunks) for position in result]
+        # Chữ ký được xác thực trong tiến trình con: ghi nhớ lại ở tiến trình chính cho các lần lan truyền sau
+        invalid_positions = set(invalid)
+        for position, tx in pending:
+            if position not in invalid_positions:
+                wallet.cache_verified_signature(tx['sender_public_key_pem'], signing_hash(tx), tx['signature'])
+    return min(invalid) if invalid else None
+
+def mining_reward_at(index: int) -> float:
+    """Phần thưởng khai thác tối đa của khối tại độ cao index, sau các lần halving."""
+    return Config.MINING_REWARD / (2 ** (index // Config.HALVING_BLOCK_INTERVAL))
+
+class StagedLedger:
+    """
+    Sổ cái tạm trong bộ nhớ: đọc số dư từ CSDL khi cần, áp dụng giao dịch theo thứ tự mà không ghi xuống đĩa.
+    get_balance thay nguồn đọc số dư, ví dụ con trỏ của giao dịch ghi đang tổ chức lại chuỗi.
+    """
+    def __init__(self, blockchain: 'Blockchain', get_balance: Optional[Callable[[str], float]] = None):
+        self.blockchain = blockchain
+        self.get_balance = get_balance or blockchain.get_balance
+        self.balances: Dict[str, float] = {}
+
+    def balance_of(self, address: str) -> float:
+        if address not in self.balances:
+            self.balances[address] = self.get_balance(address)
+        return self.balances[address]
+
+    def apply(self, tx: Dict[str, Any]) -> Optional[str]:
+        """Áp dụng một giao dịch; trả về lý do nếu giao dịch làm âm số dư, ngược lại trả về None."""
+        sender, recipient, amount = tx.get('sender_address'), tx.get('recipient_address'), float(tx.get('amount', 0))
+        if sender and sender != "0":
+            if amount <= 0: return "Số tiền giao dịch phải lớn hơn 0."
+            if self.balance_of(sender) < amount: return f"Số dư không đủ cho {sender[:10]}..."
+            self.balances[sender] -= amount
+        if recipient:
+            self.balances[recipient] = self.balance_of(recipient) + amount
+        return None
+
+def check_block_structure(transactions: List[Dict[str, Any]], index: int) -> Optional[str]:
+    """
+    Cấu trúc giao dịch của khối #index; trả về lý do nếu sai, ngược lại None.
+    Khối genesis chỉ có một giao dịch phát hành; các khối khác có đúng một giao dịch thưởng ở đầu,
+    không vượt phần thưởng của độ cao đó và không trùng giao dịch.
+    """
+    if not transactions: return "Khối không có giao dịch."
+    first_tx = transactions[0]
+    if index == 0:
+        if len(transactions) != 1 or first_tx.get('sender_address') != "0" or first_tx.get('signature') != "genesis_transaction":
+            return "Khối genesis không hợp lệ."
+        if float(first_tx.get('amount', 0)) > Config.INITIAL_SUPPLY_TOKENS:
+            return "Lượng phát hành của khối genesis vượt mức cho phép."
+        return None
+    if first_tx.get('sender_address') != "0" or first_tx.get('signature') != "mining_reward":
+        return "Giao dịch đầu tiên phải là giao dịch thưởng."
+    if float(first_tx.get('amount', 0)) > mining_reward_at(index) + 1e-12:
+        return "Phần thưởng khai thác vượt mức cho phép."
+    if any(tx.get('sender_address') == "0" for tx in transactions[1:]):
+        return "Chỉ được có một giao dịch hệ thống trong khối."
+    if has_duplicate_transactions(transactions):
+        return "Khối chứa giao dịch trùng lặp."
+    return None
+
+def apply_to_ledger(ledger: StagedLedger, transactions: List[Dict[str, Any]]) -> Optional[str]:
+    """Áp dụng lần lượt các giao dịch của một khối lên sổ cái tạm; trả về lý do của giao dịch đầu tiên thất bại."""
+    for position, tx in enumerate(transactions):
+        reason = ledger.apply(tx)
+        if reason: return f"Giao dịch #{position}: {reason}"
+    return None
+
+def validate_block_transactions(blockchain: 'Blockchain', transactions: List[Dict[str, Any]], workers: Optional[int] = None) -> Tuple[bool, str]:
+    """
+    Xác thực đầy đủ giao dịch của một khối sắp nối vào đỉnh chuỗi:
+    1. Cấu trúc: xem check_block_structure.
+    2. Chữ ký: kiểm tra song song trên pool tiến trình.
+    3. Số dư: áp dụng lần lượt trên sổ cái tạm, giao dịch sau thấy được kết quả của giao dịch trước.
+    """
+    reason = check_block_structure(transactions, blockchain.last_block.index + 1)
+    if reason: return False, reason
+
+    invalid_position = verify_transaction_signatures(transactions, workers)
+    if invalid_position is not None:
+        return False, f"Chữ ký hoặc địa chỉ người gửi không hợp lệ ở giao dịch #{invalid_position}."
+
+    reason = apply_to_ledger(StagedLedger(blockchain), transactions)
+    if reason: return False, reason
+    return True, "Khối hợp lệ"
+
+def validate_fork_blocks(blocks: List['Block'], workers: Optional[int] = None) -> Optional[str]:
+    """
+    Kiểm tra cấu trúc và chữ ký giao dịch của các khối sắp thay vào chuỗi qua đồng bộ hoặc tổ chức lại.
+    Chữ ký của mọi khối được kiểm tra chung một lượt trên pool tiến trình, trước khi giữ khóa ghi;
+    phần số dư phụ thuộc trạng thái tại điểm rẽ nhánh nên được kiểm tra trong _reorganize.
+    """
+    transactions, owners = [], []
+    for block in blocks:
+        reason = check_block_structure(block.transactions, block.index)
+        if reason: return f"Khối #{block.index}: {reason}"
+        transactions.extend(block.transactions)
+        owners.extend([block.index] * len(block.transactions))
+    invalid_position = verify_transaction_signatures(transactions, workers)
+    if invalid_position is not None:
+        return f"Khối #{owners[invalid_position]}: chữ ký hoặc địa chỉ người gửi không hợp lệ."
+    return None
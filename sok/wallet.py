@@ -0,0 +1,183 @@
+# sok/wallet.py
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, ed25519
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.backends import default_backend
+from typing import Optional, Any, Dict, Tuple
+from .utils import hash_data, Config, LRUCache
+
+# Khóa công khai đã phân tích (theo PEM) và các chữ ký đã xác thực thành công (theo PEM, hash, chữ ký).
+# Một giao dịch được xác thực lại ở /transactions/new, ở máy chủ ví và ở mỗi bước lan truyền; lần sau chỉ còn tra từ điển.
+_public_key_cache = LRUCache(Config.PUBLIC_KEY_CACHE_SIZE)
+_signature_cache = LRUCache(Config.SIGNATURE_CACHE_SIZE)
+
+# Các loại khóa được hỗ trợ. Địa chỉ = tiền tố + SHA256(PEM khóa công khai) + 'K'; tiền tố cho biết loại khóa.
+KEY_TYPE_RSA = 'rsa'
+KEY_TYPE_ED25519 = 'ed25519'
+ADDRESS_PREFIXES = {KEY_TYPE_RSA: 'SO', KEY_TYPE_ED25519: 'SE'}
+# Mọi khóa công khai Ed25519 dạng SubjectPublicKeyInfo đều bắt đầu bằng cùng 12 byte DER, tức chuỗi base64 này
+_ED25519_SPKI_BASE64_PREFIX = 'MCowBQYDK2VwAyEA'
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
+def public_key_to_pem(public_key_obj: Any) -> str:
+    """Chuyển đổi đối tượng khóa công khai sang định dạng PEM."""
+    return public_key_obj.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode('utf-8')
+
+def load_public_key_from_pem(pem_string: str):
+    """Tải đối tượng khóa công khai từ chuỗi PEM (có bộ nhớ đệm)."""
+    public_key = _public_key_cache.get(pem_string)
+    if public_key is None:
+        public_key = serialization.load_pem_public_key(
+            pem_string.encode('utf-8'),
+            backend=default_backend()
+        )
+        _public_key_cache.put(pem_string, public_key)
+    return public_key
+
+class Wallet:
+    """
+    Ví RSA-2048 (mặc định, địa chỉ 'SO...K') hoặc Ed25519 (địa chỉ 'SE...K').
+    Khi nạp từ PEM, loại khóa được nhận ra từ chính khóa. PEM, DER và địa chỉ được tính một lần rồi giữ lại.
+    """
+    __slots__ = ('private_key', 'public_key', 'key_type', 'address', '_public_key_pem', '_public_key_der')
+
+    def __init__(self, private_key_pem: Optional[str] = None, key_type: str = KEY_TYPE_RSA):
+        if private_key_pem:
+            self.private_key = serialization.load_pem_private_key(
+                private_key_pem.encode('utf-8'),
+                password=None,
+                backend=default_backend()
+            )
+        elif key_type == KEY_TYPE_ED25519:
+            self.private_key = ed25519.Ed25519PrivateKey.generate()
+        elif key_type == KEY_TYPE_RSA:
+            self.private_key = rsa.generate_private_key(
+                public_exponent=65537,
+                key_size=2048,
+                backend=default_backend()
+            )
+        else:
+            raise ValueError(f"Loại khóa không được hỗ trợ: '{key_type}'.")
+        self.key_type: str = KEY_TYPE_ED25519 if isinstance(self.private_key, ed25519.Ed25519PrivateKey) else KEY_TYPE_RSA
+        self.public_key = self.private_key.public_key()
+        self._public_key_pem: str = public_key_to_pem(self.public_key)
+        self._public_key_der: bytes = self.public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.address: str = get_address_from_public_key_pem(self._public_key_pem)
+        # Khóa công khai của chính ví này chắc chắn được dùng lại khi xác thực giao dịch do ví ký
+        _public_key_cache.put(self._public_key_pem, self.public_key)
+
+    def get_address(self) -> str:
+        """Lấy địa chỉ ví từ khóa công khai của ví này."""
+        return self.address
+
+    def get_private_key_pem(self) -> str:
+        """Lấy khóa riêng tư dưới dạng chuỗi PEM."""
+        return self.private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ).decode('utf-8')
+
+    def get_public_key_pem(self) -> str:
+        """Lấy khóa công khai dưới dạng chuỗi PEM."""
+        return self._public_key_pem
+
+    def get_public_key_der(self) -> bytes:
+        """Lấy khóa công khai dưới dạng DER (SubjectPublicKeyInfo)."""
+        return self._public_key_der
+
+# --- KHO KHÓA DÙNG CHUNG TRONG TIẾN TRÌNH ---
+# Mỗi tệp .pem chỉ được đọc và phân tích một lần; nạp lại khi tệp bị thay đổi trên đĩa.
+_keystore: Dict[str, Tuple[int, Wallet]] = {}
+_keystore_lock = threading.Lock()
+
+def load_wallet_file(path: str) -> Wallet:
+    """Nạp ví từ tệp khóa riêng PEM, dùng lại đối tượng Wallet đã nạp trước đó cho cùng một tệp."""
+    real_path = os.path.realpath(path)
+    modified_at = os.stat(real_path).st_mtime_ns
+    with _keystore_lock:
+        cached = _keystore.get(real_path)
+        if cached is not None and cached[0] == modified_at: return cached[1]
+    with open(real_path, 'r', encoding='utf-8') as f:
+        wallet = Wallet(private_key_pem=f.read())
+    with _keystore_lock:
+        _keystore[real_path] = (modified_at, wallet)
+    return wallet
+
+def sign_data(private_key_obj: Any, data_hash: str) -> str:
+    """Ký vào một chuỗi hash và trả về chữ ký dưới dạng hex (Ed25519: 128 ký tự, RSA-PSS: 512 ký tự)."""
+    if isinstance(private_key_obj, ed25519.Ed25519PrivateKey):
+        return private_key_obj.sign(bytes.fromhex(data_hash)).hex()
+    signature_bytes = private_key_obj.sign(
+        bytes.fromhex(data_hash),
+        padding.PSS(
+            mgf=padding.MGF1(hashes.SHA256()),
+            salt_length=padding.PSS.MAX_LENGTH
+        ),
+        hashes.SHA256()
+    )
+    return signature_bytes.hex()
+
+def verify_signature(public_key_pem_string: str, data_hash: str, signature_hex: str) -> bool:
+    """Xác thực một chữ ký. Chỉ kết quả hợp lệ được ghi nhớ, chữ ký sai luôn được kiểm tra lại."""
+    cache_key = (public_key_pem_string, data_hash, signature_hex)
+    if _signature_cache.get(cache_key): return True
+    try:
+        public_key_loaded = load_public_key_from_pem(public_key_pem_string)
+        if isinstance(public_key_loaded, ed25519.Ed25519PublicKey):
+            public_key_loaded.verify(bytes.fromhex(signature_hex), bytes.fromhex(data_hash))
+            _signature_cache.put(cache_key, True)
+            return True
+        public_key_loaded.verify(
+            bytes.fromhex(signature_hex),
+            bytes.fromhex(data_hash),
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+        _signature_cache.put(cache_key, True)
+        return True
+    except Exception:
+        return False
+
+def is_signature_cached(public_key_pem_string: str, data_hash: str, signature_hex: str) -> bool:
+    return bool(_signature_cache.get((public_key_pem_string, data_hash, signature_hex)))
+
+def cache_verified_signature(public_key_pem_string: str, data_hash: str, signature_hex: str):
+    """Ghi nhớ một chữ ký đã được xác thực ở nơi khác (ví dụ trong tiến trình con của sok.validation)."""
+    _signature_cache.put((public_key_pem_string, data_hash, signature_hex), True)
+
+def get_crypto_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {'public_keys': _public_key_cache.get_stats(), 'signatures': _signature_cache.get_stats()}
+
+def get_address_from_public_key_pem(public_key_pem: str) -> str:
+    """
+    Tạo địa chỉ ví từ public key dạng PEM.
+    Đây là một hàm tiện ích để đảm bảo việc tính toán địa chỉ là nhất quán trên toàn hệ thống.
+    """
+    public_key_bytes = public_key_pem.encode('utf-8')
+    raw_hash = hash_data(public_key_bytes)
+    return f"{ADDRESS_PREFIXES[get_key_type_from_public_key_pem(public_key_pem)]}{raw_hash}K"
+
+def get_key_type_from_public_key_pem(public_key_pem: str) -> str:
+    """Nhận ra loại khóa từ PEM mà không cần phân tích khóa; mọi PEM không phải Ed25519 được coi là RSA như trước."""
+    body = ''.join(line.strip() for line in public_key_pem.strip().splitlines() if not line.startswith('-----'))
+    return KEY_TYPE_ED25519 if body.startswith(_ED25519_SPKI_BASE64_PREFIX) else KEY_TYPE_RSA
+
+def get_address_key_type(address: str) -> Optional[str]:
+    """Loại khóa ứng với tiền tố của một địa chỉ, hoặc None nếu địa chỉ không đúng định dạng (tiền tố + 64 ký tự hex + 'K')."""
+    if len(address) != 67 or not address.endswith('K') or not all(c in _HEX_DIGITS for c in address[2:-1]): return None
+    for key_type, prefix in ADDRESS_PREFIXES.items():
+        if address.startswith(prefix): return key_type
+    return None
@@ -0,0 +1,58 @@
+# sok/wire.py
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import requests
+from typing import Any, Dict, List, Optional
+from .utils import Config
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # Có trong requirements.txt; bản cài cũ thiếu msgpack thì nút và client dùng JSON rút gọn (vẫn nén gzip)
+
+# Định dạng trao đổi giữa các nút, được chọn theo header Accept của client:
+# - application/json: định dạng cũ, trường transactions của mỗi khối lấy từ CSDL vẫn là chuỗi JSON lồng bên trong.
+# - application/vnd.sok+json: JSON với transactions là danh sách, chỉ mã hóa và phân tích một lần.
+# - application/msgpack: như trên nhưng ở dạng nhị phân (khi có cài msgpack).
+JSON_MIMETYPE = 'application/json'
+SOK_JSON_MIMETYPE = 'application/vnd.sok+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+def server_mimetypes() -> List[str]:
+    # JSON đứng đầu: client cũ gửi "Accept: */*" vẫn nhận đúng định dạng như trước
+    return [JSON_MIMETYPE, SOK_JSON_MIMETYPE] + ([MSGPACK_MIMETYPE] if msgpack is not None else [])
+
+def client_headers() -> Dict[str, str]:
+    accept = f"{SOK_JSON_MIMETYPE};q=0.9, {JSON_MIMETYPE};q=0.5"
+    if msgpack is not None: accept = f"{MSGPACK_MIMETYPE}, {accept}"
+    return {'Accept': accept, 'Accept-Encoding': 'gzip'}
+
+def encode_body(data: Any, mimetype: str) -> bytes:
+    if mimetype == MSGPACK_MIMETYPE: return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def decode_body(content: bytes, mimetype: str) -> Any:
+    if mimetype == MSGPACK_MIMETYPE:
+        if msgpack is None: raise ValueError("Nhận dữ liệu msgpack nhưng thư viện msgpack chưa được cài đặt.")
+        return msgpack.unpackb(content, raw=False)
+    return json.loads(content)
+
+def gzip_body(body: bytes) -> Optional[bytes]:
+    """Nén gzip nếu đủ lớn để đáng nén, ngược lại trả về None."""
+    if len(body) < Config.WIRE_GZIP_MIN_BYTES: return None
+    return gzip.compress(body, compresslevel=Config.WIRE_GZIP_LEVEL)
+
+# --- PHÍA CLIENT ---
+def get(url: str, params: Optional[Dict[str, Any]] = None, timeout: float = 10, session: Optional[requests.Session] = None) -> requests.Response:
+    """GET có thương lượng định dạng; requests tự giải nén gzip. Đọc kết quả bằng response_data()."""
+    return (session or requests).get(url, params=params, timeout=timeout, headers=client_headers())
+
+def response_data(response: requests.Response) -> Any:
+    mimetype = response.headers.get('Content-Type', JSON_MIMETYPE).split(';')[0].strip()
+    return decode_body(response.content, mimetype)
+
+def wire_size(response: requests.Response) -> int:
+    """Số byte thực sự truyền qua mạng (trước khi giải nén)."""
+    return int(response.headers.get('Content-Length') or len(response.content))
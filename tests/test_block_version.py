@@ -0,0 +1,34 @@
+# tests/test_block_version.py
+# -*- coding: utf-8 -*-
+
+from sok.blockchain import Block
+from sok.utils import Config
+from sok.validation import compute_block_hash, find_invalid_hashes, verify_block_hashes
+
+def _transactions(count: int) -> list:
+    return [{'sender_address': '0', 'sender_public_key_pem': '0', 'recipient_address': f'SO{i:064x}K', 'amount': 1.0 + i, 'timestamp': 1700000000.0 + i, 'signature': 'mining_reward'}
+            for i in range(count)]
+
+def test_blocks_stay_version_1_until_activation(monkeypatch):
+    assert Block(index=7, previous_hash='a' * 64, timestamp=1.0, transactions=_transactions(1)).version == 1
+    monkeypatch.setattr(Config, 'BLOCK_V2_ACTIVATION_HEIGHT', 5)
+    assert Block(index=4, previous_hash='a' * 64, timestamp=1.0, transactions=_transactions(1)).version == 1
+    assert Block(index=5, previous_hash='a' * 64, timestamp=1.0, transactions=_transactions(1)).version == 2
+
+def test_version_must_match_the_height(monkeypatch):
+    v2_block = Block(index=3, previous_hash='a' * 64, timestamp=1.0, transactions=_transactions(2), version=2).to_dict()
+    assert compute_block_hash(v2_block) == ''
+    monkeypatch.setattr(Config, 'BLOCK_V2_ACTIVATION_HEIGHT', 3)
+    assert compute_block_hash(v2_block) == v2_block['hash']
+    v1_block = Block(index=3, previous_hash='a' * 64, timestamp=1.0, transactions=_transactions(2), version=1).to_dict()
+    assert compute_block_hash(v1_block) == ''
+
+def test_duplicated_last_transaction_is_rejected(monkeypatch):
+    monkeypatch.setattr(Config, 'BLOCK_V2_ACTIVATION_HEIGHT', 0)
+    block_data = Block(index=1, previous_hash='a' * 64, timestamp=1.0, transactions=_transactions(3)).to_dict()
+    mutated = dict(block_data, transactions=block_data['transactions'] + [block_data['transactions'][-1]])
+    # Cùng Merkle root nên cùng hash: chỉ việc kiểm tra giao dịch trùng lặp mới loại được khối này
+    assert compute_block_hash(mutated) == block_data['hash']
+    assert find_invalid_hashes([block_data]) == []
+    assert find_invalid_hashes([mutated]) == [1]
+    assert not verify_block_hashes([mutated], workers=1)
@@ -0,0 +1,81 @@
+# tests/test_canonical_json.py
+# -*- coding: utf-8 -*-
+
+# Kiểm tra tính tương thích: canonical_json và cách băm khối mới phải cho ra đúng từng byte như json.dumps(..., sort_keys=True)
+# mà chuỗi hiện có đã dùng, nếu không mọi hash đã lưu sẽ không còn khớp.
+
+import hashlib
+import json
+import os
+import sqlite3
+import pytest
+from sok.blockchain import Block
+from sok.utils import canonical_json, canonical_json_list, hash_data, calculate_transaction_hash
+
+SHIPPED_CHAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'blockchain.sqlite')
+
+def _legacy_hash(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+def _shipped_blocks():
+    if not os.path.exists(SHIPPED_CHAIN): return []
+    # Chỉ đọc: tệp chuỗi đi kèm kho mã không được thay đổi
+    connection = sqlite3.connect(f'file:{SHIPPED_CHAIN}?mode=ro', uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in connection.execute('SELECT * FROM blocks ORDER BY "index"')]
+    finally:
+        connection.close()
+
+EDGE_VALUES = [
+    0.1, 0.1 + 0.2, 1e-7, 1e16, 1e22, 123456789.123456789, -0.0, 2.5e-308, 1753789758.1608953, 10000000, 2 ** 63, -1,
+    float('inf'), float('nan'), True, None, '',
+    'Tiếng Việt có dấu', '中文', '🚀 emoji', 'tab\tnew\nline "quoted" \\ slash', '  \x00\x1f', '\ud800',
+]
+
+NESTED_TRANSACTIONS = [
+    {'sender_public_key_pem': '-----BEGIN PUBLIC KEY-----\nMCowBQYDK2VwAyEA\n-----END PUBLIC KEY-----\n', 'sender_address': 'SE' + 'a' * 64 + 'K',
+     'recipient_address': 'SO' + 'b' * 64 + 'K', 'amount': 0.30000000000000004, 'timestamp': 1753789758.1608953, 'signature': 'ff' * 64},
+    {'sender_address': '0', 'recipient_address': 'Người nhận ✓', 'amount': 1e-8, 'timestamp': 1.0, 'signature': 'mining_reward',
+     'meta': {'z': [1, 2.5, {'b': None, 'a': 'ü'}], 'a': {'nested': {'deeper': [True, False, -0.0]}}}},
+]
+
+@pytest.mark.skipif(not _shipped_blocks(), reason="Không có blockchain.sqlite đi kèm")
+@pytest.mark.parametrize('row', _shipped_blocks(), ids=lambda row: f"block-{row['index']}")
+def test_shipped_chain_hashes_are_reproduced(row):
+    transactions = json.loads(row['transactions'])
+    block_data = dict(row, transactions=transactions)
+    legacy_hash_data = {'index': row['index'], 'previous_hash': row['previous_hash'], 'timestamp': row['timestamp'], 'transactions': transactions, 'nonce': row['nonce']}
+    assert _legacy_hash(legacy_hash_data) == row['hash']
+    block = Block.from_dict(block_data)
+    assert block.version == 1
+    assert block.calculate_hash() == row['hash']
+    assert hash_data(block.get_hash_data()) == row['hash']
+    # Giao dịch lưu trong CSDL được mã hóa lại y hệt
+    assert canonical_json_list([canonical_json(tx) for tx in transactions]) == json.dumps(transactions, sort_keys=True)
+
+@pytest.mark.parametrize('value', EDGE_VALUES, ids=repr)
+def test_canonical_json_matches_json_dumps_on_edge_values(value):
+    assert canonical_json(value) == json.dumps(value, sort_keys=True)
+    assert canonical_json({'z': value, 'a': [value, {'y': value, 'b': value}]}) == json.dumps({'z': value, 'a': [value, {'y': value, 'b': value}]}, sort_keys=True)
+
+def test_canonical_json_list_matches_encoding_the_list():
+    items = NESTED_TRANSACTIONS + [{'v': value} for value in EDGE_VALUES]
+    assert canonical_json_list([canonical_json(item) for item in items]) == json.dumps(items, sort_keys=True)
+    assert canonical_json_list([]) == json.dumps([], sort_keys=True)
+
+def test_hash_data_matches_legacy_hashing():
+    for data in [NESTED_TRANSACTIONS, {'amount': 0.1 + 0.2, 'text': 'Tiếng Việt'}, [1, 'a', None]]:
+        assert hash_data(data) == _legacy_hash(data)
+    transaction = NESTED_TRANSACTIONS[0]
+    assert calculate_transaction_hash(transaction) == _legacy_hash({k: v for k, v in transaction.items() if k not in ('signature', 'sender_address')})
+
+@pytest.mark.parametrize('timestamp', [1753789758.1608953, 0.1 + 0.2, 1e16, 1.0])
+def test_block_hash_with_nested_transactions_matches_legacy_hashing(timestamp):
+    block = Block(index=42, previous_hash='0' * 64, timestamp=timestamp, transactions=NESTED_TRANSACTIONS, nonce=2 ** 40, version=1)
+    legacy = {'index': 42, 'previous_hash': '0' * 64, 'timestamp': timestamp, 'transactions': NESTED_TRANSACTIONS, 'nonce': 2 ** 40}
+    assert block.hash == _legacy_hash(legacy)
+    # Hash ghép từ giao dịch đã mã hóa sẵn (như khi lấy từ mempool) cũng phải trùng khớp
+    encoded = [canonical_json(tx) for tx in NESTED_TRANSACTIONS]
+    prebuilt = Block(index=42, previous_hash='0' * 64, timestamp=timestamp, transactions=NESTED_TRANSACTIONS, nonce=2 ** 40, version=1, encoded_transactions=encoded)
+    assert prebuilt.hash == block.hash
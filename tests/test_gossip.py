@@ -0,0 +1,33 @@
+# tests/test_gossip.py
+# -*- coding: utf-8 -*-
+
+import time
+from unittest import mock
+from sok.gossip import GossipBroadcaster
+
+class FakeResponse:
+    status_code = 200
+    def __init__(self, data): self.data = data
+    def json(self): return self.data
+
+def _wait_until_drained(gossip: GossipBroadcaster, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline and (gossip.get_stats()['pending'] or gossip.get_stats()['sent'] + gossip.get_stats()['failed'] < gossip.get_stats()['queued']):
+        time.sleep(0.02)
+
+def test_malformed_peer_replies_do_not_kill_the_worker():
+    replies = [FakeResponse(['not', 'a', 'dict']), FakeResponse({'wanted': 'x'}), FakeResponse({'wanted': [1, None]})]
+    def post(*args, **kwargs):
+        if replies: return replies.pop(0)
+        raise RuntimeError("phản hồi bất thường")
+    gossip = GossipBroadcaster(lambda: ['http://peer'], workers=1)
+    with mock.patch('requests.Session.post', side_effect=post):
+        gossip.start()
+        for amount in range(4):
+            gossip.announce_transaction({'sender_public_key_pem': 'a', 'recipient_address': 'b', 'amount': amount, 'timestamp': 1.0})
+        _wait_until_drained(gossip)
+    gossip.stop()
+    stats = gossip.get_stats()
+    assert all(thread.is_alive() for thread in gossip.threads)
+    assert stats['pending'] == 0 and stats['sent'] == 3 and stats['failed'] == 1
+    assert stats['payloads_requested'] == 0
@@ -0,0 +1,40 @@
+# tests/test_mempool.py
+# -*- coding: utf-8 -*-
+
+import pytest
+from sok.blockchain import Blockchain
+from sok.transaction import Transaction
+from sok.utils import Config
+from sok.wallet import Wallet, KEY_TYPE_ED25519
+
+def _transfer(sender: Wallet, amount: float) -> dict:
+    tx = Transaction(sender.get_public_key_pem(), Wallet(key_type=KEY_TYPE_ED25519).get_address(), amount)
+    tx.sign(sender.private_key)
+    return tx.to_dict()
+
+@pytest.fixture
+def funded(tmp_path):
+    """Một chuỗi có ví sender sở hữu đúng một phần thưởng khai thác."""
+    blockchain = Blockchain(str(tmp_path / 'node.sqlite'), difficulty=1)
+    sender = Wallet(key_type=KEY_TYPE_ED25519)
+    blockchain.mine_pending_transactions(sender.get_address())
+    return blockchain, sender
+
+def test_template_drops_and_evicts_conflicting_spends(funded):
+    blockchain, sender = funded
+    first, second = _transfer(sender, Config.MINING_REWARD * 0.8), _transfer(sender, Config.MINING_REWARD * 0.8)
+    assert blockchain.mempool.add(first) and blockchain.mempool.add(second)
+    block = blockchain.mine_pending_transactions(Wallet(key_type=KEY_TYPE_ED25519).get_address())
+    assert block.transactions[1:] == [first]
+    assert len(blockchain.mempool) == 0
+    assert blockchain.get_balance(sender.get_address()) == pytest.approx(Config.MINING_REWARD * 0.2)
+
+def test_peer_block_evicts_conflicting_mempool_spends(funded, tmp_path):
+    blockchain, sender = funded
+    peer = Blockchain(str(tmp_path / 'peer.sqlite'), difficulty=1)
+    assert peer.replace_chain(blockchain.get_full_chain_for_api())
+    confirmed, conflicting = _transfer(sender, Config.MINING_REWARD * 0.8), _transfer(sender, Config.MINING_REWARD * 0.8)
+    assert peer.mempool.add(confirmed) and blockchain.mempool.add(conflicting)
+    block = peer.mine_pending_transactions(Wallet(key_type=KEY_TYPE_ED25519).get_address())
+    assert blockchain.add_block_from_peer(block.to_dict())
+    assert len(blockchain.mempool) == 0
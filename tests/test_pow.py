@@ -0,0 +1,25 @@
+# tests/test_pow.py
+# -*- coding: utf-8 -*-
+
+from sok import pow as pow_module
+from sok.pow import ProofOfWorkEngine, parallel_search
+from sok.utils import hash_data
+
+def _block_data(index: int) -> dict:
+    return {'index': index, 'previous_hash': '0' * 64, 'timestamp': 1753789758.1608953, 'transactions': [{'amount': 0.1, 'recipient_address': 'Tiếng Việt'}], 'nonce': 0}
+
+def test_engine_matches_hash_data():
+    engine = ProofOfWorkEngine(_block_data(1), difficulty=2)
+    nonce = engine.search()
+    assert hash_data(dict(_block_data(1), nonce=nonce)) == engine.hash_nonce(nonce)
+    assert engine.hash_nonce(nonce).startswith('00')
+
+def test_parallel_search_reuses_one_pool_and_matches_sequential_search():
+    results = []
+    for index in (1, 2, 3):
+        sequential = ProofOfWorkEngine(_block_data(index), difficulty=3).search()
+        results.append((parallel_search(ProofOfWorkEngine(_block_data(index), difficulty=3), workers=2, chunk_size=500), sequential))
+        if index == 1: first_pool = pow_module._search_pool
+    assert all(parallel == sequential for parallel, sequential in results)
+    assert pow_module._search_pool is first_pool
+    assert pow_module._search_pool._ctx.get_start_method() in ('forkserver', 'spawn')
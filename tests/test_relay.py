@@ -0,0 +1,118 @@
+# tests/test_relay.py
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import pytest
+from sok.blockchain import Blockchain
+from sok.compact_block import build_compact_block
+from sok.gossip import GossipBroadcaster, PEER_ADDRESS_HEADER
+from sok.node_api import create_app
+from sok.transaction import Transaction
+from sok.utils import calculate_transaction_hash
+from sok.wallet import Wallet, KEY_TYPE_ED25519
+
+@pytest.fixture
+def node(tmp_path):
+    """Một nút (qua Flask test client) và một bản sao chuỗi của nó để khai thác khối hợp lệ kế tiếp."""
+    blockchain = Blockchain(str(tmp_path / 'node.sqlite'), difficulty=1)
+    source = sqlite3.connect(str(tmp_path / 'node.sqlite'))
+    target = sqlite3.connect(str(tmp_path / 'miner.sqlite'))
+    source.backup(target)
+    source.close(); target.close()
+    miner = Blockchain(str(tmp_path / 'miner.sqlite'), difficulty=1)
+    wallet = Wallet(key_type=KEY_TYPE_ED25519)
+    app = create_app(blockchain, None, wallet)
+    yield blockchain, miner, wallet, app.test_client()
+    app.config['MINING_WORKER'].stop()
+
+def test_forged_block_does_not_block_the_real_one(node):
+    blockchain, miner, wallet, client = node
+    miner.mine_pending_transactions(wallet.get_address())
+    real = miner.last_block.to_dict()
+    forged = client.post('/blocks/add_from_peer', json={'hash': real['hash'], 'index': real['index'], 'previous_hash': 'x'})
+    assert forged.status_code == 400
+    assert client.post('/inv', json={'inventory': [{'type': 'block', 'hash': real['hash']}]}).get_json()['wanted']
+    response = client.post('/blocks/add_from_peer', json=real)
+    assert response.status_code == 201 and blockchain.last_block.hash == real['hash']
+    assert client.post('/blocks/add_from_peer', json=real).get_json()['status'] == 'have'
+
+def test_block_with_wrong_hash_is_rejected(node):
+    blockchain, miner, wallet, client = node
+    miner.mine_pending_transactions(wallet.get_address())
+    block_data = dict(miner.last_block.to_dict(), nonce=-1)
+    assert client.post('/blocks/add_from_peer', json=block_data).status_code == 400
+    assert blockchain.last_block.index == 0
+
+def test_bad_signature_copy_does_not_censor_transaction(node):
+    blockchain, miner, wallet, client = node
+    miner.mine_pending_transactions(wallet.get_address())
+    assert client.post('/blocks/add_from_peer', json=miner.last_block.to_dict()).status_code == 201
+    tx = Transaction(wallet.get_public_key_pem(), Wallet(key_type=KEY_TYPE_ED25519).get_address(), 0.01)
+    tx.sign(wallet.private_key)
+    good = tx.to_dict()
+    assert client.post('/transactions/add_from_peer', json=dict(good, signature='00' * 64)).status_code == 400
+    assert client.post('/transactions/add_from_peer', json=good).status_code == 201
+    assert len(blockchain.mempool) == 1
+
+def _block_with_unknown_transaction(blockchain, miner, wallet, client) -> dict:
+    """Khối kế tiếp của miner chứa một giao dịch không có trong mempool của nút."""
+    miner.mine_pending_transactions(wallet.get_address())
+    assert client.post('/blocks/add_from_peer', json=miner.last_block.to_dict()).status_code == 201
+    tx = Transaction(wallet.get_public_key_pem(), Wallet(key_type=KEY_TYPE_ED25519).get_address(), 0.01)
+    tx.sign(wallet.private_key)
+    assert miner.add_transaction(tx.to_dict())
+    miner.mine_pending_transactions(wallet.get_address())
+    return miner.last_block.to_dict()
+
+def test_partial_compact_block_cannot_be_overwritten_by_another_client(node):
+    blockchain, miner, wallet, client = node
+    block_data = _block_with_unknown_transaction(blockchain, miner, wallet, client)
+    compact = build_compact_block(block_data)
+    honest, attacker = {'REMOTE_ADDR': '10.0.0.1'}, {'REMOTE_ADDR': '10.0.0.2'}
+    claimed = {PEER_ADDRESS_HEADER: 'http://10.0.0.1:5000'}
+    assert client.post('/blocks/compact', json=compact, headers=claimed, environ_base=honest).get_json() == {'status': 'missing', 'missing': [1]}
+    # Thêm một vị trí giao dịch: phần bổ sung của peer thật sẽ không bao giờ lấp đầy được khối này
+    forged = dict(compact, tx_count=compact['tx_count'] + 1, short_ids=compact['short_ids'] + ['0' * len(compact['short_ids'][0])])
+    # Mạo danh peer thật qua header không đưa được khối giả vào chỗ của peer đó
+    assert client.post('/blocks/compact', json=forged, headers=claimed, environ_base=attacker).get_json()['status'] == 'missing'
+    fill = {'hash': block_data['hash'], 'transactions': [{'index': 1, 'tx': block_data['transactions'][1]}]}
+    assert client.post('/blocks/compact/fill', json=fill, headers=claimed, environ_base=honest).status_code == 201
+    assert blockchain.last_block.hash == block_data['hash']
+
+def test_conflicting_compact_content_falls_back_to_full_block(node):
+    blockchain, miner, wallet, client = node
+    block_data = _block_with_unknown_transaction(blockchain, miner, wallet, client)
+    compact = build_compact_block(block_data)
+    peer = {PEER_ADDRESS_HEADER: 'http://peer'}
+    assert client.post('/blocks/compact', json=compact, headers=peer).get_json()['status'] == 'missing'
+    forged = dict(compact, short_ids=['0' * len(compact['short_ids'][0])])
+    assert client.post('/blocks/compact', json=forged, headers=peer).get_json() == {'status': 'need_full'}
+    fill = {'hash': block_data['hash'], 'transactions': [{'index': 1, 'tx': block_data['transactions'][1]}]}
+    assert client.post('/blocks/compact/fill', json=fill, headers=peer).get_json() == {'status': 'need_full'}
+    assert client.post('/blocks/add_from_peer', json=block_data, headers=peer).status_code == 201
+
+class _RecordingP2P:
+    """p2p_manager tối thiểu: một GossipBroadcaster không chạy luồng gửi và danh sách các peer bị loại trừ khi lan truyền."""
+    def __init__(self, peer_addresses):
+        self.gossip = GossipBroadcaster(lambda: peer_addresses, workers=1)
+        self.excluded = []
+
+    def broadcast_block(self, block, exclude=None): self.excluded.append(exclude)
+    def broadcast_transaction(self, transaction, exclude=None): self.excluded.append(exclude)
+
+@pytest.mark.parametrize('remote_addr, verified', [('10.0.0.5', True), ('10.0.0.9', False)])
+def test_source_peer_header_is_trusted_only_from_the_peer_host(tmp_path, remote_addr, verified):
+    peer_address = 'http://10.0.0.5:5000'
+    blockchain = Blockchain(str(tmp_path / 'node.sqlite'), difficulty=1)
+    wallet = Wallet(key_type=KEY_TYPE_ED25519)
+    blockchain.mine_pending_transactions(wallet.get_address())
+    p2p = _RecordingP2P([peer_address])
+    app = create_app(blockchain, p2p, wallet)
+    tx = Transaction(wallet.get_public_key_pem(), Wallet(key_type=KEY_TYPE_ED25519).get_address(), 0.01)
+    tx.sign(wallet.private_key)
+    response = app.test_client().post('/transactions/add_from_peer', json=tx.to_dict(), headers={PEER_ADDRESS_HEADER: peer_address},
+                                      environ_base={'REMOTE_ADDR': remote_addr})
+    app.config['MINING_WORKER'].stop()
+    assert response.status_code == 201
+    assert p2p.gossip._is_known(peer_address, calculate_transaction_hash(tx.to_dict())) == verified
+    assert p2p.excluded == [peer_address if verified else None]
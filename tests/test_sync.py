@@ -0,0 +1,139 @@
+# tests/test_sync.py
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import sqlite3
+import pytest
+from sok.blockchain import Block, Blockchain
+from sok.sync import ChainSynchronizer
+from sok.transaction import Transaction
+from sok.utils import Config
+from sok.wallet import Wallet, KEY_TYPE_ED25519
+
+def _copy_chain(tmp_path, source: Blockchain, name: str) -> Blockchain:
+    target = sqlite3.connect(str(tmp_path / f'{name}.sqlite'))
+    connection = sqlite3.connect(source.storage.db_path)
+    connection.backup(target)
+    connection.close(); target.close()
+    return Blockchain(str(tmp_path / f'{name}.sqlite'), difficulty=1)
+
+@pytest.fixture
+def forked_chains(tmp_path, monkeypatch):
+    """Chuỗi cục bộ dài 4 khối có checkpoint tại khối #2, và một nhánh dài hơn rẽ ra từ khối #1."""
+    local = Blockchain(str(tmp_path / 'local.sqlite'), difficulty=1)
+    miner = Wallet(key_type=KEY_TYPE_ED25519).get_address()
+    local.mine_pending_transactions(miner)
+    rival = _copy_chain(tmp_path, local, 'rival')
+    for _ in range(3): local.mine_pending_transactions(miner)
+    for _ in range(5): rival.mine_pending_transactions(Wallet(key_type=KEY_TYPE_ED25519).get_address())
+    monkeypatch.setattr(Config, 'CHECKPOINTS', {2: local.get_block(2)['hash']})
+    return local, rival
+
+def test_header_first_sync_rejects_fork_below_checkpoint(forked_chains):
+    local, rival = forked_chains
+    segment = rival.get_blocks_range(2, None, 100)
+    assert ChainSynchronizer(local)._verify_blocks(1, segment) is None
+
+def test_header_first_sync_accepts_fork_above_checkpoint(forked_chains, monkeypatch):
+    local, rival = forked_chains
+    monkeypatch.setattr(Config, 'CHECKPOINTS', {1: local.get_block(1)['hash']})
+    blocks = ChainSynchronizer(local)._verify_blocks(1, rival.get_blocks_range(2, None, 100))
+    assert blocks is not None and local.apply_fork(1, blocks)
+    assert local.last_block.hash == rival.last_block.hash
+
+def test_segment_contradicting_checkpoint_is_rejected(tmp_path, monkeypatch):
+    local = Blockchain(str(tmp_path / 'local.sqlite'), difficulty=1)
+    peer = _copy_chain(tmp_path, local, 'peer')
+    for _ in range(3): peer.mine_pending_transactions(Wallet(key_type=KEY_TYPE_ED25519).get_address())
+    monkeypatch.setattr(Config, 'CHECKPOINTS', {2: 'f' * 64})
+    assert ChainSynchronizer(local)._verify_blocks(0, peer.get_blocks_range(1, None, 100)) is None
+
+def test_reorg_below_checkpoint_is_refused_on_every_path(forked_chains):
+    local, rival = forked_chains
+    tip = local.last_block.hash
+    assert not local.replace_chain(rival.get_full_chain_for_api())
+    assert local.last_block.hash == tip
+
+def test_checkpoint_does_not_skip_rehashing_blocks_below_it(tmp_path, monkeypatch):
+    peer = Blockchain(str(tmp_path / 'peer.sqlite'), difficulty=1)
+    local = _copy_chain(tmp_path, peer, 'local')
+    for _ in range(3): peer.mine_pending_transactions(Wallet(key_type=KEY_TYPE_ED25519).get_address())
+    chain = peer.get_full_chain_for_api()
+    monkeypatch.setattr(Config, 'CHECKPOINTS', {3: chain[3]['hash']})
+    tampered = [dict(block) for block in chain]
+    transactions = json.loads(tampered[1]['transactions'])
+    transactions[0] = dict(transactions[0], recipient_address='ATTACKER', amount=1e9)
+    tampered[1]['transactions'] = json.dumps(transactions)
+    assert not local.replace_chain(tampered)
+    assert local.get_balance('ATTACKER') == 0
+    assert local.replace_chain(chain) and local.last_block.hash == chain[3]['hash']
+
+def _mine_block(blockchain: Blockchain, transactions: list) -> None:
+    """Đào và ghi thẳng một khối chứa transactions tùy ý lên chuỗi, bỏ qua mọi kiểm tra giao dịch."""
+    last_block = blockchain.last_block
+    block = Block(index=last_block.index + 1, previous_hash=last_block.hash, timestamp=time.time(), transactions=transactions)
+    blockchain.proof_of_work(block)
+    blockchain._add_block_to_db(block)
+
+def _reward(recipient: str, amount: float = Config.MINING_REWARD) -> dict:
+    return {'sender_public_key_pem': "0", 'sender_address': "0", 'recipient_address': recipient, 'amount': amount, 'timestamp': time.time(), 'signature': "mining_reward"}
+
+def _transfer(sender: Wallet, recipient: str, amount: float, signature: str = None) -> dict:
+    tx = Transaction(sender.get_public_key_pem(), recipient, amount)
+    tx.sign(sender.private_key)
+    return dict(tx.to_dict(), signature=signature) if signature else tx.to_dict()
+
+@pytest.fixture
+def victim_chains(tmp_path):
+    """Chuỗi cục bộ và chuỗi của peer cùng có khối #1 thưởng cho victim."""
+    local = Blockchain(str(tmp_path / 'local.sqlite'), difficulty=1)
+    victim = Wallet(key_type=KEY_TYPE_ED25519)
+    local.mine_pending_transactions(victim.get_address())
+    return local, _copy_chain(tmp_path, local, 'peer'), victim
+
+@pytest.mark.parametrize('forgery', ['inflated_reward', 'unsigned_transfer', 'overdraft'])
+def test_sync_and_reorg_validate_transactions_of_new_blocks(victim_chains, forgery):
+    local, peer, victim = victim_chains
+    thief = Wallet(key_type=KEY_TYPE_ED25519)
+    if forgery == 'inflated_reward':
+        transactions = [_reward(thief.get_address(), 1e9)]
+    elif forgery == 'unsigned_transfer':
+        transactions = [_reward(thief.get_address()), _transfer(victim, thief.get_address(), 1, signature='00' * 64)]
+    else:
+        transactions = [_reward(thief.get_address()), _transfer(thief, victim.get_address(), Config.MINING_REWARD * 2)]
+    _mine_block(peer, transactions)
+    _mine_block(peer, [_reward(thief.get_address())])
+    balance = local.get_balance(victim.get_address())
+    blocks = ChainSynchronizer(local)._verify_blocks(1, peer.get_blocks_range(2, None, 100))
+    assert blocks is None or not local.apply_fork(1, blocks)
+    assert not local.replace_chain(peer.get_full_chain_for_api())
+    assert local.last_block.index == 1 and local.get_balance(thief.get_address()) == 0
+    assert local.get_balance(victim.get_address()) == balance
+
+def test_fork_ledger_carries_balances_across_blocks(victim_chains):
+    local, peer, victim = victim_chains
+    spender = Wallet(key_type=KEY_TYPE_ED25519)
+    _mine_block(peer, [_reward(spender.get_address())])
+    _mine_block(peer, [_reward(victim.get_address()), _transfer(spender, victim.get_address(), Config.MINING_REWARD)])
+    blocks = ChainSynchronizer(local)._verify_blocks(1, peer.get_blocks_range(2, None, 100))
+    assert blocks is not None and local.apply_fork(1, blocks)
+    assert local.last_block.hash == peer.last_block.hash and local.get_balance(spender.get_address()) == 0
+
+def test_block_read_before_reorg_is_not_cached(forked_chains, monkeypatch):
+    local, rival = forked_chains
+    monkeypatch.setattr(Config, 'CHECKPOINTS', {})
+    blocks = ChainSynchronizer(local)._verify_blocks(1, rival.get_blocks_range(2, None, 100))
+    stale_hash, read_block = local.get_block(2)['hash'], local.get_block
+    local._invalidate_block_cache()
+
+    def read_then_reorg(index):
+        # Lần tổ chức lại chuỗi xảy ra giữa lúc đọc khối và lúc đưa khối vào bộ nhớ đệm
+        block_data = read_block(index)
+        monkeypatch.setattr(local, 'get_block', read_block)
+        assert local.apply_fork(1, blocks)
+        return block_data
+    monkeypatch.setattr(local, 'get_block', read_then_reorg)
+    assert local.get_block_object(2).hash == stale_hash
+    assert local.get_block_object(2).hash == rival.get_block(2)['hash'] != stale_hash
+    assert local.last_block.hash == rival.last_block.hash
@@ -0,0 +1,39 @@
+# tests/test_validation.py
+# -*- coding: utf-8 -*-
+
+from sok import wallet
+from sok.transaction import Transaction
+from sok.validation import verify_transaction_signatures
+
+def _signed_transaction(sender: wallet.Wallet, recipient: str, amount: float) -> dict:
+    tx = Transaction(sender.get_public_key_pem(), recipient, amount)
+    tx.sign(sender.private_key)
+    return tx.to_dict()
+
+def test_valid_transaction_passes():
+    sender = wallet.Wallet(key_type=wallet.KEY_TYPE_ED25519)
+    tx = _signed_transaction(sender, wallet.Wallet(key_type=wallet.KEY_TYPE_ED25519).get_address(), 1.5)
+    assert verify_transaction_signatures([tx], workers=1) is None
+
+def test_cached_signature_with_forged_sender_is_rejected():
+    sender = wallet.Wallet(key_type=wallet.KEY_TYPE_ED25519)
+    victim = wallet.Wallet(key_type=wallet.KEY_TYPE_ED25519)
+    tx = _signed_transaction(sender, victim.get_address(), 2.0)
+    # Lần xác thực đầu tiên đưa chữ ký vào bộ nhớ đệm
+    assert verify_transaction_signatures([tx], workers=1) is None
+    assert wallet.is_signature_cached(tx['sender_public_key_pem'], Transaction.from_dict(tx).calculate_hash(), tx['signature'])
+
+    # sender_address không nằm trong dữ liệu được ký: đổi nó không làm lệch chữ ký nhưng phải bị từ chối
+    forged = dict(tx, sender_address=victim.get_address())
+    assert verify_transaction_signatures([forged], workers=1) == 0
+    assert verify_transaction_signatures([tx, forged], workers=1) == 1
+
+def test_forged_sender_rejected_without_cache():
+    sender = wallet.Wallet(key_type=wallet.KEY_TYPE_ED25519)
+    victim = wallet.Wallet(key_type=wallet.KEY_TYPE_ED25519)
+    forged = dict(_signed_transaction(sender, victim.get_address(), 3.0), sender_address=victim.get_address())
+    assert verify_transaction_signatures([forged], workers=1) == 0
+
+def test_system_transaction_is_skipped():
+    reward = {'sender_public_key_pem': '0', 'sender_address': '0', 'recipient_address': 'x', 'amount': 0.1, 'timestamp': 1.0, 'signature': 'mining_reward'}
+    assert verify_transaction_signatures([reward], workers=1) is None
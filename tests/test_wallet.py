@@ -0,0 +1,27 @@
+# tests/test_wallet.py
+# -*- coding: utf-8 -*-
+
+import pytest
+from sok.utils import Config
+from sok.wallet import Wallet, KEY_TYPE_RSA, KEY_TYPE_ED25519, get_address_key_type, get_key_type_from_public_key_pem, load_wallet_file
+
+@pytest.mark.parametrize('key_type', [KEY_TYPE_RSA, KEY_TYPE_ED25519])
+def test_address_prefix_matches_key_type(key_type):
+    wallet = Wallet(key_type=key_type)
+    assert wallet.key_type == key_type
+    assert get_key_type_from_public_key_pem(wallet.get_public_key_pem()) == key_type
+    assert get_address_key_type(wallet.get_address()) == key_type
+
+@pytest.mark.parametrize('address', ['', '0', 'SOxK', 'SX' + 'a' * 64 + 'K', 'SO' + 'a' * 64 + 'X', 'SO' + 'A' * 64 + 'K', 'SO' + 'g' * 64 + 'K', 'SO' + 'a' * 63 + 'K'])
+def test_malformed_addresses_have_no_key_type(address):
+    assert get_address_key_type(address) is None
+
+def test_founder_address_is_an_rsa_address():
+    assert get_address_key_type(Config.FOUNDER_ADDRESS) == KEY_TYPE_RSA
+
+def test_load_wallet_file_reuses_the_parsed_wallet(tmp_path):
+    path = tmp_path / 'wallet.pem'
+    path.write_text(Wallet(key_type=KEY_TYPE_ED25519).get_private_key_pem(), encoding='utf-8')
+    wallet = load_wallet_file(str(path))
+    assert load_wallet_file(str(path)) is wallet
+    assert get_address_key_type(wallet.get_address()) == KEY_TYPE_ED25519
@@ -0,0 +1,40 @@
+# tests/test_wire.py
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import pytest
+from sok import wire
+from sok.blockchain import Blockchain
+from sok.node_api import create_app
+from sok.utils import Config
+from sok.validation import normalize_chain, verify_block_hashes
+from sok.wallet import Wallet, KEY_TYPE_ED25519
+
+MIMETYPES = [wire.JSON_MIMETYPE, wire.SOK_JSON_MIMETYPE,
+             pytest.param(wire.MSGPACK_MIMETYPE, marks=pytest.mark.skipif(wire.msgpack is None, reason="msgpack chưa được cài đặt"))]
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'WIRE_GZIP_MIN_BYTES', 0)
+    blockchain = Blockchain(str(tmp_path / 'node.sqlite'), difficulty=1)
+    for _ in range(3): blockchain.mine_pending_transactions(Wallet(key_type=KEY_TYPE_ED25519).get_address())
+    app = create_app(blockchain, None, Wallet(key_type=KEY_TYPE_ED25519))
+    yield blockchain, app.test_client()
+    app.config['MINING_WORKER'].stop()
+
+@pytest.mark.parametrize('encoding', ['identity', 'gzip'])
+@pytest.mark.parametrize('mimetype', MIMETYPES)
+def test_chain_round_trips_in_every_negotiated_format(client, mimetype, encoding):
+    blockchain, test_client = client
+    response = test_client.get('/chain', headers={'Accept': mimetype, 'Accept-Encoding': encoding})
+    assert response.status_code == 200 and response.mimetype == mimetype
+    body = response.get_data()
+    if encoding == 'gzip':
+        assert response.headers['Content-Encoding'] == 'gzip'
+        body = gzip.decompress(body)
+    payload = wire.decode_body(body, mimetype)
+    expected = json.loads(json.dumps(blockchain.get_full_chain_for_api()))
+    normalize_chain(expected); normalize_chain(payload['chain'])
+    assert payload['chain'] == expected and payload['length'] == len(expected)
+    assert verify_block_hashes(payload['chain'], workers=1)